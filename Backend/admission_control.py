@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+# Priority classes, lower is served first when the inference gate is saturated
+PRIORITY_FARMER = 0
+PRIORITY_USER = 1
+PRIORITY_ANONYMOUS = 2
+
+PRIORITY_NAMES = {PRIORITY_FARMER: "farmer", PRIORITY_USER: "user", PRIORITY_ANONYMOUS: "anonymous"}
+
+class TokenBucketLimiter:
+    """Per-key token buckets: ``rate`` tokens per second up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str, cost: float = 1) -> float:
+        """Take ``cost`` tokens; returns 0 on success or the seconds until they are available"""
+        # A request may never cost more than a full bucket
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict_idle(now)
+                bucket = self._buckets[key] = [self.burst, now]
+
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return 0.0
+            bucket[0] = tokens
+            return (cost - tokens) / self.rate
+
+    def _evict_idle(self, now: float):
+        # A bucket that has refilled completely carries no state worth keeping
+        full_after = self.burst / self.rate
+        idle = [key for key, (_, last) in self._buckets.items() if now - last >= full_after]
+        for key in idle:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+class PriorityGate:
+    """Async semaphore whose waiters are woken in (priority, arrival) order"""
+
+    def __init__(self, capacity: int, max_waiters: int, timeout: float):
+        self.capacity = capacity
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    async def acquire(self, priority: int) -> bool:
+        """Wait for a slot; returns False if the queue is full or the wait timed out"""
+        if self.in_flight < self.capacity and not self.waiting:
+            self.in_flight += 1
+            return True
+        if self.waiting >= self.max_waiters:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(future, self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # Client went away after being handed a slot: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter; in_flight is unchanged
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+class AdmissionController:
+    """Rate limits, concurrency and memory budget for the inference endpoints"""
+
+    def __init__(self, max_concurrency: int = 2, max_waiters: int = 32, queue_timeout: float = 30.0,
+                 max_inflight_bytes: int = 64 * 1024 * 1024,
+                 user_rate_per_minute: float = 30, user_burst: float = 10,
+                 anonymous_rate_per_minute: float = 6, anonymous_burst: float = 3):
+        self.user_limiter = TokenBucketLimiter(user_rate_per_minute / 60.0, user_burst)
+        self.anonymous_limiter = TokenBucketLimiter(anonymous_rate_per_minute / 60.0, anonymous_burst)
+        self.gate = PriorityGate(max_concurrency, max_waiters, queue_timeout)
+        self.max_inflight_bytes = max_inflight_bytes
+        self.inflight_bytes = 0
+        self.counters = {
+            "admitted": 0,
+            "rate_limited": 0,
+            "rejected_queue_full": 0,
+            "rejected_memory": 0,
+        }
+
+    @staticmethod
+    def classify(user: Optional[Dict[str, Any]], client_ip: str):
+        """Rate-limit key and priority class for a request"""
+        if user is None:
+            return f"ip:{client_ip}", PRIORITY_ANONYMOUS
+        priority = PRIORITY_FARMER if user.get("user_type") == "farmer" else PRIORITY_USER
+        return f"user:{user['id']}", priority
+
+    def classify_request(self, request, user: Optional[Dict[str, Any]]):
+        """classify() for a FastAPI request and its (optional) signed-in user"""
+        client_ip = request.client.host if request.client else "unknown"
+        return self.classify(user, client_ip)
+
+    def check_rate(self, key: str, priority: int, cost: int = 1):
+        limiter = self.anonymous_limiter if priority == PRIORITY_ANONYMOUS else self.user_limiter
+        retry_after = limiter.try_acquire(key, cost)
+        if retry_after:
+            self.counters["rate_limited"] += 1
+            raise HTTPException(status_code=429, detail="Too many prediction requests",
+                                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+
+    def reserve_bytes(self, size: int):
+        """Claim part of the in-memory upload budget before reading a file"""
+        if self.inflight_bytes + size > self.max_inflight_bytes and self.inflight_bytes > 0:
+            self.counters["rejected_memory"] += 1
+            raise HTTPException(status_code=503, detail="Server busy, please retry",
+                                headers={"Retry-After": "2"})
+        self.inflight_bytes += size
+
+    def release_bytes(self, size: int):
+        self.inflight_bytes -= size
+
+    @asynccontextmanager
+    async def inference_slot(self, priority: int):
+        """Hold one of the concurrent inference slots for the duration of the block"""
+        if not await self.gate.acquire(priority):
+            self.counters["rejected_queue_full"] += 1
+            raise HTTPException(status_code=503, detail="Prediction queue is full, please retry",
+                                headers={"Retry-After": "5"})
+        self.counters["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.gate.release()
+
+    @asynccontextmanager
+    async def admit(self, priority: int, size: int):
+        """Hold an inference slot and ``size`` bytes of upload budget for the duration of the block"""
+        self.reserve_bytes(size)
+        try:
+            async with self.inference_slot(priority):
+                yield
+        finally:
+            self.release_bytes(size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "in_flight": self.gate.in_flight,
+            "waiting": self.gate.waiting,
+            "max_concurrency": self.gate.capacity,
+            "inflight_bytes": self.inflight_bytes,
+            "max_inflight_bytes": self.max_inflight_bytes,
+        }
@@ -0,0 +1,508 @@
+"""Disease advisories for every model class, in English and Telugu.
+
+The advisory part of a prediction response (names, symptoms, treatment,
+prevention, pesticides) depends only on the class and the language, so it
+is built and serialized once at import for every (class, language) pair.
+A request then only serializes its own fields (confidence, image id,
+quality) and splices in the pre-rendered fragment.
+"""
+import json
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from disease_classes import class_indices
+
+DEFAULT_LANGUAGE = "en"
+SUPPORTED_LANGUAGES = ("en", "te")
+
+# Keys of a prediction response that come from the advisory rather than the request
+ADVISORY_FIELDS = ("plant", "disease", "is_healthy", "disease_info", "treatment", "prevention",
+                   "recommended_pesticides", "scientific_name", "class_name", "language")
+
+PLANT_NAMES_TE = {
+    "Apple": "ఆపిల్",
+    "Blueberry": "బ్లూబెర్రీ",
+    "Cherry_(including_sour)": "చెర్రీ (పుల్ల చెర్రీతో సహా)",
+    "Corn_(maize)": "మొక్కజొన్న",
+    "Grape": "ద్రాక్ష",
+    "Orange": "నారింజ",
+    "Peach": "పీచ్",
+    "Pepper_bell": "క్యాప్సికమ్ (బెంగళూరు మిర్చి)",
+    "Potato": "బంగాళదుంప",
+    "Raspberry": "రాస్ప్బెర్రీ",
+    "Soybean": "సోయాబీన్",
+    "Squash": "గుమ్మడి",
+    "Strawberry": "స్ట్రాబెర్రీ",
+    "Tomato": "టమాటో",
+}
+
+# Per disease (the part of the class label after "___"): symptoms, treatment, prevention,
+# plus the Telugu disease name. English names come from the label itself.
+DISEASE_ADVICE = {
+    "Apple_scab": {
+        "en": {
+            "symptoms": "Olive-green to black spots on leaves and fruit",
+            "treatment": "Apply fungicides during wet weather periods",
+            "prevention": "Remove fallen leaves and improve air circulation",
+        },
+        "te": {
+            "name": "ఆపిల్ స్కాబ్ (పొలుసు మచ్చ తెగులు)",
+            "symptoms": "ఆకులు మరియు కాయలపై ఆలివ్ పచ్చ నుండి నల్లని మచ్చలు",
+            "treatment": "తడి వాతావరణంలో శిలీంద్ర నాశినులు పిచికారీ చేయండి",
+            "prevention": "రాలిన ఆకులను తొలగించి, గాలి ప్రసరణను మెరుగుపరచండి",
+        },
+    },
+    "Black_rot": {
+        "en": {
+            "symptoms": "Brown leaf spots with purple edges and shrivelled, black rotting fruit",
+            "treatment": "Prune out infected wood and mummified fruit, then apply captan or mancozeb",
+            "prevention": "Clear fallen fruit and prunings and keep the canopy open",
+        },
+        "te": {
+            "name": "నల్ల కుళ్ళు తెగులు",
+            "symptoms": "ఊదా అంచులతో గోధుమ రంగు ఆకు మచ్చలు, ముడుచుకుపోయి నల్లగా కుళ్ళిన కాయలు",
+            "treatment": "తెగులు సోకిన కొమ్మలు మరియు ఎండిన కాయలను కత్తిరించి, క్యాప్టాన్ లేదా మాంకోజెబ్ పిచికారీ చేయండి",
+            "prevention": "రాలిన కాయలు మరియు కత్తిరించిన కొమ్మలను తొలగించి, పందిరిని గాలి ఆడేలా ఉంచండి",
+        },
+    },
+    "Cedar_apple_rust": {
+        "en": {
+            "symptoms": "Bright yellow-orange spots on upper leaf surfaces",
+            "treatment": "Apply myclobutanil or mancozeb from pink bud until petals fall",
+            "prevention": "Remove nearby juniper (cedar) hosts and plant resistant varieties",
+        },
+        "te": {
+            "name": "సెడార్ ఆపిల్ తుప్పు తెగులు",
+            "symptoms": "ఆకుల పైభాగంలో ప్రకాశవంతమైన పసుపు-నారింజ మచ్చలు",
+            "treatment": "మొగ్గ దశ నుండి పూరేకులు రాలే వరకు మైక్లోబ్యుటానిల్ లేదా మాంకోజెబ్ పిచికారీ చేయండి",
+            "prevention": "దగ్గరలోని జునిపర్ (సెడార్) మొక్కలను తొలగించి, తట్టుకునే రకాలను నాటండి",
+        },
+    },
+    "Powdery_mildew": {
+        "en": {
+            "symptoms": "White powdery patches on leaves and young shoots",
+            "treatment": "Apply wettable sulphur or a systemic fungicide such as hexaconazole",
+            "prevention": "Avoid excess nitrogen, space plants well and remove infected leaves",
+        },
+        "te": {
+            "name": "బూడిద తెగులు",
+            "symptoms": "ఆకులు మరియు లేత చిగుర్లపై తెల్లని పొడి వంటి మచ్చలు",
+            "treatment": "నీటిలో కరిగే గంధకం లేదా హెక్సాకొనజోల్ వంటి అంతర్వాహిక శిలీంద్ర నాశిని పిచికారీ చేయండి",
+            "prevention": "అధిక నత్రజని వాడకండి, మొక్కల మధ్య తగిన దూరం ఉంచి, తెగులు ఆకులను తొలగించండి",
+        },
+    },
+    "Cercospora_leaf_spot Gray_leaf_spot": {
+        "en": {
+            "symptoms": "Long, narrow grey to tan lesions running between leaf veins",
+            "treatment": "Apply a strobilurin or triazole fungicide when lesions first appear",
+            "prevention": "Rotate crops, plough in residue and grow tolerant hybrids",
+        },
+        "te": {
+            "name": "సెర్కోస్పోరా / బూడిద ఆకు మచ్చ తెగులు",
+            "symptoms": "ఆకు ఈనెల మధ్య పొడవైన, సన్నని బూడిద నుండి లేత గోధుమ రంగు మచ్చలు",
+            "treatment": "మచ్చలు మొదట కనిపించినప్పుడే స్ట్రోబిలురిన్ లేదా ట్రైఅజోల్ శిలీంద్ర నాశిని పిచికారీ చేయండి",
+            "prevention": "పంట మార్పిడి చేయండి, పంట అవశేషాలను దున్ని కలపండి, తట్టుకునే హైబ్రిడ్లను సాగు చేయండి",
+        },
+    },
+    "Common_rust_": {
+        "en": {
+            "symptoms": "Brick-red powdery pustules on both sides of the leaves",
+            "treatment": "Apply mancozeb or a triazole fungicide if pustules spread before tasselling",
+            "prevention": "Grow resistant hybrids and avoid late sowing",
+        },
+        "te": {
+            "name": "సాధారణ తుప్పు తెగులు",
+            "symptoms": "ఆకుల రెండు వైపులా ఇటుక ఎరుపు రంగు పొడి బొబ్బలు",
+            "treatment": "పూత రాకముందే బొబ్బలు వ్యాపిస్తే మాంకోజెబ్ లేదా ట్రైఅజోల్ శిలీంద్ర నాశిని పిచికారీ చేయండి",
+            "prevention": "తట్టుకునే హైబ్రిడ్లను సాగు చేయండి, ఆలస్యంగా విత్తడం మానండి",
+        },
+    },
+    "Northern_Leaf_Blight": {
+        "en": {
+            "symptoms": "Long cigar-shaped grey-green lesions on the leaves",
+            "treatment": "Apply a fungicide such as propiconazole at the first lesions",
+            "prevention": "Rotate with non-host crops, manage residue and grow resistant hybrids",
+        },
+        "te": {
+            "name": "ఉత్తర ఆకు ఎండు తెగులు",
+            "symptoms": "ఆకులపై పొడవైన, సిగార్ ఆకారపు బూడిద-పచ్చ మచ్చలు",
+            "treatment": "మొదటి మచ్చలు కనిపించగానే ప్రొపికొనజోల్ వంటి శిలీంద్ర నాశిని పిచికారీ చేయండి",
+            "prevention": "ఈ తెగులు సోకని పంటలతో మార్పిడి చేయండి, అవశేషాలను నిర్వహించండి, తట్టుకునే హైబ్రిడ్లను సాగు చేయండి",
+        },
+    },
+    "Esca_(Black_Measles)": {
+        "en": {
+            "symptoms": "Tiger-stripe yellowing between leaf veins and small dark spots on berries",
+            "treatment": "Cut out and destroy affected wood; there is no curative spray",
+            "prevention": "Prune in dry weather and seal large pruning wounds",
+        },
+        "te": {
+            "name": "ఎస్కా (నల్ల మచ్చల తెగులు)",
+            "symptoms": "ఆకు ఈనెల మధ్య పులి చారల వంటి పసుపు రంగు, పండ్లపై చిన్న నల్లని మచ్చలు",
+            "treatment": "తెగులు సోకిన కొమ్మలను కత్తిరించి నాశనం చేయండి; నివారణ మందు లేదు",
+            "prevention": "పొడి వాతావరణంలో కత్తిరింపులు చేసి, పెద్ద కోతలకు పూత పూయండి",
+        },
+    },
+    "Leaf_blight_(Isariopsis_Leaf_Spot)": {
+        "en": {
+            "symptoms": "Irregular dark brown spots that merge and dry out the leaves",
+            "treatment": "Apply copper oxychloride or mancozeb",
+            "prevention": "Remove infected leaves and avoid overhead irrigation",
+        },
+        "te": {
+            "name": "ఆకు ఎండు తెగులు (ఇసారియోప్సిస్ ఆకు మచ్చ)",
+            "symptoms": "ఒకదానితో ఒకటి కలిసిపోయి ఆకులను ఎండబెట్టే క్రమరహిత ముదురు గోధుమ మచ్చలు",
+            "treatment": "కాపర్ ఆక్సీక్లోరైడ్ లేదా మాంకోజెబ్ పిచికారీ చేయండి",
+            "prevention": "తెగులు ఆకులను తొలగించి, పై నుండి నీరు పెట్టడం మానండి",
+        },
+    },
+    "Haunglongbing_(Citrus_greening)": {
+        "en": {
+            "symptoms": "Blotchy yellow mottling of leaves and small, lopsided, bitter fruit",
+            "treatment": "No cure; remove infected trees and control the citrus psyllid",
+            "prevention": "Plant certified disease-free saplings and monitor for psyllids",
+        },
+        "te": {
+            "name": "సిట్రస్ గ్రీనింగ్ (హువాంగ్‌లాంగ్‌బింగ్)",
+            "symptoms": "ఆకులపై అసమాన పసుపు మచ్చలు, చిన్నగా వంకరగా చేదుగా ఉండే కాయలు",
+            "treatment": "నివారణ లేదు; తెగులు సోకిన చెట్లను తొలగించి, సిట్రస్ సిల్లిడ్ పురుగును నియంత్రించండి",
+            "prevention": "ధ్రువీకరించిన తెగులు లేని మొక్కలను నాటి, సిల్లిడ్ల కోసం గమనిస్తూ ఉండండి",
+        },
+    },
+    "Bacterial_spot": {
+        "en": {
+            "symptoms": "Small water-soaked spots that turn dark and scabby on leaves and fruit",
+            "treatment": "Apply copper-based bactericides, alone or with mancozeb",
+            "prevention": "Use disease-free seed, rotate crops and avoid working among wet plants",
+        },
+        "te": {
+            "name": "బాక్టీరియా మచ్చ తెగులు",
+            "symptoms": "ఆకులు మరియు కాయలపై నీటితో తడిసినట్లుండి తర్వాత ముదురుగా, గరుకుగా మారే చిన్న మచ్చలు",
+            "treatment": "రాగి ఆధారిత బాక్టీరియా నాశినులను ఒంటరిగా లేదా మాంకోజెబ్‌తో కలిపి పిచికారీ చేయండి",
+            "prevention": "తెగులు లేని విత్తనాలు వాడండి, పంట మార్పిడి చేయండి, తడి మొక్కల మధ్య పనిచేయకండి",
+        },
+    },
+    "Early_blight": {
+        "en": {
+            "symptoms": "Brown spots with concentric rings on leaves",
+            "treatment": "Apply fungicides containing chlorothalonil or mancozeb",
+            "prevention": "Ensure proper plant spacing and avoid overhead watering",
+        },
+        "te": {
+            "name": "ముందు దశ ఆకుమాడు తెగులు",
+            "symptoms": "ఆకులపై వలయాకార గీతలతో గోధుమ రంగు మచ్చలు",
+            "treatment": "క్లోరోథలోనిల్ లేదా మాంకోజెబ్ ఉన్న శిలీంద్ర నాశినులను పిచికారీ చేయండి",
+            "prevention": "మొక్కల మధ్య సరైన దూరం ఉంచి, పై నుండి నీరు పెట్టడం మానండి",
+        },
+    },
+    "Late_blight": {
+        "en": {
+            "symptoms": "Dark water-soaked lesions on leaves and stems",
+            "treatment": "Apply systemic fungicides like metalaxyl",
+            "prevention": "Plant resistant varieties and ensure good drainage",
+        },
+        "te": {
+            "name": "చివరి దశ ఆకుమాడు తెగులు",
+            "symptoms": "ఆకులు మరియు కాండాలపై నీటితో తడిసినట్లు ఉండే ముదురు మచ్చలు",
+            "treatment": "మెటలాక్సిల్ వంటి అంతర్వాహిక శిలీంద్ర నాశినులను పిచికారీ చేయండి",
+            "prevention": "తట్టుకునే రకాలను నాటి, నీరు బాగా ఇంకిపోయేలా చూడండి",
+        },
+    },
+    "Leaf_scorch": {
+        "en": {
+            "symptoms": "Many small purple spots that merge until the leaf looks scorched",
+            "treatment": "Remove badly affected leaves and apply captan or a copper fungicide",
+            "prevention": "Renew plantings regularly and avoid overhead watering",
+        },
+        "te": {
+            "name": "ఆకు కాలిన మచ్చ తెగులు",
+            "symptoms": "అనేక చిన్న ఊదా మచ్చలు కలిసిపోయి ఆకు కాలినట్లు కనిపిస్తుంది",
+            "treatment": "బాగా దెబ్బతిన్న ఆకులను తొలగించి, క్యాప్టాన్ లేదా రాగి శిలీంద్ర నాశిని పిచికారీ చేయండి",
+            "prevention": "మొక్కలను క్రమం తప్పకుండా మార్చి నాటండి, పై నుండి నీరు పెట్టడం మానండి",
+        },
+    },
+    "Leaf_Mold": {
+        "en": {
+            "symptoms": "Pale yellow patches on upper leaf surfaces with olive-grey mould beneath",
+            "treatment": "Apply chlorothalonil or a copper fungicide and remove affected leaves",
+            "prevention": "Lower humidity with ventilation and avoid wetting the leaves",
+        },
+        "te": {
+            "name": "ఆకు బూజు తెగులు",
+            "symptoms": "ఆకుల పైభాగంలో లేత పసుపు మచ్చలు, కింది భాగంలో ఆలివ్-బూడిద రంగు బూజు",
+            "treatment": "క్లోరోథలోనిల్ లేదా రాగి శిలీంద్ర నాశిని పిచికారీ చేసి, తెగులు ఆకులను తొలగించండి",
+            "prevention": "గాలి ప్రసరణతో తేమను తగ్గించి, ఆకులు తడవకుండా చూడండి",
+        },
+    },
+    "Septoria_leaf_spot": {
+        "en": {
+            "symptoms": "Many small round spots with grey centres and dark borders on lower leaves",
+            "treatment": "Apply chlorothalonil or mancozeb and remove infected lower leaves",
+            "prevention": "Mulch the soil, rotate crops and avoid overhead watering",
+        },
+        "te": {
+            "name": "సెప్టోరియా ఆకు మచ్చ తెగులు",
+            "symptoms": "కింది ఆకులపై బూడిద మధ్యభాగం, ముదురు అంచులతో అనేక చిన్న గుండ్రని మచ్చలు",
+            "treatment": "క్లోరోథలోనిల్ లేదా మాంకోజెబ్ పిచికారీ చేసి, తెగులు సోకిన కింది ఆకులను తొలగించండి",
+            "prevention": "నేలపై మల్చింగ్ చేయండి, పంట మార్పిడి చేయండి, పై నుండి నీరు పెట్టడం మానండి",
+        },
+    },
+    "Spider_mites Two-spotted_spider_mite": {
+        "en": {
+            "symptoms": "Fine yellow speckling on leaves with webbing on the undersides",
+            "treatment": "Spray neem oil or a miticide such as abamectin on leaf undersides",
+            "prevention": "Keep plants well watered and avoid broad-spectrum insecticides that kill predators",
+        },
+        "te": {
+            "name": "ఎర్ర నల్లి (రెండు మచ్చల సాలీడు నల్లి)",
+            "symptoms": "ఆకులపై సన్నని పసుపు చుక్కలు, ఆకుల అడుగున గూడు వంటి వల",
+            "treatment": "ఆకుల అడుగు భాగంలో వేప నూనె లేదా అబామెక్టిన్ వంటి నల్లి నాశిని పిచికారీ చేయండి",
+            "prevention": "మొక్కలకు తగినంత నీరు ఇవ్వండి, మిత్ర పురుగులను చంపే విస్తృత క్రిమి సంహారకాలు వాడకండి",
+        },
+    },
+    "Target_Spot": {
+        "en": {
+            "symptoms": "Brown spots with light centres and target-like rings on leaves and fruit",
+            "treatment": "Apply chlorothalonil or azoxystrobin",
+            "prevention": "Improve airflow by pruning and remove crop debris after harvest",
+        },
+        "te": {
+            "name": "టార్గెట్ మచ్చ తెగులు",
+            "symptoms": "ఆకులు మరియు కాయలపై లేత మధ్యభాగం, గురి వంటి వలయాలతో గోధుమ మచ్చలు",
+            "treatment": "క్లోరోథలోనిల్ లేదా అజాక్సిస్ట్రోబిన్ పిచికారీ చేయండి",
+            "prevention": "కత్తిరింపుతో గాలి ప్రసరణ పెంచండి, కోత తర్వాత పంట వ్యర్థాలను తొలగించండి",
+        },
+    },
+    "Tomato_Yellow_Leaf_Curl_Virus": {
+        "en": {
+            "symptoms": "Upward-curling, yellow-edged leaves and stunted plants with few fruits",
+            "treatment": "No cure; uproot infected plants and control whiteflies",
+            "prevention": "Use resistant varieties, insect-proof nurseries and yellow sticky traps",
+        },
+        "te": {
+            "name": "టమాటో పసుపు ఆకు ముడత వైరస్",
+            "symptoms": "పైకి ముడుచుకున్న, పసుపు అంచుల ఆకులు; ఎదుగుదల తగ్గి కాయలు తక్కువగా ఉంటాయి",
+            "treatment": "నివారణ లేదు; తెగులు మొక్కలను పీకివేసి, తెల్లదోమను నియంత్రించండి",
+            "prevention": "తట్టుకునే రకాలు, పురుగులు చొరబడని నారుమడులు, పసుపు జిగురు అట్టలను వాడండి",
+        },
+    },
+    "Tomato_mosaic_virus": {
+        "en": {
+            "symptoms": "Light and dark green mosaic pattern on leaves, which may be distorted",
+            "treatment": "No cure; remove infected plants and disinfect tools and hands",
+            "prevention": "Use certified seed and resistant varieties and avoid tobacco use near plants",
+        },
+        "te": {
+            "name": "టమాటో మొజాయిక్ వైరస్",
+            "symptoms": "ఆకులపై లేత మరియు ముదురు పచ్చ రంగుల మొజాయిక్ నమూనా, ఆకులు వంకర తిరగవచ్చు",
+            "treatment": "నివారణ లేదు; తెగులు మొక్కలను తొలగించి, పనిముట్లు మరియు చేతులను శుభ్రపరచండి",
+            "prevention": "ధ్రువీకరించిన విత్తనాలు మరియు తట్టుకునే రకాలు వాడండి, మొక్కల దగ్గర పొగాకు వాడకండి",
+        },
+    },
+    "healthy": {
+        "en": {
+            "symptoms": "Plant appears healthy with no visible disease symptoms",
+            "treatment": "No treatment needed - continue regular care",
+            "prevention": "Maintain good plant hygiene and proper watering",
+        },
+        "te": {
+            "name": "ఆరోగ్యంగా ఉంది",
+            "symptoms": "మొక్క ఆరోగ్యంగా ఉంది, వ్యాధి లక్షణాలు ఏవీ కనిపించడం లేదు",
+            "treatment": "చికిత్స అవసరం లేదు - సాధారణ సంరక్షణ కొనసాగించండి",
+            "prevention": "మొక్కల పరిశుభ్రత పాటించి, సరిగ్గా నీరు పెట్టండి",
+        },
+    },
+}
+
+# Advice for a class without an entry above
+GENERIC_ADVICE = {
+    "en": {
+        "symptoms": "Symptoms of {disease} detected on {plant}",
+        "treatment": "Consult with agricultural expert for specific treatment",
+        "prevention": "Follow good agricultural practices",
+    },
+    "te": {
+        "symptoms": "{plant} పై {disease} లక్షణాలు గుర్తించబడ్డాయి",
+        "treatment": "సరైన చికిత్స కోసం వ్యవసాయ నిపుణుడిని సంప్రదించండి",
+        "prevention": "మంచి వ్యవసాయ పద్ధతులను పాటించండి",
+    },
+}
+
+# Pesticide recommendations by disease; product names and ingredients are not translated
+PESTICIDES = {
+    "Early_blight": [
+        {
+            "name": "Mancozeb 75% WP",
+            "active_ingredient": "Mancozeb 75%",
+            "price": 180.0,
+            "en": {
+                "type": "Fungicide",
+                "application_rate": "2-2.5 grams per liter",
+                "description": "Broad spectrum contact fungicide effective against early blight",
+            },
+            "te": {
+                "type": "శిలీంద్ర నాశిని",
+                "application_rate": "లీటరుకు 2-2.5 గ్రాములు",
+                "description": "ముందు దశ ఆకుమాడు తెగులుపై ప్రభావవంతమైన విస్తృత శ్రేణి స్పర్శ శిలీంద్ర నాశిని",
+            },
+        }
+    ],
+    "Late_blight": [
+        {
+            "name": "Metalaxyl + Mancozeb",
+            "active_ingredient": "Metalaxyl 8% + Mancozeb 64%",
+            "price": 320.0,
+            "en": {
+                "type": "Systemic Fungicide",
+                "application_rate": "2.5 grams per liter",
+                "description": "Systemic and contact fungicide for late blight",
+            },
+            "te": {
+                "type": "అంతర్వాహిక శిలీంద్ర నాశిని",
+                "application_rate": "లీటరుకు 2.5 గ్రాములు",
+                "description": "చివరి దశ ఆకుమాడు తెగులు కోసం అంతర్వాహిక మరియు స్పర్శ శిలీంద్ర నాశిని",
+            },
+        }
+    ],
+    "Apple_scab": [
+        {
+            "name": "Myclobutanil 10% WP",
+            "active_ingredient": "Myclobutanil 10%",
+            "price": 280.0,
+            "en": {
+                "type": "Systemic Fungicide",
+                "application_rate": "1 gram per liter",
+                "description": "Systemic fungicide for apple scab control",
+            },
+            "te": {
+                "type": "అంతర్వాహిక శిలీంద్ర నాశిని",
+                "application_rate": "లీటరుకు 1 గ్రాము",
+                "description": "ఆపిల్ స్కాబ్ నియంత్రణకు అంతర్వాహిక శిలీంద్ర నాశిని",
+            },
+        }
+    ],
+}
+
+def _serialize(value) -> str:
+    # Same output as FastAPI's JSONResponse, so spliced and plain responses are identical
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+
+class Advisory:
+    """Advisory fields for one (class, language) and their pre-serialized JSON"""
+
+    __slots__ = ("fields", "fragment", "body")
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+        body = _serialize(fields)
+        # Object members without the braces, ready to splice into a response object
+        self.fragment = body[1:-1]
+        self.body = body.encode("utf-8")
+
+def _compile(class_name: str, language: str) -> Advisory:
+    plant_label, _, disease_label = class_name.partition("___")
+    plant = plant_label.replace("_", " ")
+    disease = disease_label.replace("_", " ") if disease_label else "Unknown"
+    advice = DISEASE_ADVICE.get(disease_label, {})
+
+    localized = advice.get(language)
+    if language == DEFAULT_LANGUAGE:
+        local_plant, local_disease = plant, disease
+    else:
+        local_plant = PLANT_NAMES_TE.get(plant_label, plant)
+        local_disease = localized["name"] if localized else disease
+    if localized is None:
+        localized = {key: text.format(plant=local_plant, disease=local_disease)
+                     for key, text in GENERIC_ADVICE[language].items()}
+
+    is_healthy = "healthy" in disease.lower()
+    pesticides = [] if is_healthy else [
+        {"name": item["name"], "type": item[language]["type"], "active_ingredient": item["active_ingredient"],
+         "application_rate": item[language]["application_rate"], "price": item["price"],
+         "description": item[language]["description"]}
+        for item in PESTICIDES.get(disease_label, [])
+    ]
+    return Advisory({
+        "plant": local_plant,
+        "disease": local_disease,
+        "is_healthy": is_healthy,
+        "disease_info": localized["symptoms"],
+        "treatment": localized["treatment"],
+        "prevention": localized["prevention"],
+        "recommended_pesticides": pesticides,
+        "scientific_name": f"{plant} species",
+        "class_name": class_name,
+        "language": language,
+    })
+
+# Every model class in every language, built once per process
+ADVISORIES: Dict[Tuple[str, str], Advisory] = {
+    (class_name, language): _compile(class_name, language)
+    for class_name in class_indices.values() for language in SUPPORTED_LANGUAGES
+}
+
+def get_advisory(class_name: str, language: str = DEFAULT_LANGUAGE) -> Advisory:
+    """Pre-compiled advisory; classes the model does not know are compiled (and kept) on first use"""
+    key = (class_name, language if language in SUPPORTED_LANGUAGES else DEFAULT_LANGUAGE)
+    advisory = ADVISORIES.get(key)
+    if advisory is None:
+        advisory = ADVISORIES[key] = _compile(*key)
+    return advisory
+
+@lru_cache(maxsize=256)
+def negotiate_language(accept_language: Optional[str]) -> str:
+    """Best supported language for an Accept-Language header (e.g. "te-IN,te;q=0.9,en;q=0.8")"""
+    best, best_quality = DEFAULT_LANGUAGE, 0.0
+    for position, item in enumerate((accept_language or "").split(",")):
+        tag, _, params = item.strip().partition(";")
+        language = tag.strip().lower().split("-")[0]
+        if language not in SUPPORTED_LANGUAGES:
+            continue
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        # Earlier entries win ties, as listed by the client
+        if quality > best_quality:
+            best, best_quality = language, quality
+    return best
+
+def request_language(request: Request) -> str:
+    return negotiate_language(request.headers.get("accept-language"))
+
+def localize(result: Dict[str, Any], language: str) -> Dict[str, Any]:
+    """A stored prediction result with its advisory fields swapped for another language"""
+    class_name = result.get("class_name")
+    if not class_name or result.get("language") == language:
+        return result
+    return {**result, **get_advisory(class_name, language).fields}
+
+def localized_headers(language: str) -> Dict[str, str]:
+    return {"Vary": "Accept-Language", "Content-Language": language}
+
+def prediction_response(result: Dict[str, Any]) -> Response:
+    """JSON response for a prediction: the request's own fields plus the pre-rendered advisory fragment"""
+    advisory = get_advisory(result["class_name"], result["language"])
+    own = _serialize({key: value for key, value in result.items() if key not in ADVISORY_FIELDS})
+    body = own[:-1] + ("," if len(own) > 2 else "") + advisory.fragment + "}"
+    return Response(content=body.encode("utf-8"), media_type="application/json",
+                    headers=localized_headers(result["language"]))
+
+def create_advisory_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/advisories/{class_name}")
+    async def get_class_advisory(class_name: str, request: Request):
+        """Advisory for a model class (e.g. Tomato___Early_blight) in the caller's Accept-Language"""
+        language = request_language(request)
+        advisory = ADVISORIES.get((class_name, language))
+        if advisory is None:
+            raise HTTPException(status_code=404, detail="Unknown disease class")
+        return Response(content=advisory.body, media_type="application/json",
+                        headers={**localized_headers(language), "Cache-Control": "public, max-age=86400"})
+
+    return router
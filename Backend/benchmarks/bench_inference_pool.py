@@ -0,0 +1,178 @@
+"""Inference pool benchmark: several local inference nodes behind one InferencePool.
+
+Starts --nodes `APP_ROLE=inference` uvicorn processes on this machine, then
+sends --requests predictions through InferencePool (--repeat-fraction of them
+re-send an earlier image) and reports latency, per-node spread, node cache hits,
+hedges and retries. --slow-node adds latency to one node to exercise hedging,
+and --kill-node stops one node halfway through to exercise retries, ejection
+and health checks.
+
+--fake-model-ms replaces the model on each node with a stand-in that sleeps
+that long, so routing can be measured on a machine without TensorFlow.
+
+    python benchmarks/bench_inference_pool.py --nodes 3 --fake-model-ms 40 --slow-node 300 --kill-node
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+
+from inference_pool import InferencePool, NodeError
+
+NODE_APP = '''
+import os, time
+import numpy as np
+from main_auth import create_app
+from model_cascade import ModelCascade
+
+app = create_app("inference", load_model={load_model})
+delay = float(os.environ.get("BENCH_MODEL_MS", "0")) / 1000
+
+def stand_in_model(batch):
+    time.sleep(delay)
+    probabilities = np.full((len(batch), 38), 0.01, np.float32)
+    probabilities[:, int(np.asarray(batch).mean() * 37)] = 0.63
+    return probabilities
+
+if delay:
+    predictor = app.state.predictor
+    predictor.model = stand_in_model
+    predictor.cascade = ModelCascade(stand_in_model)
+'''
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_node(workdir, model_ms):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=f"{BACKEND_DIR}{os.pathsep}{workdir}", BENCH_MODEL_MS=str(model_ms),
+               QUALITY_GATE_MODE="off", PREDICT_MAX_CONCURRENCY="4")
+    nodedir = tempfile.mkdtemp(dir=workdir)
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "bench_node_app:app", "--host", "127.0.0.1",
+                                "--port", str(port), "--log-level", "warning"],
+                               cwd=nodedir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return f"http://127.0.0.1:{port}", process
+
+def wait_ready(url, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/node/health", timeout=1) as response:
+                if json.load(response)["ready"]:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready")
+
+def make_images(count, rng):
+    """Distinct small PNG-free payloads; nodes only need bytes that decode as an image"""
+    import cv2
+    return [cv2.imencode(".png", rng.integers(0, 255, (32, 32, 3), dtype=np.uint8))[1].tobytes()
+            for _ in range(count)]
+
+async def run(pool, images, args, processes, rng):
+    latencies, outcomes = [], {"ok": 0, "failed": 0}
+    sent = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        if sent and rng.random() < args.repeat_fraction:
+            image = sent[rng.integers(len(sent))]
+        else:
+            image = images[i]
+            sent.append(image)
+        upload_hash = hashlib.sha256(image).hexdigest()
+        async with semaphore:
+            if args.kill_node and i == args.requests // 2 and processes[0].poll() is None:
+                processes[0].terminate()
+            started = time.perf_counter()
+            try:
+                await pool.infer(upload_hash, image, 1)
+                outcomes["ok"] += 1
+            except NodeError:
+                outcomes["failed"] += 1
+            latencies.append(time.perf_counter() - started)
+
+    pool.start()
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    pool.stop()
+    return latencies, outcomes, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat-fraction", type=float, default=0.3)
+    parser.add_argument("--fake-model-ms", type=float, default=0,
+                        help="Stand-in model latency; 0 loads the real model on every node")
+    parser.add_argument("--slow-node", type=float, default=0, help="Extra model latency (ms) on the last node")
+    parser.add_argument("--kill-node", action="store_true", help="Stop the first node halfway through")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_inference_pool_")
+    with open(os.path.join(workdir, "bench_node_app.py"), "w") as f:
+        f.write(NODE_APP.format(load_model=not args.fake_model_ms))
+
+    urls, processes = [], []
+    try:
+        for index in range(args.nodes):
+            slow = args.slow_node if index == args.nodes - 1 else 0
+            url, process = start_node(workdir, args.fake_model_ms + slow)
+            urls.append(url)
+            processes.append(process)
+        for url in urls:
+            wait_ready(url)
+
+        rng = np.random.default_rng(0)
+        pool = InferencePool(urls, health_interval=1.0, ejection_seconds=10.0)
+        latencies, outcomes, elapsed = asyncio.run(run(pool, make_images(args.requests, rng), args, processes, rng))
+
+        latencies.sort()
+        print(f"requests {args.requests}  ok {outcomes['ok']}  failed {outcomes['failed']}  "
+              f"{args.requests / elapsed:.0f} req/s")
+        print(f"latency ms  p50 {latencies[len(latencies) // 2] * 1000:.1f}  "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}  max {latencies[-1] * 1000:.1f}")
+        stats = pool.stats()
+        print({key: value for key, value in stats.items() if key != "nodes"})
+        for node in stats["nodes"]:
+            cache = None
+            try:
+                with urllib.request.urlopen(f"{node['url']}/node/health", timeout=1) as response:
+                    cache = json.load(response)["cache"]
+            except OSError:
+                pass
+            print(f"  {node['url']}  requests {node['requests']}  failures {node['failures']}  "
+                  f"ejections {node['ejections']}  p50 {node['p50_ms']}ms  cache {cache}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Idle-connection benchmark for the live product update channel.
+
+Starts one uvicorn worker serving only the live update router (in a child
+process), opens N idle SSE connections to it, reports the worker's memory per
+connection, then inserts a product and times delivery to every connection.
+
+    python benchmarks/bench_live_updates.py --connections 10000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return float("nan")
+
+def setup_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            description TEXT,
+            farmer_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    from product_sync import init_change_log
+    init_change_log(path)
+
+def serve(db_path, port, backlog):
+    raise_fd_limit()
+    import uvicorn
+    from fastapi import FastAPI
+    from live_updates import ProductBroadcaster, create_live_router
+
+    broadcaster = ProductBroadcaster(db_path, poll_interval=0.1)
+    app = FastAPI()
+    app.include_router(create_live_router(broadcaster))
+
+    @app.on_event("startup")
+    async def start():
+        broadcaster.start()
+
+    @app.get("/stats")
+    async def stats():
+        return {"subscribers": broadcaster.subscriber_count}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, backlog=backlog, log_level="warning")
+
+async def open_stream(port, topic):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    query = f"?product_type={topic}" if topic else ""
+    writer.write(f"GET /products/live{query} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    # Wait for headers and the initial retry line so the subscription is registered
+    await reader.readuntil(b"retry: 5000\n\n")
+    return reader, writer
+
+async def wait_for_event(reader):
+    await reader.readuntil(b"event: created")
+
+async def run_clients(args, server):
+    started = time.perf_counter()
+    streams = []
+    topics = ["product", "tool", "fertilizer", None]
+    for offset in range(0, args.connections, args.ramp):
+        batch = [open_stream(args.port, topics[(offset + i) % len(topics)])
+                 for i in range(min(args.ramp, args.connections - offset))]
+        streams.extend(await asyncio.gather(*batch))
+    print(f"opened {len(streams)} connections in {time.perf_counter() - started:.1f}s")
+
+    await asyncio.sleep(2)
+    after = rss_mb(server.pid)
+    print(f"server RSS with {len(streams)} idle connections: {after:.1f} MB "
+          f"({(after - args.baseline_rss) * 1024 / len(streams):.1f} KB/connection over baseline)")
+
+    # A 'product' event should reach the 'product' topic and the unfiltered subscribers
+    expected = [reader for (reader, _), topic in zip(streams, (topics[i % 4] for i in range(len(streams))))
+                if topic in ("product", None)]
+    conn = sqlite3.connect(args.db)
+    published = time.perf_counter()
+    conn.execute("INSERT INTO products (name, type, category, price, quantity) VALUES ('Okra', 'product', 'vegetable', 20, 5)")
+    conn.commit()
+    conn.close()
+    await asyncio.wait_for(asyncio.gather(*(wait_for_event(reader) for reader in expected)), 60)
+    print(f"delivered to {len(expected)} subscribers in {(time.perf_counter() - published) * 1000:.0f}ms "
+          f"(includes up to 100ms change-log poll)")
+
+    for _, writer in streams:
+        writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ramp", type=int, default=500, help="Connections opened concurrently")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.db, args.port, args.connections)
+        return
+
+    limit = raise_fd_limit()
+    if limit is not None and limit < args.connections + 100:
+        sys.exit(f"File descriptor limit {limit} is too low for {args.connections} connections")
+
+    args.db = os.path.join(tempfile.mkdtemp(), "bench_live.db")
+    setup_database(args.db)
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--db", args.db,
+                               "--port", str(args.port), "--connections", str(args.connections)], cwd=BACKEND_DIR)
+    try:
+        time.sleep(3)
+        args.baseline_rss = rss_mb(server.pid)
+        print(f"server RSS at start: {args.baseline_rss:.1f} MB")
+        asyncio.run(run_clients(args, server))
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
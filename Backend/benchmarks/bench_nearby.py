@@ -0,0 +1,105 @@
+"""Nearby-search benchmark at catalog scale.
+
+Fills a scratch database with N random listings spread over India, then times
+find_nearby() with the R*Tree prefilter against a full-table NumPy scan.
+
+    python benchmarks/bench_nearby.py --listings 1000000 --queries 200
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_geo import find_nearby, haversine_km, init_geo
+
+LAT_RANGE = (8.0, 37.0)
+LON_RANGE = (68.0, 97.0)
+TYPES = ["product", "tool", "fertilizer"]
+
+def setup_database(path, listings, seed):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            description TEXT,
+            farmer_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    init_geo(path)
+
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(*LAT_RANGE, listings)
+    lons = rng.uniform(*LON_RANGE, listings)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('''
+            INSERT INTO products (name, type, category, price, quantity, farmer_id, latitude, longitude)
+            VALUES (?, ?, 'general', 100.0, 10, 1, ?, ?)
+        ''', ((f"Listing {i}", TYPES[i % 3], float(lats[i]), float(lons[i])) for i in range(listings)))
+    conn.close()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius-km", type=float, default=25.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_nearby.db")
+    started = time.perf_counter()
+    setup_database(path, args.listings, args.seed)
+    print(f"loaded {args.listings} listings in {time.perf_counter() - started:.1f}s")
+
+    rng = np.random.default_rng(args.seed + 1)
+    points = list(zip(rng.uniform(*LAT_RANGE, args.queries), rng.uniform(*LON_RANGE, args.queries)))
+
+    def run(label, **kwargs):
+        timings, hits = [], []
+        for lat, lon in points:
+            began = time.perf_counter()
+            results = find_nearby(path, float(lat), float(lon), args.radius_km, limit=50, **kwargs)
+            timings.append((time.perf_counter() - began) * 1000)
+            hits.append(len(results))
+        print(f"{label:<28} p50={statistics.median(timings):7.2f}ms p99={percentile(timings, 0.99):7.2f}ms "
+              f"avg results={statistics.mean(hits):.1f}")
+        return hits
+
+    rtree_hits = run("rtree")
+    run("rtree + product_type", product_type="product")
+
+    # Baseline: all coordinates in memory, exact distance to every listing
+    conn = sqlite3.connect(path)
+    coords = np.array(conn.execute("SELECT latitude, longitude FROM products").fetchall(), dtype=np.float64)
+    conn.close()
+    timings, scan_hits = [], []
+    for lat, lon in points:
+        began = time.perf_counter()
+        distances = haversine_km(float(lat), float(lon), coords[:, 0], coords[:, 1])
+        scan_hits.append(min(int((distances <= args.radius_km).sum()), 50))
+        timings.append((time.perf_counter() - began) * 1000)
+    print(f"{'numpy full scan (in memory)':<28} p50={statistics.median(timings):7.2f}ms "
+          f"p99={percentile(timings, 0.99):7.2f}ms")
+    assert rtree_hits == scan_hits, "R*Tree search disagrees with the full scan"
+
+if __name__ == "__main__":
+    main()
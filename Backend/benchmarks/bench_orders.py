@@ -0,0 +1,101 @@
+"""Contention benchmark: hundreds of concurrent buyers racing for one listing.
+
+Runs reserve_order() directly against a scratch SQLite database from many
+threads, then checks that exactly `stock` units were sold and none oversold.
+
+    python benchmarks/bench_orders.py --buyers 500 --stock 100
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+
+import orders
+
+def setup_database(path, stock):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            description TEXT,
+            farmer_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO products (name, type, category, price, quantity, farmer_id)
+        VALUES ('Fresh Tomatoes', 'product', 'vegetable', 50.0, ?, 1)
+    ''', (stock,))
+    conn.commit()
+    conn.close()
+    orders.init_order_tables(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--quantity", type=int, default=1, help="Units each buyer tries to reserve")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_orders.db")
+    setup_database(path, args.stock)
+
+    latencies = []
+    outcomes = {"reserved": 0, "sold_out": 0, "error": 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(args.buyers)
+
+    def buyer(buyer_id):
+        start_gate.wait()
+        began = time.perf_counter()
+        try:
+            orders.reserve_order(path, 1, buyer_id, args.quantity)
+            outcome = "reserved"
+        except HTTPException as e:
+            outcome = "sold_out" if e.status_code == 409 else "error"
+        except Exception:
+            outcome = "error"
+        elapsed = time.perf_counter() - began
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(args.buyers)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - began
+
+    conn = sqlite3.connect(path)
+    remaining = conn.execute("SELECT quantity FROM products WHERE id = 1").fetchone()[0]
+    sold = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM orders").fetchone()[0]
+    conn.close()
+
+    latencies.sort()
+    print(f"buyers={args.buyers} stock={args.stock} quantity={args.quantity}")
+    print(f"outcomes: {outcomes}")
+    print(f"units sold={sold} remaining={remaining} oversold={max(sold - args.stock, 0)}")
+    print(f"wall={wall:.3f}s throughput={args.buyers / wall:.0f} attempts/sec")
+    print(f"latency p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms")
+
+    assert sold + remaining == args.stock, "stock accounting mismatch"
+    assert remaining >= 0, "oversold"
+
+if __name__ == "__main__":
+    main()
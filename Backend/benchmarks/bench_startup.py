@@ -0,0 +1,106 @@
+"""Startup benchmark: time until /health answers and resident memory, per app role.
+
+Starts `uvicorn main_auth:app` once per role and run (APP_ROLE=api, inference,
+all) in a scratch directory, polls /health until the app is serving, then
+reads the worker's RSS. Roles with the model include TensorFlow import and
+the hub.load in their startup time.
+
+    python benchmarks/bench_startup.py --runs 3
+    python benchmarks/bench_startup.py --roles api --no-model
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROLES = ("api", "inference", "all")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def rss_mb(pid):
+    """Resident set size of a process in MB, or None if it cannot be read here"""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 1e6
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        return None
+    return None
+
+def start_once(role, load_model, timeout):
+    workdir = tempfile.mkdtemp(prefix=f"bench_startup_{role}_")
+    port = free_port()
+    env = dict(os.environ, APP_ROLE=role, PYTHONPATH=BACKEND_DIR)
+    app = "main_auth:app" if load_model else "main_simple:app"
+    if not load_model and role != "all":
+        # main_simple is always "all"; build the requested role without the model instead
+        app = "bench_startup_app:app"
+        with open(os.path.join(workdir, "bench_startup_app.py"), "w") as f:
+            f.write(f"from main_auth import create_app\napp = create_app({role!r}, load_model=False)\n")
+    command = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{role} exited with {process.returncode}: "
+                                   f"{process.stderr.read().decode(errors='replace')[-500:]}")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"{role} did not answer /health within {timeout}s")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                time.sleep(0.02)
+        ready = time.perf_counter() - started
+        return ready, rss_mb(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--roles", nargs="+", choices=ROLES, default=list(ROLES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-model", action="store_true",
+                        help="Skip TensorFlow and the model download (mock predictions)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    print(f"{'role':<10} {'ready_s median':>15} {'ready_s min':>12} {'rss_mb median':>14}")
+    for role in args.roles:
+        timings, memory = [], []
+        for _ in range(args.runs):
+            ready, rss = start_once(role, not args.no_model, args.timeout)
+            timings.append(ready)
+            if rss is not None:
+                memory.append(rss)
+        rss_text = f"{statistics.median(memory):14.1f}" if memory else f"{'n/a':>14}"
+        print(f"{role:<10} {statistics.median(timings):15.2f} {min(timings):12.2f} {rss_text}")
+
+if __name__ == "__main__":
+    main()
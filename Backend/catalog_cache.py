@@ -0,0 +1,132 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+def init_catalog_version(db_path: str):
+    """Create the shared catalog version counter and the triggers that bump it"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)")
+
+    # Any write to products, from any worker or tool, moves the version forward
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_catalog_version_{event.lower()}
+            AFTER {event} ON products
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+    conn.commit()
+    conn.close()
+
+def _serialize(value) -> bytes:
+    # Same output as FastAPI's JSONResponse so cached and uncached responses are identical
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+class CachedBody:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = _etag(body)
+
+class CatalogSnapshot:
+    """Immutable, pre-serialized view of the products table at one version"""
+
+    def __init__(self, version: int, rows):
+        self.version = version
+        products = [dict(row) for row in rows]
+        self.all = CachedBody(_serialize(products))
+
+        by_type: Dict[str, list] = {}
+        for product in products:
+            by_type.setdefault(product["type"], []).append(product)
+        self.by_type = {product_type: CachedBody(_serialize(items)) for product_type, items in by_type.items()}
+        self.empty = CachedBody(_serialize([]))
+
+        self.by_id = {product["id"]: CachedBody(_serialize(product)) for product in products}
+
+    def list_body(self, product_type: Optional[str] = None) -> CachedBody:
+        if product_type:
+            return self.by_type.get(product_type, self.empty)
+        return self.all
+
+    def product_body(self, product_id: int) -> Optional[CachedBody]:
+        return self.by_id.get(product_id)
+
+class CatalogCache:
+    """Serves the catalog from memory, rebuilding when the shared version counter moves.
+
+    The version row is re-read at most every ``max_staleness`` seconds, so
+    between checks (and for every 304) requests never touch SQLite. Writes made
+    through this worker call ``invalidate`` and are visible immediately; writes
+    from other workers are picked up within ``max_staleness``.
+    """
+
+    def __init__(self, db_path: str, max_staleness: float = 1.0):
+        self.db_path = db_path
+        self.max_staleness = max_staleness
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.rebuilds = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _current_version(self) -> int:
+        return self._connection().execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+
+    def invalidate(self):
+        """Force the next read to re-check the version counter"""
+        self._checked_at = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        """True when snapshot() can answer without touching the database"""
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.max_staleness
+
+    def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.max_staleness:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < self.max_staleness:
+                return snapshot
+
+            conn = self._connection()
+            # Read version and rows in one transaction so they describe the same state
+            with conn:
+                conn.execute("BEGIN")
+                version = self._current_version()
+                if snapshot is None or snapshot.version != version:
+                    rows = conn.execute("SELECT * FROM products").fetchall()
+                    snapshot = CatalogSnapshot(version, rows)
+                    self.rebuilds += 1
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            return snapshot
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (1, 4, 8, 16, 32)
+
+class BucketMetrics:
+    """Calls, real and padded images and recent latencies for one batch-size bucket"""
+
+    def __init__(self, window: int = 1024):
+        self.calls = 0
+        self.images = 0
+        self.slots = 0
+        self.total_seconds = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def observe(self, images: int, slots: int, seconds: float):
+        self.calls += 1
+        self.images += images
+        self.slots += slots
+        self.total_seconds += seconds
+        self.latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "calls": self.calls,
+            "images": self.images,
+            "padding_waste": round(1 - self.images / self.slots, 4) if self.slots else None,
+            "mean_ms": round(self.total_seconds * 1000 / self.calls, 2) if self.calls else None,
+            "p50_ms": round(float(np.percentile(recent, 50)), 2),
+            "p95_ms": round(float(np.percentile(recent, 95)), 2),
+        }
+
+class CompiledModel:
+    """A model behind one traced graph per batch-size bucket.
+
+    Calling a TF Hub model eagerly with a batch size it has not seen retraces
+    the graph, which stalls the first request at that size for seconds (the
+    cascade's escalations and field tiles come in every size). Here a batch
+    is zero-padded up to the next bucket, run through that bucket's concrete
+    function and the padding rows are dropped; batches beyond the largest
+    bucket run in chunks. ``warm()`` traces every bucket up front, so no
+    request pays for it. ``jit=True`` also compiles each graph with XLA.
+
+    Drop-in for the plain model wherever it is called as ``model(images)``.
+    """
+
+    def __init__(self, model, buckets: Sequence[int] = DEFAULT_BUCKETS, jit: bool = False,
+                 input_shape: Tuple[int, ...] = (224, 224, 3)):
+        import tensorflow as tf
+
+        self.model = model
+        self.buckets = sorted(set(int(b) for b in buckets if int(b) > 0))
+        if not self.buckets:
+            raise ValueError("At least one positive batch bucket is required")
+        self.jit = jit
+        self.input_shape = tuple(input_shape)
+        self._tf = tf
+
+        function = tf.function(lambda images: model(images), jit_compile=jit)
+        self._graphs = {
+            bucket: function.get_concrete_function(tf.TensorSpec((bucket,) + self.input_shape, tf.float32))
+            for bucket in self.buckets
+        }
+        self._lock = threading.Lock()
+        self.metrics = {bucket: BucketMetrics() for bucket in self.buckets}
+        self.warmup_ms: Dict[int, float] = {}
+
+    def bucket_for(self, count: int) -> int:
+        """Smallest bucket that holds `count` images (the largest bucket for bigger batches)"""
+        for bucket in self.buckets:
+            if bucket >= count:
+                return bucket
+        return self.buckets[-1]
+
+    def _run_bucket(self, bucket: int, images: np.ndarray) -> np.ndarray:
+        count = len(images)
+        if count < bucket:
+            images = np.concatenate([images, np.zeros((bucket - count,) + images.shape[1:], np.float32)])
+        outputs = self._graphs[bucket](self._tf.constant(images))
+        # Multi-output models (class scores plus features) keep every output
+        if isinstance(outputs, dict):
+            return {name: np.asarray(value)[:count] for name, value in outputs.items()}
+        return np.asarray(outputs)[:count]
+
+    def __call__(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, len(images), largest) or [0]:
+            chunk = images[start:start + largest]
+            bucket = self.bucket_for(len(chunk))
+            started = time.perf_counter()
+            outputs.append(self._run_bucket(bucket, chunk))
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.metrics[bucket].observe(len(chunk), bucket, elapsed)
+        if len(outputs) == 1:
+            return outputs[0]
+        if isinstance(outputs[0], dict):
+            return {name: np.concatenate([chunk[name] for chunk in outputs]) for name in outputs[0]}
+        return np.concatenate(outputs)
+
+    def warm(self):
+        """Run every bucket once so tracing (and XLA compilation) happens before the first request"""
+        for bucket in self.buckets:
+            started = time.perf_counter()
+            self._run_bucket(bucket, np.zeros((bucket,) + self.input_shape, np.float32))
+            self.warmup_ms[bucket] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Warmed model buckets {self.buckets} in {sum(self.warmup_ms.values()):.0f}ms "
+                    f"(jit={'on' if self.jit else 'off'})")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = {str(bucket): dict(metrics.snapshot(), warmup_ms=self.warmup_ms.get(bucket))
+                       for bucket, metrics in self.metrics.items()}
+            images = sum(metrics.images for metrics in self.metrics.values())
+            slots = sum(metrics.slots for metrics in self.metrics.values())
+        return {
+            "jit": self.jit,
+            "buckets": buckets,
+            "images": images,
+            "padding_waste": round(1 - images / slots, 4) if slots else None,
+        }
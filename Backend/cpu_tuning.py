@@ -0,0 +1,145 @@
+"""Per-worker CPU thread limits and affinity, read from the file tune_cpu.py writes.
+
+With several uvicorn workers on one machine, each TensorFlow runtime would
+otherwise size its intra-op and inter-op pools to every core and the workers
+oversubscribe the CPU. The tuned file records how many workers the machine
+was measured with, the thread counts per worker and, optionally, a disjoint
+set of cores for each worker to pin itself to.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TUNING_FILE = "cpu_tuning.json"
+
+# Lock file held by this process for its CPU slot; released when the process exits
+_slot_file = None
+
+def tuning_path() -> str:
+    return os.getenv("CPU_TUNING_FILE", DEFAULT_TUNING_FILE)
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def split_cpus(cpus: List[int], workers: int) -> List[List[int]]:
+    """Divide CPUs into one contiguous, equally sized set per worker (leftover cores go unused)"""
+    per_worker = len(cpus) // workers
+    if per_worker == 0:
+        return []
+    return [cpus[i * per_worker:(i + 1) * per_worker] for i in range(workers)]
+
+def thread_environment(intra_op_threads: int, inter_op_threads: int) -> Dict[str, str]:
+    """Environment variables that bound TensorFlow, OpenMP and BLAS thread pools; 0 leaves the default"""
+    env = {}
+    if intra_op_threads > 0:
+        env.update({
+            "TF_NUM_INTRAOP_THREADS": str(intra_op_threads),
+            "OMP_NUM_THREADS": str(intra_op_threads),
+            "OPENBLAS_NUM_THREADS": str(intra_op_threads),
+            "MKL_NUM_THREADS": str(intra_op_threads),
+        })
+    if inter_op_threads > 0:
+        env["TF_NUM_INTEROP_THREADS"] = str(inter_op_threads)
+    return env
+
+def load_tuning(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """The tuned configuration, or None when the file does not exist"""
+    path = path or tuning_path()
+    try:
+        with open(path) as f:
+            tuning = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring unreadable CPU tuning file {path}: {e}")
+        return None
+    if tuning.get("cpu_count") != os.cpu_count():
+        logger.warning(f"{path} was tuned on a machine with {tuning.get('cpu_count')} CPUs, "
+                       f"this one has {os.cpu_count()}; re-run tune_cpu.py")
+    return tuning
+
+def claim_cpu_slot(cpu_sets: List[List[int]], key: str) -> Optional[int]:
+    """Index of a CPU set no other worker of this deployment holds, or None if all are taken.
+
+    Uvicorn workers are not numbered, so each one takes the first free lock
+    file; the lock goes away with the process and a restarted worker reuses
+    the slot.
+    """
+    global _slot_file
+    try:
+        import fcntl
+    except ImportError:
+        return None
+
+    lock_dir = os.path.join(tempfile.gettempdir(), "agri_ai_cpu_slots", key)
+    os.makedirs(lock_dir, exist_ok=True)
+    for index in range(len(cpu_sets)):
+        f = open(os.path.join(lock_dir, f"slot_{index}.lock"), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _slot_file = f
+        return index
+    return None
+
+def apply_process_tuning(tuning: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Set thread limits and CPU affinity for this worker; call before TensorFlow is imported.
+
+    Variables already set in the environment win over the tuned values.
+    Returns what was applied, for logging and stats.
+    """
+    applied = {"intra_op_threads": 0, "inter_op_threads": 0, "cpus": None}
+    if not tuning:
+        return applied
+
+    intra, inter = int(tuning.get("intra_op_threads", 0)), int(tuning.get("inter_op_threads", 0))
+    for name, value in thread_environment(intra, inter).items():
+        os.environ.setdefault(name, value)
+    applied["intra_op_threads"] = int(os.environ.get("TF_NUM_INTRAOP_THREADS", 0))
+    applied["inter_op_threads"] = int(os.environ.get("TF_NUM_INTEROP_THREADS", 0))
+
+    # OpenCV decodes and resizes uploads in the same worker; keep its pool to the same size
+    if applied["intra_op_threads"]:
+        try:
+            import cv2
+            cv2.setNumThreads(applied["intra_op_threads"])
+        except ImportError:
+            pass
+
+    cpu_sets = tuning.get("cpu_sets") if tuning.get("affinity") else None
+    if cpu_sets and hasattr(os, "sched_setaffinity"):
+        key = hashlib.sha256(os.path.abspath(tuning_path()).encode()).hexdigest()[:12]
+        slot = claim_cpu_slot(cpu_sets, key)
+        if slot is None:
+            logger.warning(f"More model workers than the {len(cpu_sets)} tuned CPU sets; this one is not pinned")
+        else:
+            try:
+                os.sched_setaffinity(0, cpu_sets[slot])
+                applied["cpus"] = cpu_sets[slot]
+            except OSError as e:
+                logger.warning(f"Could not pin worker to CPUs {cpu_sets[slot]}: {e}")
+    return applied
+
+def apply_tensorflow_threads(tf, applied: Dict[str, Any]):
+    """Set TensorFlow's thread pools explicitly; only works before the runtime has run an op"""
+    try:
+        if applied["intra_op_threads"]:
+            tf.config.threading.set_intra_op_parallelism_threads(applied["intra_op_threads"])
+        if applied["inter_op_threads"]:
+            tf.config.threading.set_inter_op_parallelism_threads(applied["inter_op_threads"])
+    except RuntimeError as e:
+        logger.warning(f"TensorFlow was already initialized, thread limits come from the environment only: {e}")
+
+def tuned_batch_size(default: int) -> int:
+    tuning = load_tuning()
+    return int(tuning.get("batch_size", default)) if tuning else default
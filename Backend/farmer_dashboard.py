@@ -0,0 +1,220 @@
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# Orders count as sales once confirmed; reserved, cancelled and expired ones do not
+SALE_STATUS = "confirmed"
+
+def _listing_delta(row: str, sign: str) -> str:
+    """Trigger body adding (+) or removing (-) one product row in its farmer's listing aggregates"""
+    return f'''
+        INSERT INTO farmer_listing_stats (farmer_id, type, listings, units, stock_value)
+        SELECT {row}.farmer_id, {row}.type, {sign}1, {sign}{row}.quantity, {sign}{row}.price * {row}.quantity
+        WHERE {row}.farmer_id IS NOT NULL
+        ON CONFLICT (farmer_id, type) DO UPDATE SET
+            listings = listings + excluded.listings,
+            units = units + excluded.units,
+            stock_value = stock_value + excluded.stock_value;
+        DELETE FROM farmer_listing_stats WHERE farmer_id = {row}.farmer_id AND type = {row}.type AND listings = 0;
+    '''
+
+def _sale_delta(row: str, sign: str) -> str:
+    """Trigger body adding (+) or removing (-) one confirmed order in the selling farmer's sales.
+
+    Sales are dated by the order's updated_at, which is its confirmation time
+    while it stays confirmed. The seller is the farmer_id saved on the order at
+    reservation, so a listing deleted in the meantime does not lose the sale.
+    """
+    return f'''
+        INSERT INTO farmer_sales_daily (farmer_id, day, orders, units, revenue)
+        SELECT {row}.farmer_id, date({row}.updated_at, 'unixepoch'), {sign}1, {sign}{row}.quantity, {sign}{row}.total_price
+        WHERE {row}.farmer_id IS NOT NULL
+        ON CONFLICT (farmer_id, day) DO UPDATE SET
+            orders = orders + excluded.orders,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue;
+        INSERT INTO farmer_sales_totals (farmer_id, orders, units, revenue)
+        SELECT {row}.farmer_id, {sign}1, {sign}{row}.quantity, {sign}{row}.total_price
+        WHERE {row}.farmer_id IS NOT NULL
+        ON CONFLICT (farmer_id) DO UPDATE SET
+            orders = orders + excluded.orders,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue;
+    '''
+
+def init_dashboard_tables(db_path: str):
+    """Create the per-farmer aggregate tables and the triggers on products and orders that keep them current.
+
+    Run after the products and orders tables exist (see init_order_tables).
+    Existing rows are aggregated once, in the transaction that first creates
+    the triggers, so every worker starting at the same time sees either none
+    or all of it.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS farmer_listing_stats (
+                farmer_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                listings INTEGER NOT NULL,
+                units INTEGER NOT NULL,
+                stock_value REAL NOT NULL,
+                PRIMARY KEY (farmer_id, type)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS farmer_sales_daily (
+                farmer_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                orders INTEGER NOT NULL,
+                units INTEGER NOT NULL,
+                revenue REAL NOT NULL,
+                PRIMARY KEY (farmer_id, day)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS farmer_sales_totals (
+                farmer_id INTEGER PRIMARY KEY,
+                orders INTEGER NOT NULL,
+                units INTEGER NOT NULL,
+                revenue REAL NOT NULL
+            )
+        ''')
+
+        first_run = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_products_farmer_stats_insert'"
+        ).fetchone() is None
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_farmer_stats_insert AFTER INSERT ON products
+            BEGIN {_listing_delta("NEW", "+")} END
+        ''')
+        # Only columns that feed the aggregates; renames and description edits skip the trigger
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_farmer_stats_update
+            AFTER UPDATE OF farmer_id, type, price, quantity ON products
+            BEGIN {_listing_delta("OLD", "-")} {_listing_delta("NEW", "+")} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_farmer_stats_delete AFTER DELETE ON products
+            BEGIN {_listing_delta("OLD", "-")} END
+        ''')
+
+        # Recreated on every start so databases keep up with changes to the sales trigger bodies
+        for event in ("insert", "confirm", "unconfirm", "delete"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_orders_farmer_sales_{event}")
+        cursor.execute(f'''
+            CREATE TRIGGER trg_orders_farmer_sales_insert AFTER INSERT ON orders
+            WHEN NEW.status = '{SALE_STATUS}'
+            BEGIN {_sale_delta("NEW", "+")} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER trg_orders_farmer_sales_confirm AFTER UPDATE OF status ON orders
+            WHEN NEW.status = '{SALE_STATUS}' AND OLD.status != '{SALE_STATUS}'
+            BEGIN {_sale_delta("NEW", "+")} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER trg_orders_farmer_sales_unconfirm AFTER UPDATE OF status ON orders
+            WHEN OLD.status = '{SALE_STATUS}' AND NEW.status != '{SALE_STATUS}'
+            BEGIN {_sale_delta("OLD", "-")} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER trg_orders_farmer_sales_delete AFTER DELETE ON orders
+            WHEN OLD.status = '{SALE_STATUS}'
+            BEGIN {_sale_delta("OLD", "-")} END
+        ''')
+
+        if first_run:
+            for table in ("farmer_listing_stats", "farmer_sales_daily", "farmer_sales_totals"):
+                cursor.execute(f"DELETE FROM {table}")
+            cursor.execute('''
+                INSERT INTO farmer_listing_stats (farmer_id, type, listings, units, stock_value)
+                SELECT farmer_id, type, COUNT(*), SUM(quantity), SUM(price * quantity)
+                FROM products WHERE farmer_id IS NOT NULL GROUP BY farmer_id, type
+            ''')
+            cursor.execute('''
+                INSERT INTO farmer_sales_daily (farmer_id, day, orders, units, revenue)
+                SELECT farmer_id, date(updated_at, 'unixepoch'), COUNT(*), SUM(quantity), SUM(total_price)
+                FROM orders WHERE status = ? AND farmer_id IS NOT NULL
+                GROUP BY farmer_id, date(updated_at, 'unixepoch')
+            ''', (SALE_STATUS,))
+            cursor.execute('''
+                INSERT INTO farmer_sales_totals (farmer_id, orders, units, revenue)
+                SELECT farmer_id, SUM(orders), SUM(units), SUM(revenue) FROM farmer_sales_daily GROUP BY farmer_id
+            ''')
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def _sales_row(orders: int, units: int, revenue: float) -> Dict[str, Any]:
+    return {"orders": orders, "units": units, "revenue": round(revenue, 2)}
+
+def get_sales_series(db_path: str, farmer_id: int, start_day: str, end_day: str,
+                     interval: str = "day") -> List[Dict[str, Any]]:
+    """Confirmed sales per day, week (starting Monday) or month between two days, inclusive; empty periods included"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT day, orders, units, revenue FROM farmer_sales_daily
+        WHERE farmer_id = ? AND day BETWEEN ? AND ? ORDER BY day
+    ''', (farmer_id, start_day, end_day)).fetchall()
+    conn.close()
+
+    def period(day: date) -> str:
+        if interval == "week":
+            return (day - timedelta(days=day.weekday())).isoformat()
+        if interval == "month":
+            return day.isoformat()[:7]
+        return day.isoformat()
+
+    start, end = date.fromisoformat(start_day), date.fromisoformat(end_day)
+    series: Dict[str, List[float]] = {}
+    day = start
+    while day <= end:
+        series.setdefault(period(day), [0, 0, 0.0])
+        day += timedelta(days=1)
+    for day_text, orders, units, revenue in rows:
+        totals = series[period(date.fromisoformat(day_text))]
+        totals[0] += orders
+        totals[1] += units
+        totals[2] += revenue
+    return [{"period": key, **_sales_row(*totals)} for key, totals in series.items()]
+
+def get_dashboard(db_path: str, farmer_id: int, days: int = 30, today: Optional[date] = None) -> Dict[str, Any]:
+    """Listings by type, stock value, all-time sales and the last ``days`` days of sales for one farmer.
+
+    Reads only that farmer's aggregate rows, so the cost does not grow with
+    the catalog or order history.
+    """
+    conn = sqlite3.connect(db_path)
+    listing_rows = conn.execute('''
+        SELECT type, listings, units, stock_value FROM farmer_listing_stats WHERE farmer_id = ? ORDER BY type
+    ''', (farmer_id,)).fetchall()
+    totals = conn.execute('''
+        SELECT orders, units, revenue FROM farmer_sales_totals WHERE farmer_id = ?
+    ''', (farmer_id,)).fetchone()
+    conn.close()
+
+    by_type = [
+        {"type": product_type, "listings": listings, "units": units, "stock_value": round(stock_value, 2)}
+        for product_type, listings, units, stock_value in listing_rows
+    ]
+    # Sales days are UTC, as recorded by the triggers
+    end = today or datetime.now(timezone.utc).date()
+    start = end - timedelta(days=max(days, 1) - 1)
+    return {
+        "farmer_id": farmer_id,
+        "listings": {
+            "total": sum(row["listings"] for row in by_type),
+            "units": sum(row["units"] for row in by_type),
+            "stock_value": round(sum(row["stock_value"] for row in by_type), 2),
+            "by_type": by_type,
+        },
+        "sales": _sales_row(*totals) if totals else _sales_row(0, 0, 0.0),
+        "sales_by_day": get_sales_series(db_path, farmer_id, start.isoformat(), end.isoformat()),
+    }
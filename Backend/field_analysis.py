@@ -0,0 +1,177 @@
+import base64
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from model_cascade import to_probabilities
+from tensor_protocol import to_model_input
+
+TILE_SIZE = 224
+
+def load_field_image(image_bytes: bytes, working_size: int) -> Optional[np.ndarray]:
+    """Decode to RGB, shrinking so the long side is at most ``working_size`` pixels"""
+    bgr = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        return None
+    scale = working_size / max(bgr.shape[:2])
+    if scale < 1:
+        bgr = cv2.resize(bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+def _axis_positions(length: int, tile: int, stride: int):
+    """Tile count and a uniform step so the last tile ends within a few pixels of the edge"""
+    if length <= tile:
+        return 1, tile
+    count = -(-(length - tile) // stride) + 1
+    return count, (length - tile) // (count - 1)
+
+def tile_view(image: np.ndarray, tile: int = TILE_SIZE, stride: int = 160) -> np.ndarray:
+    """(rows, cols, tile, tile, 3) read-only view of overlapping tiles; no pixel is copied"""
+    height, width, channels = image.shape
+    if height < tile or width < tile:
+        raise ValueError(f"Image must be at least {tile}x{tile}")
+    rows, step_y = _axis_positions(height, tile, stride)
+    cols, step_x = _axis_positions(width, tile, stride)
+    s_y, s_x, s_c = image.strides
+    return as_strided(image, shape=(rows, cols, tile, tile, channels),
+                      strides=(s_y * step_y, s_x * step_x, s_y, s_x, s_c), writeable=False)
+
+def tile_fractions(mask: np.ndarray, rows: int, cols: int, step_y: int, step_x: int, tile: int) -> np.ndarray:
+    """Fraction of set pixels under every tile, from one summed-area table"""
+    integral = cv2.integral(mask.astype(np.uint8))
+    ys = np.arange(rows) * step_y
+    xs = np.arange(cols) * step_x
+    y0, x0 = np.meshgrid(ys, xs, indexing="ij")
+    y1, x1 = y0 + tile, x0 + tile
+    counts = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return counts / float(tile * tile)
+
+class FieldAnalyzer:
+    """Diagnoses a wide field photo from overlapping 224x224 tiles.
+
+    Tiles come from a strided view of the decoded image. A leaf-colour mask
+    (one HSV pass plus a summed-area table) drops tiles that are mostly soil
+    or sky, the remaining tiles are scored in batches, and per-tile votes are
+    aggregated into a plot-level diagnosis and a disease-probability heatmap.
+    """
+
+    def __init__(self, model_fn: Callable[[np.ndarray], Any], class_names: List[str],
+                 tile: int = TILE_SIZE, stride: int = 160, working_size: int = 1344,
+                 min_leaf_fraction: float = 0.25, min_confidence: float = 0.5,
+                 min_disease_share: float = 0.1, batch_size: int = 32,
+                 hsv_low=(12, 40, 40), hsv_high=(95, 255, 255)):
+        self.model_fn = model_fn
+        self.class_names = class_names
+        self.healthy = np.array(["healthy" in name.lower() for name in class_names])
+        self.tile = tile
+        self.stride = stride
+        self.working_size = working_size
+        self.min_leaf_fraction = min_leaf_fraction
+        self.min_confidence = min_confidence
+        self.min_disease_share = min_disease_share
+        self.batch_size = batch_size
+        self.hsv_low = np.array(hsv_low, dtype=np.uint8)
+        self.hsv_high = np.array(hsv_high, dtype=np.uint8)
+
+    def analyze(self, image: np.ndarray, include_overlay: bool = False) -> Dict[str, Any]:
+        """Plot-level diagnosis for an RGB uint8 image"""
+        if min(image.shape[:2]) < self.tile:
+            scale = self.tile / min(image.shape[:2])
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+        tiles = tile_view(image, self.tile, self.stride)
+        rows, cols = tiles.shape[:2]
+        step_y = tiles.strides[0] // image.strides[0]
+        step_x = tiles.strides[1] // image.strides[1]
+
+        leaf_mask = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_RGB2HSV), self.hsv_low, self.hsv_high)
+        leaf_fraction = tile_fractions(leaf_mask > 0, rows, cols, step_y, step_x, self.tile)
+        selected = np.argwhere(leaf_fraction >= self.min_leaf_fraction)
+        if not len(selected):
+            # Nothing leaf-coloured: score the single most vegetated tile rather than nothing
+            selected = np.array([np.unravel_index(leaf_fraction.argmax(), leaf_fraction.shape)])
+
+        probabilities = np.empty((len(selected), len(self.class_names)), dtype=np.float32)
+        for start in range(0, len(selected), self.batch_size):
+            chunk = selected[start:start + self.batch_size]
+            batch = to_model_input([tiles[r, c] for r, c in chunk])
+            probabilities[start:start + len(chunk)] = to_probabilities(self.model_fn(batch))
+
+        result = self._aggregate(probabilities)
+        heatmap = np.full((rows, cols), np.nan, dtype=np.float32)
+        heatmap[selected[:, 0], selected[:, 1]] = 1.0 - probabilities[:, self.healthy].sum(axis=1)
+        result.update({
+            "tiles": {"rows": int(rows), "cols": int(cols), "analyzed": int(len(selected)),
+                      "skipped": int(rows * cols - len(selected)), "size": self.tile,
+                      "step": [int(step_y), int(step_x)], "image_size": [int(image.shape[1]), int(image.shape[0])]},
+            # Disease probability per tile, null where the tile was not leaf
+            "heatmap": [[None if np.isnan(v) else round(float(v), 3) for v in row] for row in heatmap],
+        })
+        if include_overlay:
+            result["overlay_jpeg"] = base64.b64encode(
+                render_overlay(image, heatmap, step_y, step_x, self.tile)
+            ).decode("ascii")
+        return result
+
+    def _aggregate(self, probabilities: np.ndarray) -> Dict[str, Any]:
+        classes = probabilities.argmax(axis=1)
+        confidences = probabilities.max(axis=1)
+        confident = confidences >= self.min_confidence
+        counted = classes[confident] if confident.any() else classes
+
+        tiles_per_class = np.bincount(counted, minlength=len(self.class_names))
+        confidence_sum = np.bincount(classes, weights=confidences, minlength=len(self.class_names))
+        total = int(tiles_per_class.sum())
+
+        votes = [
+            {
+                "class": self.class_names[index],
+                "tiles": int(tiles_per_class[index]),
+                "share": round(float(tiles_per_class[index]) / total, 4),
+                "mean_confidence": round(float(confidence_sum[index] / np.count_nonzero(classes == index)) * 100, 2),
+            }
+            for index in np.argsort(-tiles_per_class) if tiles_per_class[index]
+        ]
+
+        disease_tiles = tiles_per_class * ~self.healthy
+        affected = float(disease_tiles.sum()) / total
+        if disease_tiles.any() and disease_tiles.max() / total >= self.min_disease_share:
+            # A minority of diseased tiles is still the finding that matters for the plot
+            diagnosis = self.class_names[int(disease_tiles.argmax())]
+        else:
+            diagnosis = self.class_names[int(tiles_per_class.argmax())]
+
+        parts = diagnosis.split("___")
+        disease = parts[1].replace("_", " ") if len(parts) > 1 else "Unknown"
+        return {
+            "diagnosis": diagnosis,
+            "plant": parts[0].replace("_", " "),
+            "disease": disease,
+            "is_healthy": "healthy" in disease.lower(),
+            "affected_fraction": round(affected, 4),
+            "votes": votes,
+            "low_confidence_tiles": int((~confident).sum()),
+        }
+
+def render_overlay(image: np.ndarray, heatmap: np.ndarray, step_y: int, step_x: int, tile: int,
+                   quality: int = 80) -> bytes:
+    """JPEG of the photo tinted by per-tile disease probability (overlaps averaged)"""
+    height, width = image.shape[:2]
+    total = np.zeros((height, width), dtype=np.float32)
+    weight = np.zeros((height, width), dtype=np.float32)
+    for (r, c), value in np.ndenumerate(heatmap):
+        if np.isnan(value):
+            continue
+        y, x = r * step_y, c * step_x
+        total[y:y + tile, x:x + tile] += value
+        weight[y:y + tile, x:x + tile] += 1
+    scored = weight > 0
+    level = np.zeros((height, width), dtype=np.uint8)
+    level[scored] = np.clip(total[scored] / weight[scored] * 255, 0, 255).astype(np.uint8)
+
+    bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    colored = cv2.applyColorMap(level, cv2.COLORMAP_JET)
+    blended = np.where(scored[..., None], cv2.addWeighted(bgr, 0.55, colored, 0.45, 0), bgr)
+    return cv2.imencode(".jpg", blended, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
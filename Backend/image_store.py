@@ -0,0 +1,168 @@
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_INPUT_SIZE = (224, 224)
+DERIVATIVE_SUFFIX = "_224.webp"
+ORIGINAL_SUFFIX = ".orig"
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+def init_image_tables(db_path: str):
+    """Create the index of images kept in the content-addressed store"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stored_images (
+            hash TEXT PRIMARY KEY,
+            content_type TEXT,
+            size_bytes INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    conn.commit()
+    conn.close()
+
+def is_valid_image_hash(image_hash: str) -> bool:
+    return bool(_HASH_PATTERN.match(image_hash or ""))
+
+def sniff_content_type(image_bytes: bytes) -> Optional[str]:
+    """Guess the MIME type of common upload formats from their magic bytes"""
+    if image_bytes.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bytes[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if image_bytes.startswith(b"BM"):
+        return "image/bmp"
+    return None
+
+class ImageStore:
+    """Content-addressed image store on local disk.
+
+    Files live under ``root/<h[0:2]>/<h[2:4]>/<hash>`` so no directory grows
+    past a few thousand entries. Each upload is kept as the original bytes plus
+    a 224x224 WebP derivative matching the model input. Writes are queued and
+    performed by a background thread so the request path only hashes the bytes.
+    """
+
+    def __init__(self, root: str, db_path: str, queue_size: int = 256, webp_quality: int = 90):
+        self.root = root
+        self.db_path = db_path
+        self.webp_quality = webp_quality
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self.dropped = 0
+
+    # Paths
+    def _shard_dir(self, image_hash: str) -> str:
+        return os.path.join(self.root, image_hash[0:2], image_hash[2:4])
+
+    def original_path(self, image_hash: str) -> str:
+        return os.path.join(self._shard_dir(image_hash), image_hash + ORIGINAL_SUFFIX)
+
+    def derivative_path(self, image_hash: str) -> str:
+        return os.path.join(self._shard_dir(image_hash), image_hash + DERIVATIVE_SUFFIX)
+
+    def exists(self, image_hash: str) -> bool:
+        return os.path.exists(self.derivative_path(image_hash))
+
+    # Writes
+    def save_async(self, image_hash: str, image_bytes: bytes, content_type: Optional[str] = None) -> bool:
+        """Queue an upload for storage; returns False if it was dropped because the queue is full"""
+        if self.exists(image_hash):
+            return True
+        try:
+            self._queue.put_nowait((image_hash, image_bytes, content_type))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Image store queue full, not storing {image_hash}")
+            return False
+
+    def save(self, image_hash: str, image_bytes: bytes, content_type: Optional[str] = None):
+        """Write the original and its model-ready derivative, skipping images already stored"""
+        if self.exists(image_hash):
+            return
+        # Only writers need OpenCV; API-only workers serve stored files without importing it
+        import cv2
+
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            logger.warning(f"Not storing undecodable image {image_hash}")
+            return
+        height, width = img.shape[:2]
+        derivative = cv2.resize(img, MODEL_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".webp", derivative, [cv2.IMWRITE_WEBP_QUALITY, self.webp_quality])
+        if not ok:
+            logger.warning(f"Could not encode derivative for {image_hash}")
+            return
+
+        os.makedirs(self._shard_dir(image_hash), exist_ok=True)
+        # Original first: the derivative's presence marks the entry complete
+        self._write_atomic(self.original_path(image_hash), image_bytes)
+        self._write_atomic(self.derivative_path(image_hash), encoded.tobytes())
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO stored_images (hash, content_type, size_bytes, width, height, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (image_hash, content_type or sniff_content_type(image_bytes), len(image_bytes),
+                  width, height, time.time()))
+        conn.close()
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # Background writer
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._writer_loop, name="image-store-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Finish queued writes and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _writer_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self.save(*item)
+            except Exception as e:
+                logger.error(f"Image store write failed for {item[0]}: {e}")
+
+    # Reads
+    def get_info(self, image_hash: str) -> Optional[Dict[str, Any]]:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM stored_images WHERE hash = ?", (image_hash,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
@@ -0,0 +1,442 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import JSONResponse
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+import cpu_tuning
+import tensor_protocol
+from admission_control import AdmissionController
+from advisories import localized_headers, prediction_response, request_language
+from compiled_model import DEFAULT_BUCKETS, CompiledModel
+from disease_classes import class_indices
+from field_analysis import FieldAnalyzer, load_field_image
+from image_quality import ImageQualityError, QualityGate
+from image_store import ImageStore
+from model_cascade import ModelCascade, split_outputs
+from prediction_results import MAX_UPLOAD_BYTES, PREDICT_TIMEOUT, PredictionRecorder
+from similar_cases import SimilarCaseIndex, with_feature_output
+from single_flight import SingleFlight
+from tensor_protocol import TensorPayloadError
+
+logger = logging.getLogger(__name__)
+
+MODEL_URL = "https://www.kaggle.com/models/rishitdagli/plant-disease/TensorFlow2/plant-disease/1"
+
+class InferenceService:
+    """Disease model, upload preprocessing and per-prediction bookkeeping.
+
+    Construction is cheap. TensorFlow is only imported by ``load()``, which
+    the app runs at startup in roles that serve predictions; with
+    ``load_model=False`` (or if loading fails) predictions fall back to
+    mock results.
+    """
+
+    def __init__(self, db_path: str, image_store: ImageStore, load_model: bool = True):
+        self.db_path = db_path
+        self.image_store = image_store
+        self.load_model = load_model
+        self.model = None
+        self.cascade = ModelCascade(None)
+        self.field_analyzer = None
+        self.similar_cases = None
+        self.cpu = None
+
+        # Blur / exposure / leaf checks run on every upload before it reaches the model
+        self.quality_gate = QualityGate(
+            mode=os.getenv("QUALITY_GATE_MODE", "flag"),
+            min_sharpness=float(os.getenv("QUALITY_MIN_SHARPNESS", "60")),
+            max_dark_fraction=float(os.getenv("QUALITY_MAX_DARK_FRACTION", "0.6")),
+            max_bright_fraction=float(os.getenv("QUALITY_MAX_BRIGHT_FRACTION", "0.5")),
+            min_green_ratio=float(os.getenv("QUALITY_MIN_GREEN_RATIO", "0.08")),
+        )
+        self.recorder = PredictionRecorder(db_path, image_store)
+
+    def load(self):
+        """Import TensorFlow Hub and load the models; idempotent"""
+        if not self.load_model or self.model is not None:
+            return
+        # Thread limits and CPU pinning from tune_cpu.py must be in place before TensorFlow starts
+        self.cpu = cpu_tuning.apply_process_tuning(cpu_tuning.load_tuning())
+        import tensorflow as tf
+        import tensorflow_hub as hub
+        cpu_tuning.apply_tensorflow_threads(tf, self.cpu)
+
+        try:
+            # Features for similar-case search come out of the same forward pass as the class scores
+            raw_model = with_feature_output(hub.load(MODEL_URL))
+            print("TensorFlow model loaded successfully")
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            return
+        self.model = self.compile(raw_model)
+
+        # Optional small model that answers confident images before the full model (see tune_cascade.py)
+        fast_model = None
+        fast_model_url = os.getenv("FAST_MODEL_URL")
+        if fast_model_url:
+            try:
+                fast_model = self.compile(hub.load(fast_model_url))
+                print("Fast cascade model loaded successfully")
+            except Exception as e:
+                print(f"Error loading fast cascade model: {e}")
+        self.cascade = ModelCascade(self.model, fast_model, threshold=float(os.getenv("CASCADE_THRESHOLD", "0.9")))
+
+        # Tiled multi-leaf analysis of wide field photos (full model only, tiles need class probabilities)
+        self.field_analyzer = FieldAnalyzer(
+            self.model, [class_indices[str(i)] for i in range(len(class_indices))],
+            stride=int(os.getenv("FIELD_TILE_STRIDE", "160")),
+            working_size=int(os.getenv("FIELD_WORKING_SIZE", "1344")),
+        )
+
+        # Feature vectors of scored uploads for similar-case search
+        try:
+            features = self.embed(np.zeros((1, 224, 224, 3), np.float32))
+            if features is None:
+                logger.warning("Similar-case search disabled: the model returns no "
+                               "feature output next to its class scores (see MODEL_FEATURE_OUTPUT)")
+            else:
+                self.similar_cases = SimilarCaseIndex(
+                    self.db_path, os.getenv("EMBEDDING_DIR", "embeddings"), features.shape[-1],
+                    ivf_threshold=int(os.getenv("SIMILAR_IVF_THRESHOLD", "50000"))
+                )
+        except Exception as e:
+            logger.error(f"Similar-case search disabled: {e}")
+
+    def compile(self, model):
+        """Fixed-shape graphs per batch bucket, traced before the first request; the eager model if that fails"""
+        if os.getenv("MODEL_COMPILE", "1") == "0":
+            return model
+        buckets = [int(b) for b in os.getenv("MODEL_BATCH_BUCKETS", ",".join(map(str, DEFAULT_BUCKETS))).split(",")]
+        try:
+            compiled = CompiledModel(model, buckets, jit=os.getenv("MODEL_XLA_JIT", "0") == "1")
+            compiled.warm()
+        except Exception as e:
+            logger.error(f"Serving the model eagerly, graph compilation failed: {e}")
+            return model
+        return compiled
+
+    def start(self):
+        self.load()
+        if self.similar_cases is not None:
+            self.similar_cases.start()
+        self.recorder.start()
+
+    def stop(self):
+        self.recorder.stop()
+        if self.similar_cases is not None:
+            self.similar_cases.stop()
+
+    def preprocess_image_from_upload(self, image_bytes):
+        """Preprocess uploaded image for prediction; returns (model input, quality report)"""
+        try:
+            # Convert bytes to PIL Image
+            image = Image.open(io.BytesIO(image_bytes))
+            # Convert to RGB if needed
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            # Convert to numpy array
+            img_array = np.array(image)
+            # Resize to model input size
+            img_array = cv2.resize(img_array, (224, 224))
+        except Exception as e:
+            print(f"Error preprocessing image: {e}")
+            return None, None
+
+        # Raises ImageQualityError in reject mode
+        quality = self.quality_gate.assess(img_array)
+        # Normalize pixel values
+        img_array = img_array.astype(np.float32) / 255.0
+        # Add batch dimension
+        img_array = np.expand_dims(img_array, axis=0)
+        return img_array, quality
+
+    def embed(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """Feature vector of one preprocessed image from the full model, or None if it exposes none"""
+        features = split_outputs(self.model(image))[1]
+        return None if features is None else features[0]
+
+    def infer_upload(self, image_bytes: bytes) -> Optional[Dict[str, Any]]:
+        """Decode, quality-check and classify an upload; None if the model is unavailable or decoding fails"""
+        if self.model is None:
+            return None
+        processed_image, quality = self.preprocess_image_from_upload(image_bytes)
+        if processed_image is None:
+            return None
+        results, features = self.cascade.predict_with_features(processed_image)
+        predicted_index, confidence, stage = results[0]
+        return {
+            "predicted_class": class_indices[str(predicted_index)],
+            "confidence": confidence * 100,
+            "stage": stage,
+            "quality": quality,
+            "features": features[0],
+        }
+
+    def infer_tensors(self, images: List[np.ndarray]) -> List[Any]:
+        """Quality-check and classify client-resized RGB images with one model call.
+
+        Returns, per image, an inference dict (as infer_upload), the ImageQualityError
+        that rejected it, or None when the model is unavailable.
+        """
+        if self.model is None:
+            return [None] * len(images)
+
+        outcomes = []
+        for image in images:
+            try:
+                outcomes.append(self.quality_gate.assess(image))
+            except ImageQualityError as e:
+                outcomes.append(e)
+
+        accepted = [i for i, outcome in enumerate(outcomes) if not isinstance(outcome, ImageQualityError)]
+        if accepted:
+            batch = tensor_protocol.to_model_input([images[i] for i in accepted])
+            results, features = self.cascade.predict_with_features(batch)
+            for i, (predicted_index, confidence, stage), vector in zip(accepted, results, features):
+                outcomes[i] = {
+                    "predicted_class": class_indices[str(predicted_index)],
+                    "confidence": confidence * 100,
+                    "stage": stage,
+                    "quality": outcomes[i],
+                    "features": vector,
+                }
+        return outcomes
+
+    def build_prediction(self, upload_hash: str, image_bytes: bytes, inference: Optional[Dict[str, Any]],
+                         **kwargs) -> Dict[str, Any]:
+        """PredictionRecorder.build_prediction, also indexing the image's features for similar-case search"""
+        self.index_features(upload_hash, inference)
+        return self.recorder.build_prediction(upload_hash, image_bytes, inference, **kwargs)
+
+    def index_features(self, upload_hash: str, inference: Optional[Dict[str, Any]]):
+        """Queue the features from the prediction's model call; images the fast model answered have none"""
+        if inference is not None and self.similar_cases is not None and inference["features"] is not None:
+            self.similar_cases.add_async(upload_hash, inference["predicted_class"], inference["confidence"],
+                                         inference["features"])
+
+    def run_prediction(self, image_bytes: bytes, region: Optional[str] = None,
+                       latitude: Optional[float] = None, longitude: Optional[float] = None,
+                       user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Run disease prediction on raw image bytes and build the response payload"""
+        upload_hash = hashlib.sha256(image_bytes).hexdigest()
+        return self.build_prediction(upload_hash, image_bytes, self.infer_upload(image_bytes),
+                                     region=region, latitude=latitude, longitude=longitude, user_id=user_id)
+
+def create_inference_router(service: InferenceService, admission: AdmissionController,
+                            prediction_flight: SingleFlight, optional_user: Callable) -> APIRouter:
+    """/predict/* model endpoints served by the inference role"""
+    router = APIRouter()
+
+    @router.post("/predict/")
+    async def predict_disease(request: Request, file: UploadFile = File(...), region: Optional[str] = Form(None),
+                              latitude: Optional[float] = Form(None, ge=-90, le=90),
+                              longitude: Optional[float] = Form(None, ge=-180, le=180),
+                              current_user: Optional[dict] = Depends(optional_user)):
+        """Plant disease prediction from uploaded image"""
+
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+        if file.size and file.size > MAX_UPLOAD_BYTES:  # 10MB limit
+            raise HTTPException(status_code=400, detail="File size too large (max 10MB)")
+
+        key, priority = admission.classify_request(request, current_user)
+        admission.check_rate(key, priority)
+
+        upload_size = file.size or MAX_UPLOAD_BYTES
+        admission.reserve_bytes(upload_size)
+        try:
+            # Read image
+            image_bytes = await file.read()
+            if len(image_bytes) == 0:
+                raise HTTPException(status_code=400, detail="Empty image file")
+            upload_hash = hashlib.sha256(image_bytes).hexdigest()
+
+            async def infer():
+                # Signed-in farmers are admitted ahead of anonymous traffic when all inference slots are busy
+                async with admission.inference_slot(priority):
+                    # Off the event loop so queued requests and other endpoints stay responsive
+                    return await run_in_threadpool(service.infer_upload, image_bytes)
+
+            # Identical uploads already in flight share one decode and model call
+            inference = await prediction_flight.do(upload_hash, infer, timeout=PREDICT_TIMEOUT)
+            return prediction_response(service.build_prediction(
+                upload_hash, image_bytes, inference, region=region, latitude=latitude, longitude=longitude,
+                language=request_language(request), user_id=current_user["id"] if current_user else None
+            ))
+
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Prediction timed out, please retry")
+        except ImageQualityError as e:
+            raise HTTPException(status_code=422, detail={"message": str(e), "reasons": e.reasons,
+                                                         "scores": e.scores})
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Prediction error: {e}")
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+        finally:
+            admission.release_bytes(upload_size)
+
+    @router.get("/predict/spec")
+    async def prediction_input_spec(response: Response):
+        """Input format for /predict/tensor, so clients can resize and encode on the device"""
+        response.headers["Cache-Control"] = "public, max-age=3600"
+        return tensor_protocol.model_spec()
+
+    @router.post("/predict/tensor")
+    async def predict_tensor(request: Request, region: Optional[str] = None,
+                             latitude: Optional[float] = Query(None, ge=-90, le=90),
+                             longitude: Optional[float] = Query(None, ge=-180, le=180),
+                             current_user: Optional[dict] = Depends(optional_user)):
+        """Prediction on 224x224 RGB images already resized on the device (see /predict/spec).
+
+        The body is raw uint8 pixels (application/octet-stream), a WebP image
+        (image/webp), or a msgpack batch (application/x-msgpack) answered with
+        {"results": [...]}.
+        """
+        max_body = tensor_protocol.MAX_BATCH * tensor_protocol.RAW_IMAGE_BYTES + 64 * 1024
+        declared = int(request.headers.get("content-length") or 0)
+        if declared > max_body:
+            raise HTTPException(status_code=413, detail="Payload too large")
+
+        key, priority = admission.classify_request(request, current_user)
+        reserved = declared or max_body
+        admission.reserve_bytes(reserved)
+        try:
+            body = await request.body()
+            if len(body) > max_body:
+                raise HTTPException(status_code=413, detail="Payload too large")
+            content_type = request.headers.get("content-type", "")
+            try:
+                images, stored = await run_in_threadpool(tensor_protocol.decode_request, body, content_type)
+            except TensorPayloadError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            # Batches are charged one token per image
+            admission.check_rate(key, priority, cost=len(images))
+            # Keyed by the bytes the image store keeps, so the id always names the stored file
+            hashes = [hashlib.sha256(data).hexdigest() for data, _ in stored]
+
+            async def infer():
+                async with admission.inference_slot(priority):
+                    return await run_in_threadpool(service.infer_tensors, images)
+
+            if len(images) == 1:
+                outcomes = await prediction_flight.do(("tensor", hashes[0]), infer, timeout=PREDICT_TIMEOUT)
+            else:
+                outcomes = await asyncio.wait_for(infer(), PREDICT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Prediction timed out, please retry")
+        finally:
+            admission.release_bytes(reserved)
+
+        results = []
+        language = request_language(request)
+        user_id = current_user["id"] if current_user else None
+        for (data, store_type), upload_hash, outcome in zip(stored, hashes, outcomes):
+            if isinstance(outcome, ImageQualityError):
+                results.append({"image_id": upload_hash, "error": str(outcome), "reasons": outcome.reasons,
+                                "scores": outcome.scores})
+            else:
+                results.append(service.build_prediction(upload_hash, data, outcome, region=region,
+                                                        latitude=latitude, longitude=longitude,
+                                                        content_type=store_type, language=language,
+                                                        user_id=user_id))
+
+        if content_type.startswith(tensor_protocol.CONTENT_TYPE_MSGPACK):
+            return JSONResponse({"results": results}, headers=localized_headers(language))
+        if "error" in results[0]:
+            raise HTTPException(status_code=422, detail={"message": results[0]["error"],
+                                                         "reasons": results[0]["reasons"],
+                                                         "scores": results[0]["scores"]})
+        return prediction_response(results[0])
+
+    @router.post("/predict/field")
+    async def predict_field(request: Request, file: UploadFile = File(...), include_overlay: bool = Query(False),
+                            current_user: Optional[dict] = Depends(optional_user)):
+        """Plot-level diagnosis of a wide crop-row photo from overlapping leaf tiles, with a heatmap"""
+        field_analyzer = service.field_analyzer
+        if field_analyzer is None:
+            raise HTTPException(status_code=503, detail="Field analysis needs the disease model")
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        if file.size and file.size > MAX_UPLOAD_BYTES:  # 10MB limit
+            raise HTTPException(status_code=400, detail="File size too large (max 10MB)")
+
+        key, priority = admission.classify_request(request, current_user)
+        admission.check_rate(key, priority)
+        async with admission.admit(priority, file.size or MAX_UPLOAD_BYTES):
+            image_bytes = await file.read()
+            # Decoding and resizing a 10MB photo takes long enough to stall the event loop
+            image = await run_in_threadpool(load_field_image, image_bytes, field_analyzer.working_size)
+            if image is None:
+                raise HTTPException(status_code=400, detail="Could not decode image")
+            result = await run_in_threadpool(field_analyzer.analyze, image, include_overlay)
+
+        upload_hash = hashlib.sha256(image_bytes).hexdigest()
+        service.image_store.save_async(upload_hash, image_bytes)
+        result["image_id"] = upload_hash
+        return result
+
+    @router.post("/predict/similar")
+    async def find_similar_cases(request: Request, file: UploadFile = File(...), k: int = Query(10, ge=1, le=50),
+                                 current_user: Optional[dict] = Depends(optional_user)):
+        """Past predictions whose images look most like the upload (cosine similarity of model embeddings)"""
+        similar_cases = service.similar_cases
+        if similar_cases is None:
+            raise HTTPException(status_code=503, detail="Similar-case search is unavailable")
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        if file.size and file.size > MAX_UPLOAD_BYTES:  # 10MB limit
+            raise HTTPException(status_code=400, detail="File size too large (max 10MB)")
+
+        key, priority = admission.classify_request(request, current_user)
+        admission.check_rate(key, priority)
+        async with admission.admit(priority, file.size or MAX_UPLOAD_BYTES):
+            image_bytes = await file.read()
+            try:
+                processed_image, _ = await run_in_threadpool(service.preprocess_image_from_upload, image_bytes)
+            except ImageQualityError as e:
+                raise HTTPException(status_code=422, detail={"message": str(e), "reasons": e.reasons,
+                                                             "scores": e.scores})
+            if processed_image is None:
+                raise HTTPException(status_code=400, detail="Could not decode image")
+            upload_hash = hashlib.sha256(image_bytes).hexdigest()
+            # A query only needs the features, so this is the image's one model call
+            features = await run_in_threadpool(service.embed, processed_image)
+            cases = await run_in_threadpool(similar_cases.search, features, k, exclude_hash=upload_hash)
+        return {"image_id": upload_hash, "cases": cases}
+
+    @router.get("/predict/similar/stats")
+    async def similar_case_stats():
+        if service.similar_cases is None:
+            raise HTTPException(status_code=503, detail="Similar-case search is unavailable")
+        return service.similar_cases.stats()
+
+    @router.get("/predict/quality")
+    async def prediction_quality_stats():
+        """Quality gate mode and pass / flag / reject counts by reason"""
+        return service.quality_gate.stats()
+
+    @router.get("/predict/cascade")
+    async def prediction_cascade_stats():
+        """Per-stage hit rate and latency of the fast/full model cascade"""
+        return service.cascade.stats()
+
+    @router.get("/predict/compiled")
+    async def compiled_model_stats():
+        """Per-bucket calls, latency, padding waste and warm-up time of the compiled model graphs"""
+        models = {"full": service.cascade.full_model, "fast": service.cascade.fast_model}
+        return {name: model.stats() if isinstance(model, CompiledModel) else None for name, model in models.items()}
+
+    return router
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from admission_control import PRIORITY_ANONYMOUS, AdmissionController
+from image_quality import ImageQualityError
+from inference import InferenceService
+from prediction_results import MAX_UPLOAD_BYTES, PREDICT_TIMEOUT
+from single_flight import SingleFlight
+
+# Fields of an inference result that travel between nodes and API workers
+WIRE_FIELDS = ("predicted_class", "confidence", "stage", "quality")
+
+class InferenceCache:
+    """LRU of wire-format inference results by upload hash.
+
+    API workers route an image hash to the same node every time (see
+    inference_pool.py), so a repeat upload is answered here without a model call.
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, value: Dict[str, Any]):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+def create_node_router(service: InferenceService, admission: AdmissionController,
+                       prediction_flight: SingleFlight, cache_size: int = 1024) -> APIRouter:
+    """Model-only endpoints that API workers call over HTTP.
+
+    /node/infer takes the raw upload bytes and answers with the inference
+    result only; the calling API worker does the rate limiting, history and
+    response building. Not meant to be exposed outside the cluster.
+    """
+    router = APIRouter()
+    cache = InferenceCache(cache_size)
+
+    def infer(upload_hash: str, image_bytes: bytes) -> Optional[Dict[str, Any]]:
+        inference = service.infer_upload(image_bytes)
+        if inference is None:
+            return None
+        service.index_features(upload_hash, inference)
+        result = {field: inference[field] for field in WIRE_FIELDS}
+        cache.put(upload_hash, result)
+        return result
+
+    @router.post("/node/infer")
+    async def node_infer(request: Request):
+        """Inference result for the raw image bytes in the body, or null if the model is unavailable"""
+        image_bytes = await request.body()
+        if not image_bytes:
+            raise HTTPException(status_code=400, detail="Empty image file")
+        if len(image_bytes) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="File size too large (max 10MB)")
+
+        upload_hash = hashlib.sha256(image_bytes).hexdigest()
+        cached = cache.get(upload_hash)
+        if cached is not None:
+            return {"inference": cached, "cached": True}
+
+        # The API worker forwards the caller's class so farmers keep their place in this node's queue
+        try:
+            priority = int(request.headers.get("x-inference-priority", PRIORITY_ANONYMOUS))
+        except ValueError:
+            priority = PRIORITY_ANONYMOUS
+
+        async def run():
+            async with admission.inference_slot(priority):
+                return await run_in_threadpool(infer, upload_hash, image_bytes)
+
+        try:
+            inference = await prediction_flight.do(("node", upload_hash), run, timeout=PREDICT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Inference timed out")
+        except ImageQualityError as e:
+            raise HTTPException(status_code=422, detail={"message": str(e), "reasons": e.reasons,
+                                                         "scores": e.scores})
+        return {"inference": inference, "cached": False}
+
+    @router.get("/node/health")
+    async def node_health():
+        """Readiness for the API workers' health checks: ready once the model is loaded"""
+        return {
+            "ready": service.model is not None,
+            "in_flight": admission.gate.in_flight,
+            "waiting": admission.gate.waiting,
+            "cache": cache.stats(),
+            "cpu": service.cpu,
+        }
+
+    return router
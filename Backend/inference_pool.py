@@ -0,0 +1,450 @@
+import asyncio
+import bisect
+import hashlib
+import http.client
+import json
+import logging
+import statistics
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
+
+from admission_control import PRIORITY_ANONYMOUS, AdmissionController
+from advisories import prediction_response, request_language
+from prediction_results import MAX_UPLOAD_BYTES, PREDICT_TIMEOUT, PredictionRecorder
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class NodeError(Exception):
+    """A node could not answer (connection failure, timeout, overload, 5xx); worth trying another"""
+
+class NodeRejected(Exception):
+    """A node answered that the image itself is unusable (e.g. the quality gate); not retried"""
+
+    def __init__(self, status: int, detail: Any):
+        self.status = status
+        self.detail = detail
+        super().__init__(detail.get("message") if isinstance(detail, dict) else str(detail))
+
+class InferenceNode:
+    """One remote inference node: a keep-alive connection pool plus health and ejection state"""
+
+    def __init__(self, url: str, timeout: float, max_idle: int = 8):
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme != "http" or not parsed.hostname:
+            raise ValueError(f"Inference node URL must be http://host:port, got {url!r}")
+        self.url = url.rstrip("/")
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+        self.healthy = True
+        self.ready = True
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.requests = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=256)
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.ready and now >= self.ejected_until
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """(status, body bytes) over a pooled HTTP/1.1 connection"""
+        for attempt in range(2):
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                # The node may have closed an idle keep-alive connection; retry once on a fresh one
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    if len(self._idle) < self.max_idle:
+                        self._idle.append(conn)
+                        conn = None
+                if conn is not None:
+                    conn.close()
+            return response.status, data
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ready": self.ready,
+            "ejected_for": round(max(self.ejected_until - now, 0.0), 1),
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "requests": self.requests,
+            "failures": self.failures,
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "idle_connections": len(self._idle),
+        }
+
+class InferencePool:
+    """Client for a set of inference nodes (processes serving /node/infer).
+
+    Requests are placed on a consistent-hash ring by image hash, so repeat
+    uploads of the same photo reach the node that has it cached and adding
+    or removing a node only moves ~1/N of the keys. Nodes leave the rotation
+    when the periodic /node/health check fails or after ``max_failures``
+    consecutive request failures, or when their median latency is
+    ``slow_factor`` times the other nodes' (ejected for ``ejection_seconds``,
+    doubling on repeat ejections). A request that fails is retried on the
+    next node on the ring; one still unanswered after the typical node's p95
+    is hedged with a second request to the next node, within a
+    ``max_hedge_fraction`` budget, and the first answer wins.
+    """
+
+    def __init__(self, urls: List[str], virtual_nodes: int = 64, timeout: float = 30.0,
+                 health_interval: float = 5.0, health_timeout: float = 2.0, max_failures: int = 3,
+                 ejection_seconds: float = 30.0, max_ejection_fraction: float = 0.5,
+                 max_attempts: int = 3, hedge_delay: float = 0.5, min_hedge_delay: float = 0.05,
+                 max_hedge_fraction: float = 0.1, slow_factor: float = 3.0, max_idle_connections: int = 8):
+        if not urls:
+            raise ValueError("InferencePool needs at least one node URL")
+        self.nodes = [InferenceNode(url, timeout, max_idle_connections) for url in urls]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+        self.ejection_seconds = ejection_seconds
+        self.max_ejection_fraction = max_ejection_fraction
+        self.max_attempts = max_attempts
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_fraction = max_hedge_fraction
+        self.slow_factor = slow_factor
+
+        ring = sorted(
+            (self._hash(f"{node.url}#{replica}"), index)
+            for index, node in enumerate(self.nodes) for replica in range(virtual_nodes)
+        )
+        self._ring_points = [point for point, _ in ring]
+        self._ring_nodes = [index for _, index in ring]
+
+        # Blocking node calls run here, not in the event loop's default pool shared with request handlers
+        self._executor = ThreadPoolExecutor(max_workers=len(self.nodes) * (max_idle_connections + 1),
+                                            thread_name_prefix="inference-pool")
+        self._lock = threading.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self.counters = {"requests": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "failed": 0,
+                         "rejected": 0, "ejections": 0}
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    def candidates(self, key: str) -> List[InferenceNode]:
+        """Available nodes in ring order from ``key``; all of them if none is available"""
+        start = bisect.bisect(self._ring_points, self._hash(key))
+        order = []
+        for offset in range(len(self._ring_nodes)):
+            index = self._ring_nodes[(start + offset) % len(self._ring_nodes)]
+            if index not in order:
+                order.append(index)
+                if len(order) == len(self.nodes):
+                    break
+        now = time.monotonic()
+        nodes = [self.nodes[index] for index in order]
+        return [node for node in nodes if node.available(now)] or nodes
+
+    # Outcome bookkeeping (called from executor threads)
+    def _succeeded(self, node: InferenceNode, seconds: float):
+        with self._lock:
+            node.requests += 1
+            node.consecutive_failures = 0
+            node.latencies.append(seconds)
+
+    def _eject(self, node: InferenceNode, now: float) -> bool:
+        """Take a node out of rotation; caller holds the lock"""
+        ejected = sum(1 for other in self.nodes if now < other.ejected_until)
+        # Never eject so many nodes that the survivors are overwhelmed
+        if now < node.ejected_until or ejected + 1 > max(1, int(len(self.nodes) * self.max_ejection_fraction)):
+            return False
+        node.ejected_until = now + self.ejection_seconds * 2 ** min(node.ejections, 4)
+        node.ejections += 1
+        node.consecutive_failures = 0
+        # It comes back judged on fresh latencies
+        node.latencies.clear()
+        self.counters["ejections"] += 1
+        return True
+
+    def _failed(self, node: InferenceNode, error: Exception):
+        with self._lock:
+            node.requests += 1
+            node.failures += 1
+            node.consecutive_failures += 1
+            if node.consecutive_failures < self.max_failures or not self._eject(node, time.monotonic()):
+                return
+        logger.warning(f"Ejected inference node {node.url} after repeated failures: {error}")
+
+    def _node_quantiles(self, q: float) -> List[float]:
+        """Latency quantile ``q`` of each node with enough recent samples"""
+        with self._lock:
+            samples = [sorted(node.latencies) for node in self.nodes]
+        return [latencies[int(len(latencies) * q)] for latencies in samples if len(latencies) >= 20]
+
+    def _hedge_after(self) -> float:
+        # The typical node's p95: one slow node must not raise the bar for hedging away from it
+        quantiles = self._node_quantiles(0.95)
+        if not quantiles:
+            return self.hedge_delay
+        return max(statistics.median(quantiles), self.min_hedge_delay)
+
+    def _eject_slow_nodes(self):
+        """Outlier ejection by latency: a node whose median is far above the other nodes' leaves for a while"""
+        now = time.monotonic()
+        with self._lock:
+            medians = {node: sorted(node.latencies)[len(node.latencies) // 2]
+                       for node in self.nodes if len(node.latencies) >= 20 and node.available(now)}
+            if len(medians) < 2:
+                return
+            # Judged against its peers only; with the node itself in the median, one of two can never stand out
+            typical = {node: statistics.median(other for peer, other in medians.items() if peer is not node)
+                       for node in medians}
+            slow = [node for node, median in medians.items()
+                    if median > typical[node] * self.slow_factor and median - typical[node] > self.min_hedge_delay]
+            slow = [node for node in slow if self._eject(node, now)]
+        for node in slow:
+            logger.warning(f"Ejected slow inference node {node.url} (median {medians[node] * 1000:.0f}ms, "
+                           f"others {typical[node] * 1000:.0f}ms)")
+
+    def _call(self, node: InferenceNode, image_bytes: bytes, priority: int) -> Optional[Dict[str, Any]]:
+        """One blocking /node/infer request; the wire-format inference or None"""
+        started = time.perf_counter()
+        try:
+            status, data = node.request("POST", "/node/infer", body=image_bytes, headers={
+                "Content-Type": "application/octet-stream",
+                "X-Inference-Priority": str(priority),
+            })
+        except (OSError, http.client.HTTPException) as e:
+            error = NodeError(f"{node.url}: {e}")
+            self._failed(node, error)
+            raise error
+
+        if status == 200:
+            self._succeeded(node, time.perf_counter() - started)
+            return json.loads(data)["inference"]
+        if status in (400, 413, 422):
+            # The node is fine, the image is not
+            self._succeeded(node, time.perf_counter() - started)
+            try:
+                detail = json.loads(data).get("detail")
+            except ValueError:
+                detail = data.decode("utf-8", "replace")
+            raise NodeRejected(status, detail)
+        error = NodeError(f"{node.url} answered {status}")
+        self._failed(node, error)
+        raise error
+
+    async def infer(self, upload_hash: str, image_bytes: bytes, priority: int) -> Optional[Dict[str, Any]]:
+        """Inference from the node owning ``upload_hash``, with retries and a hedged second request"""
+        loop = asyncio.get_running_loop()
+        candidates = self.candidates(upload_hash)[:self.max_attempts]
+        pending: Dict[asyncio.Future, InferenceNode] = {}
+        hedge = None
+        next_index = 0
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_index
+            future = loop.run_in_executor(self._executor, self._call, candidates[next_index], image_bytes, priority)
+            # A losing request still finishes in its thread; keep its error from being logged as unretrieved
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            pending[future] = candidates[next_index]
+            next_index += 1
+            return future
+
+        with self._lock:
+            self.counters["requests"] += 1
+            hedge_allowed = self.counters["hedged"] < self.counters["requests"] * self.max_hedge_fraction
+        launch()
+        while pending:
+            can_hedge = hedge is None and hedge_allowed and next_index < len(candidates)
+            done, _ = await asyncio.wait(pending, timeout=self._hedge_after() if can_hedge else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # The first node is slower than usual: race it against the next one
+                with self._lock:
+                    self.counters["hedged"] += 1
+                hedge = launch()
+                continue
+
+            for future in done:
+                pending.pop(future)
+                try:
+                    result = future.result()
+                except NodeRejected:
+                    with self._lock:
+                        self.counters["rejected"] += 1
+                    raise
+                except NodeError as e:
+                    last_error = e
+                    continue
+                if future is hedge:
+                    with self._lock:
+                        self.counters["hedge_wins"] += 1
+                return result
+
+            if not pending and next_index < len(candidates):
+                with self._lock:
+                    self.counters["retries"] += 1
+                launch()
+
+        with self._lock:
+            self.counters["failed"] += 1
+        raise NodeError(f"No inference node answered: {last_error}")
+
+    def infer_blocking(self, upload_hash: str, image_bytes: bytes, priority: int) -> Optional[Dict[str, Any]]:
+        """infer() for worker threads: the same routing and retries, without hedging"""
+        last_error = None
+        for node in self.candidates(upload_hash)[:self.max_attempts]:
+            try:
+                return self._call(node, image_bytes, priority)
+            except NodeError as e:
+                last_error = e
+        raise NodeError(f"No inference node answered: {last_error}")
+
+    # Active health checks
+    def _check(self, node: InferenceNode):
+        try:
+            status, data = node.request("GET", "/node/health", timeout=self.health_timeout)
+            healthy, ready = status == 200, status == 200 and bool(json.loads(data).get("ready"))
+        except (OSError, http.client.HTTPException, ValueError):
+            healthy, ready = False, False
+        if healthy != node.healthy or ready != node.ready:
+            logger.info(f"Inference node {node.url}: healthy={healthy} ready={ready}")
+        node.healthy, node.ready = healthy, ready
+
+    async def _health_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.gather(*(loop.run_in_executor(self._executor, self._check, node) for node in self.nodes))
+            self._eject_slow_nodes()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self._health_task is None:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for node in self.nodes:
+            node.close()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        hedge_after = self._hedge_after()
+        with self._lock:
+            return {**self.counters, "hedge_after_ms": round(hedge_after * 1000, 1),
+                    "nodes": [node.stats(now) for node in self.nodes]}
+
+class RemoteInference:
+    """/predict/ for API workers whose model runs on inference nodes"""
+
+    def __init__(self, pool: InferencePool, recorder: PredictionRecorder):
+        self.pool = pool
+        self.recorder = recorder
+
+    def start(self):
+        self.recorder.start()
+        self.pool.start()
+
+    def stop(self):
+        self.pool.stop()
+        self.recorder.stop()
+
+    def run_prediction(self, image_bytes: bytes, region: Optional[str] = None,
+                       latitude: Optional[float] = None, longitude: Optional[float] = None,
+                       user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Prediction for a queued job; runs in a job worker thread"""
+        upload_hash = hashlib.sha256(image_bytes).hexdigest()
+        inference = self.pool.infer_blocking(upload_hash, image_bytes, PRIORITY_ANONYMOUS)
+        return self.recorder.build_prediction(upload_hash, image_bytes, inference, region=region,
+                                              latitude=latitude, longitude=longitude, user_id=user_id)
+
+def create_remote_predict_router(remote: RemoteInference, admission: AdmissionController,
+                                 prediction_flight: SingleFlight, optional_user: Callable) -> APIRouter:
+    """/predict/ served by forwarding the model call to the inference pool"""
+    router = APIRouter()
+
+    @router.post("/predict/")
+    async def predict_disease(request: Request, file: UploadFile = File(...), region: Optional[str] = Form(None),
+                              latitude: Optional[float] = Form(None, ge=-90, le=90),
+                              longitude: Optional[float] = Form(None, ge=-180, le=180),
+                              current_user: Optional[dict] = Depends(optional_user)):
+        """Plant disease prediction from uploaded image"""
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+        if file.size and file.size > MAX_UPLOAD_BYTES:  # 10MB limit
+            raise HTTPException(status_code=400, detail="File size too large (max 10MB)")
+
+        key, priority = admission.classify_request(request, current_user)
+        admission.check_rate(key, priority)
+
+        upload_size = file.size or MAX_UPLOAD_BYTES
+        admission.reserve_bytes(upload_size)
+        try:
+            image_bytes = await file.read()
+            if len(image_bytes) == 0:
+                raise HTTPException(status_code=400, detail="Empty image file")
+            upload_hash = hashlib.sha256(image_bytes).hexdigest()
+
+            # Concurrency is bounded by each node's own admission gate, not here
+            inference = await prediction_flight.do(
+                upload_hash, lambda: remote.pool.infer(upload_hash, image_bytes, priority), timeout=PREDICT_TIMEOUT
+            )
+            return prediction_response(remote.recorder.build_prediction(
+                upload_hash, image_bytes, inference, region=region, latitude=latitude, longitude=longitude,
+                language=request_language(request), user_id=current_user["id"] if current_user else None
+            ))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Prediction timed out, please retry")
+        except NodeRejected as e:
+            raise HTTPException(status_code=e.status, detail=e.detail)
+        except NodeError as e:
+            logger.error(f"Prediction error: {e}")
+            raise HTTPException(status_code=503, detail="Disease model is temporarily unavailable, please retry")
+        finally:
+            admission.release_bytes(upload_size)
+
+    @router.get("/predict/pool")
+    async def inference_pool_stats():
+        """Per-node health, ejection and latency, plus retry and hedging counters"""
+        return remote.pool.stats()
+
+    return router
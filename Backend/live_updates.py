@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import sqlite3
+from typing import Any, Dict, Optional, Set
+
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+ALL_TOPIC = "all"
+
+class Subscriber:
+    """One live connection with a bounded send queue"""
+    __slots__ = ("queue", "product_type", "category", "topic", "dropped")
+
+    def __init__(self, product_type: Optional[str], category: Optional[str], queue_size: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.product_type = product_type
+        self.category = category
+        # Register under the most selective topic; the other filter is checked on delivery
+        if product_type:
+            self.topic = f"type:{product_type}"
+        elif category:
+            self.topic = f"category:{category}"
+        else:
+            self.topic = ALL_TOPIC
+        self.dropped = False
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        return not self.category or event.get("category") == self.category
+
+class ProductBroadcaster:
+    """Fans product change events out to subscribers grouped by topic.
+
+    Events come from tailing the ``product_changes`` log, so every uvicorn
+    worker sees writes made by any other worker. A subscriber whose queue fills
+    up is disconnected instead of letting the backlog grow.
+    """
+
+    def __init__(self, db_path: str, queue_size: int = 64, poll_interval: float = 0.5):
+        self.db_path = db_path
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self._topics: Dict[str, Set[Subscriber]] = {}
+        # product_id -> (type, category, quantity), so deletes and stock changes can be routed
+        self._known: Dict[int, tuple] = {}
+        self._last_seq = 0
+        self._task = None
+        self.dropped_subscribers = 0
+
+    # Subscriptions
+    def subscribe(self, product_type: Optional[str] = None, category: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(product_type, category, self.queue_size)
+        self._topics.setdefault(subscriber.topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        members = self._topics.get(subscriber.topic)
+        if members is not None:
+            members.discard(subscriber)
+            if not members:
+                del self._topics[subscriber.topic]
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(members) for members in self._topics.values())
+
+    def publish(self, event: Dict[str, Any]):
+        topics = (ALL_TOPIC, f"type:{event.get('type')}", f"category:{event.get('category')}")
+        for topic in topics:
+            for subscriber in list(self._topics.get(topic, ())):
+                if not subscriber.wants(event):
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        """Disconnect a consumer that cannot keep up"""
+        self.unsubscribe(subscriber)
+        subscriber.dropped = True
+        self.dropped_subscribers += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    # Change log tailing
+    def _load_initial_state(self):
+        conn = sqlite3.connect(self.db_path)
+        self._last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM product_changes").fetchone()[0]
+        for product_id, product_type, category, quantity in conn.execute(
+            "SELECT id, type, category, quantity FROM products"
+        ):
+            self._known[product_id] = (product_type, category, quantity)
+        conn.close()
+
+    def _read_changes(self, since: int):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute('''
+            SELECT c.seq, c.product_id, c.op, p.*
+            FROM product_changes c
+            LEFT JOIN products p ON p.id = c.product_id
+            WHERE c.seq > ?
+            ORDER BY c.seq
+            LIMIT 1000
+        ''', (since,)).fetchall()
+        conn.close()
+        return rows
+
+    def _to_event(self, row) -> Optional[Dict[str, Any]]:
+        product_id = row["product_id"]
+        previous = self._known.get(product_id)
+
+        if row["id"] is None and row["op"] != "delete":
+            # Deleted since this change was logged; its delete entry follows
+            return None
+        if row["op"] == "delete":
+            self._known.pop(product_id, None)
+            product_type, category = previous[:2] if previous else (None, None)
+            return {"event": "deleted", "seq": row["seq"], "id": product_id, "type": product_type, "category": category}
+
+        product = {key: row[key] for key in row.keys() if key not in ("seq", "product_id", "op")}
+        self._known[product_id] = (product["type"], product["category"], product["quantity"])
+        if row["op"] == "insert" or previous is None:
+            kind = "created"
+        elif previous[2] != product["quantity"]:
+            kind = "stock_changed"
+        else:
+            kind = "updated"
+        return {"event": kind, "seq": row["seq"], "id": product_id, "type": product["type"],
+                "category": product["category"], "product": product}
+
+    async def _tail(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._load_initial_state)
+        while True:
+            try:
+                rows = await loop.run_in_executor(None, self._read_changes, self._last_seq)
+                for row in rows:
+                    self._last_seq = row["seq"]
+                    event = self._to_event(row)
+                    if event is not None:
+                        self.publish(event)
+                if len(rows) == 1000:
+                    continue
+            except Exception as e:
+                logger.error(f"Live update tail failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._tail())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for members in list(self._topics.values()):
+            for subscriber in list(members):
+                self._drop(subscriber)
+
+def create_live_router(broadcaster: ProductBroadcaster, heartbeat_seconds: float = 15.0) -> APIRouter:
+    """SSE and WebSocket endpoints streaming product events from ``broadcaster``"""
+    router = APIRouter()
+
+    @router.get("/products/live")
+    async def product_events(request: Request, product_type: Optional[str] = None, category: Optional[str] = None):
+        """Server-Sent Events stream of product created/updated/stock_changed/deleted events"""
+        subscriber = broadcaster.subscribe(product_type, category)
+
+        async def stream():
+            try:
+                yield "retry: 5000\n\n"
+                while True:
+                    try:
+                        event = await asyncio.wait_for(subscriber.queue.get(), heartbeat_seconds)
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            return
+                        yield ": ping\n\n"
+                        continue
+                    if event is None:
+                        return
+                    yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            finally:
+                broadcaster.unsubscribe(subscriber)
+
+        return StreamingResponse(stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @router.websocket("/ws/products")
+    async def product_events_ws(websocket: WebSocket, product_type: Optional[str] = None,
+                                category: Optional[str] = None):
+        """WebSocket stream of the same product events as /products/live"""
+        await websocket.accept()
+        subscriber = broadcaster.subscribe(product_type, category)
+
+        async def send_events():
+            while True:
+                event = await subscriber.queue.get()
+                if event is None:
+                    # Dropped as a slow consumer (or shutting down)
+                    await websocket.close(code=1013)
+                    return
+                await websocket.send_json(event)
+
+        async def watch_disconnect():
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+        tasks = [asyncio.create_task(send_events()), asyncio.create_task(watch_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            broadcaster.unsubscribe(subscriber)
+
+    return router
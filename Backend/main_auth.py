@@ -1,74 +1,48 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status
+from fastapi import APIRouter, FastAPI, Query, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import numpy as np
-import cv2
+from fastapi.responses import FileResponse, Response
 import os
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import sqlite3
 from datetime import datetime, timedelta
 import logging
-import random
-import hashlib
 import jwt
 from passlib.context import CryptContext
-import tensorflow as tf
-import tensorflow_hub as hub
-from PIL import Image
-import io
-
-# Load the model from TensorFlow Hub (do this once at startup)
-try:
-    model = hub.load("https://www.kaggle.com/models/rishitdagli/plant-disease/TensorFlow2/plant-disease/1")
-    print("TensorFlow model loaded successfully")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
-
-# Define class indices manually
-class_indices = {
-    "0": "Apple___Apple_scab", "1": "Apple___Black_rot", "2": "Apple___Cedar_apple_rust", "3": "Apple___healthy",
-    "4": "Blueberry___healthy", "5": "Cherry_(including_sour)___Powdery_mildew", "6": "Cherry_(including_sour)___healthy",
-    "7": "Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot", "8": "Corn_(maize)___Common_rust_", 
-    "9": "Corn_(maize)___Northern_Leaf_Blight", "10": "Corn_(maize)___healthy", "11": "Grape___Black_rot",
-    "12": "Grape___Esca_(Black_Measles)", "13": "Grape___Leaf_blight_(Isariopsis_Leaf_Spot)", "14": "Grape___healthy",
-    "15": "Orange___Haunglongbing_(Citrus_greening)", "16": "Peach___Bacterial_spot", "17": "Peach___healthy",
-    "18": "Pepper_bell___Bacterial_spot", "19": "Pepper_bell___healthy", "20": "Potato___Early_blight",
-    "21": "Potato___Late_blight", "22": "Potato___healthy", "23": "Raspberry___healthy", "24": "Soybean___healthy",
-    "25": "Squash___Powdery_mildew", "26": "Strawberry___Leaf_scorch", "27": "Strawberry___healthy",
-    "28": "Tomato___Bacterial_spot", "29": "Tomato___Early_blight", "30": "Tomato___Late_blight",
-    "31": "Tomato___Leaf_Mold", "32": "Tomato___Septoria_leaf_spot",
-    "33": "Tomato___Spider_mites Two-spotted_spider_mite", "34": "Tomato___Target_Spot",
-    "35": "Tomato___Tomato_Yellow_Leaf_Curl_Virus", "36": "Tomato___Tomato_mosaic_virus", "37": "Tomato___healthy"
-}
-
-def preprocess_image_from_upload(image_bytes):
-    """Preprocess uploaded image for prediction"""
-    try:
-        # Convert bytes to PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        # Convert to numpy array
-        img_array = np.array(image)
-        # Resize to model input size
-        img_array = cv2.resize(img_array, (224, 224))
-        # Normalize pixel values
-        img_array = img_array.astype(np.float32) / 255.0
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
-        return img_array
-    except Exception as e:
-        print(f"Error preprocessing image: {e}")
-        return None
+from starlette.concurrency import run_in_threadpool
+from admission_control import AdmissionController, PRIORITY_NAMES
+from single_flight import SingleFlight
+from similar_cases import init_embedding_tables
+from prediction_jobs import PredictionJobQueue, create_job_router, init_job_tables
+from prediction_history import get_daily_counts, get_region_totals, init_history_tables
+from outbreak_detection import init_outbreak_tables
+from image_store import ImageStore, init_image_tables, is_valid_image_hash
+import orders
+from catalog_cache import CatalogCache, init_catalog_version
+from product_sync import compact_change_log, get_changes, init_change_log
+from live_updates import ProductBroadcaster, create_live_router
+from product_facets import FacetIndex
+from product_geo import find_nearby, init_geo
+from advisories import create_advisory_router
+from farmer_dashboard import get_dashboard, get_sales_series, init_dashboard_tables
+import maintenance
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Agri-AI Backend", version="1.0.0")
+# Worker roles: "api" serves auth, catalog, orders and stored images without
+# importing the ML stack; "inference" serves the model endpoints; "all" both
+ROLE_API = "api"
+ROLE_INFERENCE = "inference"
+ROLE_ALL = "all"
+ROLES = (ROLE_API, ROLE_INFERENCE, ROLE_ALL)
+
+# Routes every role serves
+core_router = APIRouter()
+# Auth, catalog, orders, stored images and prediction analytics
+api_router = APIRouter()
 
 # Security
 SECRET_KEY = "your-secret-key-change-in-production"
@@ -77,15 +51,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
-
-# CORS Configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for development
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+optional_security = HTTPBearer(auto_error=False)
 
 # Database setup
 DATABASE_PATH = "agri_ai.db"
@@ -94,6 +60,9 @@ def init_database():
     """Initialize SQLite database with required tables"""
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
+
+    # Only takes effect while the file is still empty; older databases are converted offline (maintenance.py)
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
     
     # Users table
     cursor.execute('''
@@ -151,38 +120,26 @@ def init_database():
 
 # Initialize database on startup
 init_database()
-
-# Mock disease detection data
-MOCK_DISEASES = [
-    {
-        "plant": "Tomato",
-        "disease": "Early_blight",
-        "symptoms": "Brown spots with concentric rings on leaves",
-        "treatment": "Apply fungicides containing chlorothalonil or mancozeb",
-        "prevention": "Ensure proper plant spacing and avoid overhead watering"
-    },
-    {
-        "plant": "Potato", 
-        "disease": "Late_blight",
-        "symptoms": "Dark water-soaked lesions on leaves and stems",
-        "treatment": "Apply systemic fungicides like metalaxyl",
-        "prevention": "Plant resistant varieties and ensure good drainage"
-    },
-    {
-        "plant": "Apple",
-        "disease": "Apple_scab", 
-        "symptoms": "Olive-green to black spots on leaves and fruit",
-        "treatment": "Apply fungicides during wet weather periods",
-        "prevention": "Remove fallen leaves and improve air circulation"
-    },
-    {
-        "plant": "Tomato",
-        "disease": "healthy",
-        "symptoms": "Plant appears healthy with no visible disease symptoms",
-        "treatment": "No treatment needed - continue regular care",
-        "prevention": "Maintain good plant hygiene and proper watering"
-    }
-]
+init_job_tables(DATABASE_PATH)
+init_history_tables(DATABASE_PATH)
+init_outbreak_tables(DATABASE_PATH)
+init_image_tables(DATABASE_PATH)
+init_embedding_tables(DATABASE_PATH)
+orders.init_order_tables(DATABASE_PATH)
+init_catalog_version(DATABASE_PATH)
+init_change_log(DATABASE_PATH)
+GEO_RTREE_AVAILABLE = init_geo(DATABASE_PATH)
+init_dashboard_tables(DATABASE_PATH)
+maintenance.init_maintenance_tables(DATABASE_PATH)
+
+# Pre-serialized catalog shared by /products/ reads
+catalog_cache = CatalogCache(DATABASE_PATH)
+
+# Columnar copy of products for faceted search
+facet_index = FacetIndex(DATABASE_PATH)
+
+# Content-addressed store for uploaded leaf photos
+image_store = ImageStore(os.getenv("IMAGE_STORE_DIR", "image_store"), DATABASE_PATH)
 
 # Pydantic models
 class UserCreate(BaseModel):
@@ -207,6 +164,12 @@ class ProductCreate(BaseModel):
     price: float
     quantity: int
     description: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class OrderCreate(BaseModel):
+    product_id: int
+    quantity: int
 
 # Auth helper functions
 def verify_password(plain_password, hashed_password):
@@ -225,9 +188,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def _user_from_token(token: str) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -244,61 +207,32 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=401, detail="User not found")
     return dict(user)
 
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _user_from_token(credentials.credentials)
+
+def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """The signed-in user, or None for anonymous requests; a bad token is still rejected"""
+    if credentials is None:
+        return None
+    return _user_from_token(credentials.credentials)
+
 # Database helper functions
 def get_db_connection():
     conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
-def get_pesticide_recommendations(plant: str, disease: str) -> List[Dict]:
-    """Get pesticide recommendations for detected disease"""
-    pesticide_db = {
-        "early_blight": [
-            {
-                "name": "Mancozeb 75% WP",
-                "type": "Fungicide",
-                "active_ingredient": "Mancozeb 75%",
-                "application_rate": "2-2.5 grams per liter",
-                "price": 180.0,
-                "description": "Broad spectrum contact fungicide effective against early blight"
-            }
-        ],
-        "late_blight": [
-            {
-                "name": "Metalaxyl + Mancozeb",
-                "type": "Systemic Fungicide",
-                "active_ingredient": "Metalaxyl 8% + Mancozeb 64%", 
-                "application_rate": "2.5 grams per liter",
-                "price": 320.0,
-                "description": "Systemic and contact fungicide for late blight"
-            }
-        ],
-        "apple_scab": [
-            {
-                "name": "Myclobutanil 10% WP",
-                "type": "Systemic Fungicide",
-                "active_ingredient": "Myclobutanil 10%",
-                "application_rate": "1 gram per liter", 
-                "price": 280.0,
-                "description": "Systemic fungicide for apple scab control"
-            }
-        ]
-    }
-    
-    disease_key = disease.lower().replace(" ", "_")
-    return pesticide_db.get(disease_key, [])
-
 # API Endpoints
-@app.get("/")
+@core_router.get("/")
 async def root():
     return {"message": "Agri-AI Backend API", "status": "running", "version": "1.0.0"}
 
-@app.get("/test-signup/")
+@api_router.get("/test-signup/")
 async def test_signup_endpoint():
     """Test if signup endpoint is accessible"""
     return {"message": "Signup endpoint is working"}
 
-@app.post("/signup", response_model=Token)
+@api_router.post("/signup", response_model=Token)
 async def signup(user: UserCreate):
     """Register a new user"""
     print(f"Signup attempt - identifier: {user.identifier}, name: {user.name}, user_type: {user.user_type}")
@@ -345,7 +279,7 @@ async def signup(user: UserCreate):
         }
     }
 
-@app.post("/login", response_model=Token)
+@api_router.post("/login", response_model=Token)
 async def login(user: UserLogin):
     """Login user"""
     print(f"Login attempt - identifier: {user.identifier}, password length: {len(user.password)}")
@@ -389,7 +323,7 @@ async def login(user: UserLogin):
         }
     }
 
-@app.get("/me")
+@api_router.get("/me")
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user information"""
     return {
@@ -399,125 +333,91 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
         "user_type": current_user["user_type"]
     }
 
-@app.post("/predict/")
-async def predict_disease(file: UploadFile = File(...)):
-    """Plant disease prediction from uploaded image"""
-    
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    if file.size and file.size > 10 * 1024 * 1024:  # 10MB limit
-        raise HTTPException(status_code=400, detail="File size too large (max 10MB)")
-    
-    try:
-        # Read image
-        image_bytes = await file.read()
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty image file")
-        
-        if model is not None:
-            # Use actual TensorFlow model
-            processed_image = preprocess_image_from_upload(image_bytes)
-            if processed_image is not None:
-                predictions = model(processed_image)
-                predicted_index = np.argmax(predictions)
-                predicted_class = class_indices[str(predicted_index)]
-                confidence = float(np.max(predictions) * 100)
-                
-                # Parse the prediction
-                parts = predicted_class.split('___')
-                plant = parts[0].replace('_', ' ')
-                disease = parts[1].replace('_', ' ') if len(parts) > 1 else 'Unknown'
-                
-                is_healthy = 'healthy' in disease.lower()
-                
-                # Get disease info
-                disease_info = get_disease_info(plant, disease)
-                pesticides = get_pesticide_recommendations(plant, disease) if not is_healthy else []
-                
-                return {
-                    "plant": plant,
-                    "disease": disease,
-                    "confidence": round(confidence, 2),
-                    "is_healthy": is_healthy,
-                    "disease_info": disease_info["symptoms"],
-                    "treatment": disease_info["treatment"],
-                    "prevention": disease_info["prevention"],
-                    "recommended_pesticides": pesticides,
-                    "scientific_name": f"{plant} species"
-                }
-        
-        # Fallback to mock prediction if model fails
-        mock_result = random.choice(MOCK_DISEASES)
-        confidence = round(random.uniform(75, 95), 2)
-        pesticides = get_pesticide_recommendations(mock_result["plant"], mock_result["disease"])
-        
-        return {
-            "plant": mock_result["plant"],
-            "disease": mock_result["disease"], 
-            "confidence": confidence,
-            "is_healthy": mock_result["disease"] == "healthy",
-            "disease_info": mock_result["symptoms"],
-            "treatment": mock_result["treatment"],
-            "prevention": mock_result["prevention"],
-            "recommended_pesticides": pesticides,
-            "scientific_name": f"{mock_result['plant']} species"
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Prediction error: {e}")
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
-
-def get_disease_info(plant: str, disease: str):
-    """Get detailed disease information"""
-    disease_db = {
-        "Early blight": {
-            "symptoms": "Brown spots with concentric rings on leaves",
-            "treatment": "Apply fungicides containing chlorothalonil or mancozeb",
-            "prevention": "Ensure proper plant spacing and avoid overhead watering"
-        },
-        "Late blight": {
-            "symptoms": "Dark water-soaked lesions on leaves and stems",
-            "treatment": "Apply systemic fungicides like metalaxyl",
-            "prevention": "Plant resistant varieties and ensure good drainage"
-        },
-        "Apple scab": {
-            "symptoms": "Olive-green to black spots on leaves and fruit",
-            "treatment": "Apply fungicides during wet weather periods",
-            "prevention": "Remove fallen leaves and improve air circulation"
-        },
-        "healthy": {
-            "symptoms": "Plant appears healthy with no visible disease symptoms",
-            "treatment": "No treatment needed - continue regular care",
-            "prevention": "Maintain good plant hygiene and proper watering"
-        }
-    }
-    
-    return disease_db.get(disease, {
-        "symptoms": f"Symptoms of {disease} detected on {plant}",
-        "treatment": "Consult with agricultural expert for specific treatment",
-        "prevention": "Follow good agricultural practices"
-    })
+# Per-client rate limits plus a bound on concurrent inferences and buffered upload bytes
+admission = AdmissionController(
+    max_concurrency=int(os.getenv("PREDICT_MAX_CONCURRENCY", "2")),
+    max_waiters=int(os.getenv("PREDICT_MAX_QUEUE", "32")),
+    queue_timeout=float(os.getenv("PREDICT_QUEUE_TIMEOUT", "30")),
+    max_inflight_bytes=int(os.getenv("PREDICT_MAX_INFLIGHT_MB", "64")) * 1024 * 1024,
+    user_rate_per_minute=float(os.getenv("PREDICT_USER_RATE_PER_MINUTE", "30")),
+    anonymous_rate_per_minute=float(os.getenv("PREDICT_ANONYMOUS_RATE_PER_MINUTE", "6")),
+)
 
-@app.get("/products/")
-async def get_products(product_type: Optional[str] = None):
+# Concurrent identical work runs once: predictions by upload hash, catalog reads by query
+prediction_flight = SingleFlight("predictions")
+catalog_flight = SingleFlight("catalog")
+
+@core_router.get("/predict/coalescing")
+async def request_coalescing_stats():
+    """How many identical in-flight requests were served by a shared execution"""
+    return {"predictions": prediction_flight.stats(), "catalog": catalog_flight.stats()}
+
+@core_router.get("/predict/admission")
+async def prediction_admission_stats(request: Request, current_user: Optional[dict] = Depends(get_optional_user)):
+    """Current inference load and admission counters, plus the caller's priority class"""
+    _, priority = admission.classify_request(request, current_user)
+    return {**admission.stats(), "priority_class": PRIORITY_NAMES[priority]}
+
+# Pushes product changes to SSE/WebSocket subscribers
+product_broadcaster = ProductBroadcaster(DATABASE_PATH)
+
+# Prediction analytics
+@api_router.get("/predictions/stats/daily")
+async def prediction_daily_stats(start: Optional[str] = None, end: Optional[str] = None,
+                                 region: Optional[str] = None, predicted_class: Optional[str] = None):
+    """Prediction counts per class per day and region (days as YYYY-MM-DD, UTC)"""
+    return await run_in_threadpool(get_daily_counts, DATABASE_PATH, start, end, region, predicted_class)
+
+@api_router.get("/predictions/stats/regions")
+async def prediction_region_stats(start: Optional[str] = None, end: Optional[str] = None):
+    """Prediction counts per class per region over a day range"""
+    return await run_in_threadpool(get_region_totals, DATABASE_PATH, start, end)
+
+# Stored images (content addressed, so every URL is immutable)
+IMAGE_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+def _stored_image_response(request: Request, image_hash: str, path: str, media_type: str):
+    if not is_valid_image_hash(image_hash) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = f'"{image_hash}"'
+    headers = {"ETag": etag, **IMAGE_CACHE_HEADERS}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@api_router.get("/images/{image_hash}/thumbnail")
+async def get_image_thumbnail(image_hash: str, request: Request):
+    """224x224 WebP derivative of a stored upload"""
+    return _stored_image_response(request, image_hash, image_store.derivative_path(image_hash), "image/webp")
+
+@api_router.get("/images/{image_hash}")
+async def get_image_original(image_hash: str, request: Request):
+    """Original bytes of a stored upload"""
+    info = image_store.get_info(image_hash) if is_valid_image_hash(image_hash) else None
+    media_type = (info or {}).get("content_type") or "application/octet-stream"
+    return _stored_image_response(request, image_hash, image_store.original_path(image_hash), media_type)
+
+async def _catalog_snapshot():
+    """Current catalog snapshot; concurrent refreshes share one rebuild off the event loop"""
+    if catalog_cache.fresh:
+        return catalog_cache.snapshot()
+    return await catalog_flight.do("snapshot", lambda: run_in_threadpool(catalog_cache.snapshot))
+
+def _cached_json_response(request: Request, cached):
+    """Serve a pre-serialized body, or 304 if the client already has this version"""
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if cached.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@api_router.get("/products/")
+async def get_products(request: Request, product_type: Optional[str] = None):
     """Get all products or filter by type"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if product_type:
-        cursor.execute("SELECT * FROM products WHERE type = ?", (product_type,))
-    else:
-        cursor.execute("SELECT * FROM products")
-    
-    products = cursor.fetchall()
-    conn.close()
-    
-    return [dict(product) for product in products]
+    snapshot = await _catalog_snapshot()
+    return _cached_json_response(request, snapshot.list_body(product_type))
 
-@app.post("/products/")
+@api_router.post("/products/")
 async def create_product(product: ProductCreate, current_user: dict = Depends(get_current_user)):
     """Create a new product (farmers only)"""
     if current_user["user_type"] != "farmer":
@@ -527,33 +427,63 @@ async def create_product(product: ProductCreate, current_user: dict = Depends(ge
     cursor = conn.cursor()
     
     cursor.execute('''
-        INSERT INTO products (name, type, category, price, quantity, description, farmer_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO products (name, type, category, price, quantity, description, farmer_id, latitude, longitude)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (product.name, product.type, product.category, product.price, 
-          product.quantity, product.description, current_user["id"]))
+          product.quantity, product.description, current_user["id"], product.latitude, product.longitude))
     
     product_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    catalog_cache.invalidate()
+    facet_index.invalidate()
     
     return {"id": product_id, "message": "Product created successfully"}
 
-@app.get("/products/{product_id}")
-async def get_product(product_id: int):
+# Registered before /products/{product_id} so "live" is not parsed as an id
+api_router.include_router(create_live_router(product_broadcaster))
+
+@api_router.get("/products/search")
+async def search_products(product_type: Optional[List[str]] = Query(None, alias="type"),
+                          category: Optional[List[str]] = Query(None),
+                          min_price: Optional[float] = None, max_price: Optional[float] = None,
+                          in_stock: bool = False, farmer_id: Optional[int] = None,
+                          sort: str = Query("-created_at", pattern="^-?(price|created_at|quantity)$"),
+                          limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """Filtered products with type, category and price-bucket facet counts in one call"""
+    key = ("search", tuple(product_type or ()), tuple(category or ()), min_price, max_price, in_stock,
+           farmer_id, sort, limit, offset)
+    return await catalog_flight.do(key, lambda: run_in_threadpool(
+        facet_index.search, product_type, category, min_price, max_price, in_stock, farmer_id, sort, limit, offset
+    ))
+
+@api_router.get("/products/nearby")
+async def get_nearby_products(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180),
+                              radius_km: float = Query(25, gt=0, le=500), product_type: Optional[str] = None,
+                              limit: int = Query(50, ge=1, le=500)):
+    """Listings within radius_km of a point, nearest first"""
+    key = ("nearby", lat, lon, radius_km, product_type, limit)
+    return await catalog_flight.do(key, lambda: run_in_threadpool(
+        find_nearby, DATABASE_PATH, lat, lon, radius_km, product_type, limit, GEO_RTREE_AVAILABLE
+    ))
+
+@api_router.get("/products/changes")
+async def get_product_changes(since: int = 0, limit: int = 500):
+    """Products inserted, updated or deleted since a client's last sync version"""
+    limit = min(max(limit, 1), 5000)
+    return await catalog_flight.do(("changes", since, limit),
+                                   lambda: run_in_threadpool(get_changes, DATABASE_PATH, since, limit))
+
+@api_router.get("/products/{product_id}")
+async def get_product(product_id: int, request: Request):
     """Get specific product by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-    product = cursor.fetchone()
-    conn.close()
-    
-    if not product:
+    cached = (await _catalog_snapshot()).product_body(product_id)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return dict(product)
+    return _cached_json_response(request, cached)
 
-@app.delete("/products/{product_id}")
+@api_router.delete("/products/{product_id}")
 async def delete_product(product_id: int, current_user: dict = Depends(get_current_user)):
     """Delete a product (farmers only)"""
     conn = get_db_connection()
@@ -571,11 +501,73 @@ async def delete_product(product_id: int, current_user: dict = Depends(get_curre
     cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
     conn.commit()
     conn.close()
+    catalog_cache.invalidate()
+    facet_index.invalidate()
     
     return {"message": "Product deleted successfully"}
 
-@app.get("/seed-data/")
-@app.post("/seed-data/")
+# Orders
+ORDER_RESERVATION_SECONDS = int(os.getenv("ORDER_RESERVATION_SECONDS", "900"))
+
+@api_router.post("/orders")
+async def create_order(order: OrderCreate, current_user: dict = Depends(get_current_user)):
+    """Reserve stock for an order; unconfirmed reservations expire and are released"""
+    # BEGIN IMMEDIATE can wait on the write lock under contention; keep that off the event loop
+    reserved = await run_in_threadpool(orders.reserve_order, DATABASE_PATH, order.product_id, current_user["id"],
+                                       order.quantity, ORDER_RESERVATION_SECONDS)
+    catalog_cache.invalidate()
+    facet_index.invalidate()
+    return reserved
+
+@api_router.get("/orders")
+async def get_my_orders(current_user: dict = Depends(get_current_user)):
+    """List the current user's orders, newest first"""
+    return await run_in_threadpool(orders.list_orders, DATABASE_PATH, current_user["id"])
+
+@api_router.get("/orders/{order_id}")
+async def get_order(order_id: int, current_user: dict = Depends(get_current_user)):
+    """Get one of the current user's orders"""
+    return await run_in_threadpool(orders.get_order, DATABASE_PATH, order_id, current_user["id"])
+
+@api_router.post("/orders/{order_id}/confirm")
+async def confirm_order(order_id: int, current_user: dict = Depends(get_current_user)):
+    """Confirm a reservation before it expires"""
+    return await run_in_threadpool(orders.confirm_order, DATABASE_PATH, order_id, current_user["id"])
+
+@api_router.post("/orders/{order_id}/cancel")
+async def cancel_order(order_id: int, current_user: dict = Depends(get_current_user)):
+    """Cancel a reservation and return its stock"""
+    cancelled = await run_in_threadpool(orders.cancel_order, DATABASE_PATH, order_id, current_user["id"])
+    catalog_cache.invalidate()
+    facet_index.invalidate()
+    return cancelled
+
+# Farmer dashboard, read from aggregates the products/orders triggers keep current
+def _require_farmer(current_user: dict):
+    if current_user["user_type"] != "farmer":
+        raise HTTPException(status_code=403, detail="Only farmers have a dashboard")
+
+@api_router.get("/farmers/me/dashboard")
+async def get_farmer_dashboard(days: int = Query(30, ge=1, le=366), current_user: dict = Depends(get_current_user)):
+    """Listing counts by type, stock value and sales totals, plus daily sales for the last `days` days"""
+    _require_farmer(current_user)
+    return await run_in_threadpool(get_dashboard, DATABASE_PATH, current_user["id"], days)
+
+@api_router.get("/farmers/me/sales")
+async def get_farmer_sales(start: str, end: str, interval: str = Query("day", pattern="^(day|week|month)$"),
+                           current_user: dict = Depends(get_current_user)):
+    """Confirmed sales and revenue per day, week or month (days as YYYY-MM-DD, UTC)"""
+    _require_farmer(current_user)
+    try:
+        span = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+    if not 0 <= span <= 3660:
+        raise HTTPException(status_code=400, detail="end must be on or after start, at most ten years apart")
+    return await run_in_threadpool(get_sales_series, DATABASE_PATH, current_user["id"], start, end, interval)
+
+@api_router.get("/seed-data/")
+@api_router.post("/seed-data/")
 async def seed_database():
     """Seed database with sample data"""
     try:
@@ -615,13 +607,15 @@ async def seed_database():
         
         conn.commit()
         conn.close()
+        catalog_cache.invalidate()
+        facet_index.invalidate()
         
         return {"message": "Database seeded successfully"}
         
     except Exception as e:
         return {"error": f"Seeding failed: {str(e)}"}
 
-@app.post("/create-user/")
+@api_router.post("/create-user/")
 async def create_user_manual(email: str, password: str, name: str, user_type: str):
     """Manually create a user"""
     try:
@@ -646,7 +640,7 @@ async def create_user_manual(email: str, password: str, name: str, user_type: st
     except Exception as e:
         return {"error": str(e)}
 
-@app.get("/test-login/")
+@api_router.get("/test-login/")
 async def test_login():
     """Test login with hardcoded credentials"""
     try:
@@ -674,7 +668,7 @@ async def test_login():
     except Exception as e:
         return {"error": str(e)}
 
-@app.get("/debug-users/")
+@api_router.get("/debug-users/")
 async def debug_users():
     """Debug endpoint to see what users exist"""
     try:
@@ -687,10 +681,159 @@ async def debug_users():
     except Exception as e:
         return {"error": str(e)}
 
-@app.get("/health")
-async def health_check():
+@core_router.get("/maintenance")
+async def maintenance_stats(request: Request):
+    """Maintenance leader and per-task run counts and durations"""
+    return await run_in_threadpool(request.app.state.maintenance.stats)
+
+@core_router.get("/health")
+async def health_check(request: Request):
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "role": request.app.state.role, "timestamp": datetime.now().isoformat()}
+
+def expire_all_reservations(batch_size: int = 500) -> int:
+    """Release stock held by reservations that were never confirmed"""
+    total = 0
+    # Keep going while full batches come back so a backlog clears in one pass
+    while True:
+        expired = orders.expire_reservations(DATABASE_PATH, batch_size)
+        total += expired
+        if expired < batch_size:
+            return total
+
+def prewarm_caches() -> str:
+    """Rebuild this process's catalog snapshot and facet columns if products changed, off the request path"""
+    snapshot = catalog_cache.snapshot()
+    facet_index.refresh()
+    return f"catalog version {snapshot.version}"
+
+def create_maintenance(role: str, prediction_jobs: PredictionJobQueue) -> maintenance.MaintenanceScheduler:
+    """The maintenance tasks for one worker; intervals are in seconds"""
+    scheduler = maintenance.MaintenanceScheduler(
+        DATABASE_PATH,
+        tick=float(os.getenv("MAINTENANCE_TICK", "5")),
+        lease_seconds=float(os.getenv("MAINTENANCE_LEASE_SECONDS", "30")),
+    )
+    scheduler.add_task("expire_reservations", 30, expire_all_reservations)
+    scheduler.add_task("compact_change_log", 3600, lambda: compact_change_log(DATABASE_PATH))
+    scheduler.add_task("cleanup_jobs", 3600, prediction_jobs.cleanup)
+    scheduler.add_task("wal_checkpoint", 300, lambda: maintenance.wal_checkpoint(DATABASE_PATH))
+    scheduler.add_task("optimize", 6 * 3600, lambda: maintenance.optimize(DATABASE_PATH))
+    scheduler.add_task("incremental_vacuum", 24 * 3600, lambda: maintenance.incremental_vacuum(DATABASE_PATH))
+    if role != ROLE_INFERENCE:
+        # The caches are per process, so every worker warms its own
+        scheduler.add_task("prewarm_caches", 30, prewarm_caches, leader_only=False)
+    return scheduler
+
+def create_app(role: str = ROLE_ALL, load_model: bool = True,
+               inference_nodes: Optional[List[str]] = None) -> FastAPI:
+    """Build the app for one worker role.
+
+    The inference module (OpenCV, the model cascade) is only imported for the
+    "inference" and "all" roles, and TensorFlow only when the model loads at
+    startup, so "api" workers start in well under a second. With
+    ``load_model=False`` predictions are served from mock results.
+
+    An "api" worker given ``inference_nodes`` (INFERENCE_NODES, comma
+    separated base URLs of "inference" processes) also serves /predict/ and
+    prediction jobs by sending the model call to those nodes.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown app role: {role} (expected one of {', '.join(ROLES)})")
+    if inference_nodes is None:
+        inference_nodes = [url.strip() for url in os.getenv("INFERENCE_NODES", "").split(",") if url.strip()]
+
+    app = FastAPI(title="Agri-AI Backend", version="1.0.0")
+    app.state.role = role
+
+    # CORS Configuration
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allow all origins for development
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.include_router(core_router)
+    app.include_router(create_advisory_router())
+
+    # Whatever answers predictions in this process: the local model or the inference pool
+    predictor = None
+    permanent_errors = ()
+    if role in (ROLE_INFERENCE, ROLE_ALL):
+        import inference
+        from image_quality import ImageQualityError
+
+        predictor = inference.InferenceService(DATABASE_PATH, image_store, load_model=load_model)
+        permanent_errors = (ImageQualityError,)
+        app.include_router(inference.create_inference_router(
+            predictor, admission, prediction_flight, get_optional_user
+        ))
+        if role == ROLE_INFERENCE:
+            import inference_node
+
+            # Unauthenticated and outside the per-user admission limits: never on the public "all" role
+            app.include_router(inference_node.create_node_router(
+                predictor, admission, prediction_flight, cache_size=int(os.getenv("INFERENCE_NODE_CACHE_SIZE", "1024"))
+            ))
+    elif inference_nodes:
+        from inference_pool import InferencePool, NodeRejected, RemoteInference, create_remote_predict_router
+        from prediction_results import PredictionRecorder
+
+        pool = InferencePool(
+            inference_nodes,
+            health_interval=float(os.getenv("INFERENCE_HEALTH_INTERVAL", "5")),
+            ejection_seconds=float(os.getenv("INFERENCE_EJECTION_SECONDS", "30")),
+            hedge_delay=float(os.getenv("INFERENCE_HEDGE_DELAY", "0.5")),
+            max_hedge_fraction=float(os.getenv("INFERENCE_MAX_HEDGE_FRACTION", "0.1")),
+        )
+        predictor = RemoteInference(pool, PredictionRecorder(DATABASE_PATH, image_store))
+        permanent_errors = (NodeRejected,)
+        app.include_router(create_remote_predict_router(predictor, admission, prediction_flight, get_optional_user))
+    app.state.predictor = predictor
+
+    if predictor is not None:
+        from prediction_results import create_outbreak_router
+        app.include_router(create_outbreak_router(predictor.recorder.outbreak_detector))
+
+    # Async prediction jobs: queued by any role, run by the workers of processes that can predict
+    prediction_jobs = PredictionJobQueue(
+        DATABASE_PATH, predictor.run_prediction if predictor else None,
+        workers=int(os.getenv("PREDICTION_JOB_WORKERS", "2")),
+        permanent_errors=permanent_errors
+    )
+    app.include_router(create_job_router(prediction_jobs, admission, get_optional_user))
+
+    if role in (ROLE_API, ROLE_ALL):
+        app.include_router(api_router)
+
+    scheduler = create_maintenance(role, prediction_jobs)
+    app.state.maintenance = scheduler
+
+    @app.on_event("startup")
+    async def start_background_workers():
+        if predictor is not None:
+            image_store.start()
+            predictor.start()
+            prediction_jobs.start()
+        scheduler.start()
+        if role != ROLE_INFERENCE:
+            product_broadcaster.start()
+
+    @app.on_event("shutdown")
+    async def stop_background_workers():
+        if role != ROLE_INFERENCE:
+            product_broadcaster.stop()
+        scheduler.stop()
+        if predictor is not None:
+            prediction_jobs.stop()
+            predictor.stop()
+            image_store.stop()
+
+    return app
+
+app = create_app(os.getenv("APP_ROLE", ROLE_ALL))
 
 if __name__ == "__main__":
     import uvicorn
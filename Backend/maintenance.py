@@ -0,0 +1,330 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def init_maintenance_tables(db_path: str):
+    """Create the leader lease row and the shared per-task run history"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # One row; whoever holds an unexpired lease runs the database-wide tasks
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_lock (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner TEXT,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO maintenance_lock (id, owner, expires_at) VALUES (1, NULL, 0)")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            task TEXT PRIMARY KEY,
+            runs INTEGER NOT NULL,
+            failures INTEGER NOT NULL,
+            total_seconds REAL NOT NULL,
+            max_seconds REAL NOT NULL,
+            last_started REAL NOT NULL,
+            last_seconds REAL NOT NULL,
+            last_result TEXT,
+            last_error TEXT,
+            last_owner TEXT
+        )
+    ''')
+
+    conn.commit()
+    conn.close()
+
+def _connect(db_path: str, timeout: float = 30):
+    return sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+
+# Database-wide tasks
+def optimize(db_path: str) -> str:
+    """Refresh planner statistics: a full ANALYZE the first time, PRAGMA optimize after that"""
+    conn = _connect(db_path)
+    try:
+        analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        if analyzed is None:
+            conn.execute("ANALYZE")
+            return "analyzed"
+        conn.execute("PRAGMA optimize")
+        return "optimized"
+    finally:
+        conn.close()
+
+def wal_checkpoint(db_path: str, busy_timeout: float = 1.0) -> str:
+    """Copy the WAL into the database and truncate it.
+
+    A short busy timeout keeps the checkpoint from holding up writers behind
+    a long reader; a busy result just means the next run tries again.
+    """
+    conn = _connect(db_path, timeout=busy_timeout)
+    try:
+        busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return f"busy={busy} log_pages={log_pages} checkpointed={checkpointed}"
+    finally:
+        conn.close()
+
+def incremental_vacuum(db_path: str, max_pages: int = 10000) -> str:
+    """Return up to ``max_pages`` free pages to the filesystem.
+
+    Needs auto_vacuum=INCREMENTAL. New databases get it in init_database();
+    an existing one needs a full VACUUM, which locks the database for its
+    whole run, so it is left to ``python maintenance.py convert`` while the
+    backend is stopped.
+    """
+    conn = _connect(db_path)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return "skipped: auto_vacuum is not INCREMENTAL (run `python maintenance.py convert` offline)"
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free_pages:
+            return "no free pages"
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})")
+        return f"reclaimed {free_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]} of {free_pages} free pages"
+    finally:
+        conn.close()
+
+def convert_to_incremental_vacuum(db_path: str) -> str:
+    """Switch an existing database to auto_vacuum=INCREMENTAL with one full VACUUM; run with the backend stopped"""
+    conn = _connect(db_path)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return "already incremental"
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return "converted to incremental auto_vacuum"
+    finally:
+        conn.close()
+
+class MaintenanceTask:
+    def __init__(self, name: str, interval: float, fn: Callable[[], Any], leader_only: bool = True):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.leader_only = leader_only
+        # This process's runs; leader-only tasks are also scheduled from the shared history
+        self.last_started = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.last_seconds: Optional[float] = None
+
+class MaintenanceScheduler:
+    """Background thread running periodic database maintenance in one worker at a time.
+
+    Every uvicorn worker runs a scheduler, but only the holder of the lease in
+    ``maintenance_lock`` runs the database-wide (``leader_only``) tasks; the
+    lease is renewed each tick and taken over by another worker once it
+    lapses. Run times and outcomes go to ``maintenance_runs``, so a new leader
+    continues the same schedule and any worker can report it. Tasks with
+    ``leader_only=False`` (warming this process's caches) run in every worker.
+    """
+
+    def __init__(self, db_path: str, tick: float = 5.0, lease_seconds: float = 30.0):
+        self.db_path = db_path
+        self.tick = tick
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.tasks: List[MaintenanceTask] = []
+        self.is_leader = False
+        self.started_at = time.time()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add_task(self, name: str, interval: float, fn: Callable[[], Any], leader_only: bool = True):
+        """Register a task; MAINTENANCE_<NAME>_INTERVAL overrides the interval, and 0 disables it"""
+        interval = float(os.getenv(f"MAINTENANCE_{name.upper()}_INTERVAL", interval))
+        if interval > 0:
+            self.tasks.append(MaintenanceTask(name, interval, fn, leader_only))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._loop, name="maintenance-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(30)
+            self._thread = None
+        self._release()
+
+    def _acquire(self) -> bool:
+        """Take or renew the lease; True if this process is the leader until the next tick"""
+        now = time.time()
+        conn = _connect(self.db_path, timeout=5)
+        try:
+            cursor = conn.execute('''
+                UPDATE maintenance_lock SET owner = ?, expires_at = ?
+                WHERE id = 1 AND (owner = ? OR owner IS NULL OR expires_at < ?)
+            ''', (self.owner, now + self.lease_seconds, self.owner, now))
+            leader = cursor.rowcount == 1
+        finally:
+            conn.close()
+        if leader and not self.is_leader:
+            logger.info(f"Maintenance leader is now {self.owner}")
+        self.is_leader = leader
+        return leader
+
+    def _release(self):
+        if not self.is_leader:
+            return
+        try:
+            conn = _connect(self.db_path, timeout=5)
+            conn.execute("UPDATE maintenance_lock SET owner = NULL, expires_at = 0 WHERE id = 1 AND owner = ?",
+                         (self.owner,))
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not release the maintenance lease: {e}")
+        self.is_leader = False
+
+    def _shared_last_started(self) -> Dict[str, float]:
+        conn = _connect(self.db_path, timeout=5)
+        try:
+            return dict(conn.execute("SELECT task, last_started FROM maintenance_runs").fetchall())
+        finally:
+            conn.close()
+
+    def _record(self, task: MaintenanceTask, started: float, seconds: float, result: Any, error: Optional[str]):
+        conn = _connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT INTO maintenance_runs (task, runs, failures, total_seconds, max_seconds, last_started,
+                                              last_seconds, last_result, last_error, last_owner)
+                VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (task) DO UPDATE SET
+                    runs = runs + 1,
+                    failures = failures + excluded.failures,
+                    total_seconds = total_seconds + excluded.total_seconds,
+                    max_seconds = MAX(max_seconds, excluded.max_seconds),
+                    last_started = excluded.last_started,
+                    last_seconds = excluded.last_seconds,
+                    last_result = excluded.last_result,
+                    last_error = excluded.last_error,
+                    last_owner = excluded.last_owner
+            ''', (task.name, 1 if error else 0, seconds, seconds, started, seconds,
+                  None if result is None else str(result), error, self.owner))
+        finally:
+            conn.close()
+
+    def _renew_until(self, done: threading.Event):
+        """Keep the lease while a long task runs, so no other worker becomes leader mid-task"""
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                self._acquire()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not renew the maintenance lease: {e}")
+
+    def run_task(self, task: MaintenanceTask):
+        started = time.time()
+        task.last_started = started
+        result, error = None, None
+        done = threading.Event()
+        if task.leader_only:
+            threading.Thread(target=self._renew_until, args=(done,), name="maintenance-lease", daemon=True).start()
+        begin = time.perf_counter()
+        try:
+            result = task.fn()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"Maintenance task {task.name} failed: {error}")
+        finally:
+            done.set()
+        seconds = time.perf_counter() - begin
+        task.runs += 1
+        task.failures += 1 if error else 0
+        task.last_seconds = seconds
+        if task.leader_only:
+            self._record(task, started, seconds, result, error)
+        if result:
+            logger.info(f"Maintenance {task.name} took {seconds * 1000:.0f}ms: {result}")
+
+    def run_due(self):
+        """One tick: renew the lease, then run every task whose interval has passed"""
+        leader = self._acquire()
+        shared = self._shared_last_started() if leader else {}
+        now = time.time()
+        for task in self.tasks:
+            if self._stopping.is_set():
+                return
+            if task.leader_only:
+                if not leader:
+                    continue
+                # A previous leader's runs count, so a failover does not rerun everything at once;
+                # a task that never ran waits one interval rather than running during startup
+                last_started = max(shared.get(task.name, self.started_at), task.last_started)
+            else:
+                last_started = task.last_started
+            if now - last_started >= task.interval:
+                self.run_task(task)
+
+    def _loop(self):
+        while not self._stopping.wait(self.tick):
+            try:
+                self.run_due()
+            except Exception as e:
+                logger.error(f"Maintenance scheduler error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Leader, and per task: interval, run counts and durations (shared history for database-wide tasks)"""
+        conn = _connect(self.db_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        try:
+            lock = conn.execute("SELECT owner, expires_at FROM maintenance_lock WHERE id = 1").fetchone()
+            history = {row["task"]: row for row in conn.execute("SELECT * FROM maintenance_runs")}
+        finally:
+            conn.close()
+
+        tasks = {}
+        for task in self.tasks:
+            row = history.get(task.name) if task.leader_only else None
+            if row is not None:
+                tasks[task.name] = {
+                    "scope": "leader",
+                    "interval_seconds": task.interval,
+                    "runs": row["runs"],
+                    "failures": row["failures"],
+                    "mean_ms": round(row["total_seconds"] * 1000 / row["runs"], 2),
+                    "max_ms": round(row["max_seconds"] * 1000, 2),
+                    "last_ms": round(row["last_seconds"] * 1000, 2),
+                    "last_started": row["last_started"],
+                    "last_result": row["last_result"],
+                    "last_error": row["last_error"],
+                    "last_owner": row["last_owner"],
+                }
+            else:
+                tasks[task.name] = {
+                    "scope": "leader" if task.leader_only else "worker",
+                    "interval_seconds": task.interval,
+                    "runs": task.runs,
+                    "failures": task.failures,
+                    "last_ms": round(task.last_seconds * 1000, 2) if task.last_seconds is not None else None,
+                    "last_started": task.last_started or None,
+                }
+        leader_active = lock is not None and lock["owner"] is not None and lock["expires_at"] > time.time()
+        return {
+            "leader": lock["owner"] if leader_active else None,
+            "this_worker": self.owner,
+            "is_leader": self.is_leader,
+            "tasks": tasks,
+        }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline maintenance for the backend database")
+    parser.add_argument("command", choices=["convert"],
+                        help="convert: switch to incremental auto_vacuum (full VACUUM; stop the backend first)")
+    parser.add_argument("--db", default="agri_ai.db")
+    args = parser.parse_args()
+    print(convert_to_incremental_vacuum(args.db))
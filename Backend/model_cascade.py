@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+STAGE_FAST = "fast"
+STAGE_FULL = "full"
+
+# Output holding per-image feature vectors in models that return a dict of outputs
+FEATURE_OUTPUT = os.getenv("MODEL_FEATURE_OUTPUT", "feature_vector")
+
+class StageMetrics:
+    """Call counts, answered counts and recent latencies for one cascade stage"""
+
+    def __init__(self, window: int = 1024):
+        self.images = 0
+        self.answered = 0
+        self.total_seconds = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def observe(self, images: int, answered: int, seconds: float):
+        self.images += images
+        self.answered += answered
+        self.total_seconds += seconds
+        self.latencies.append(seconds / max(images, 1))
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "images": self.images,
+            "answered": self.answered,
+            "hit_rate": round(self.answered / self.images, 4) if self.images else None,
+            "mean_ms": round(self.total_seconds * 1000 / self.images, 2) if self.images else None,
+            "p50_ms": round(float(np.percentile(recent, 50)), 2),
+            "p95_ms": round(float(np.percentile(recent, 95)), 2),
+        }
+
+def split_outputs(outputs) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(class scores, feature vectors or None) from one model call.
+
+    Plain classifiers return the scores alone; models that also expose
+    features return a dict with a ``FEATURE_OUTPUT`` entry next to the scores.
+    """
+    if not isinstance(outputs, dict):
+        return np.asarray(outputs), None
+    features = outputs.get(FEATURE_OUTPUT)
+    scores = next(value for key, value in outputs.items() if key != FEATURE_OUTPUT)
+    if features is not None:
+        features = np.asarray(features, dtype=np.float32).reshape(len(scores), -1)
+    return np.asarray(scores), features
+
+def to_probabilities(outputs) -> np.ndarray:
+    """Model outputs as class probabilities; raw logits are softmaxed"""
+    outputs = np.asarray(split_outputs(outputs)[0], dtype=np.float32)
+    sums = outputs.sum(axis=1)
+    if outputs.min() >= 0 and np.allclose(sums, 1.0, atol=1e-3):
+        return outputs
+    shifted = np.exp(outputs - outputs.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+class ModelCascade:
+    """Two-stage classifier: a small model answers confident images, the rest go to the full model.
+
+    Both models must map a (N, 224, 224, 3) batch to scores over the same
+    classes. Without a fast model every image goes straight to the full one.
+    """
+
+    def __init__(self, full_model, fast_model=None, threshold: float = 0.9):
+        self.full_model = full_model
+        self.fast_model = fast_model
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.metrics = {STAGE_FAST: StageMetrics(), STAGE_FULL: StageMetrics()}
+
+    @property
+    def enabled(self) -> bool:
+        return self.fast_model is not None
+
+    def _run(self, stage: str, model, images: np.ndarray, threshold: Optional[float]):
+        start = time.perf_counter()
+        scores, features = split_outputs(model(images))
+        probabilities = to_probabilities(scores)
+        elapsed = time.perf_counter() - start
+
+        indices = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(indices)), indices]
+        confident = confidences >= threshold if threshold is not None else np.ones(len(indices), dtype=bool)
+        with self._lock:
+            self.metrics[stage].observe(len(images), int(confident.sum()), elapsed)
+        return indices, confidences, confident, features
+
+    def predict_with_features(self, images: np.ndarray) -> Tuple[List[Tuple[int, float, str]], List[Optional[np.ndarray]]]:
+        """``predict()`` plus, per image, the full model's feature vector from the same call.
+
+        Features are None when the full model exposes none, and for images the
+        fast model answered (the full model never saw them).
+        """
+        features: List[Optional[np.ndarray]] = [None] * len(images)
+        if not self.enabled:
+            indices, confidences, _, full_features = self._run(STAGE_FULL, self.full_model, images, None)
+            if full_features is not None:
+                features = list(full_features)
+            return [(int(i), float(c), STAGE_FULL) for i, c in zip(indices, confidences)], features
+
+        indices, confidences, confident, _ = self._run(STAGE_FAST, self.fast_model, images, self.threshold)
+        stages = np.where(confident, STAGE_FAST, STAGE_FULL)
+
+        escalated = np.flatnonzero(~confident)
+        if len(escalated):
+            full_indices, full_confidences, _, full_features = self._run(
+                STAGE_FULL, self.full_model, images[escalated], None
+            )
+            indices[escalated] = full_indices
+            confidences[escalated] = full_confidences
+            if full_features is not None:
+                for row, vector in zip(escalated, full_features):
+                    features[row] = vector
+
+        return [(int(i), float(c), str(s)) for i, c, s in zip(indices, confidences, stages)], features
+
+    def predict(self, images: np.ndarray) -> List[Tuple[int, float, str]]:
+        """(class index, confidence, stage that answered) for each image in the batch"""
+        return self.predict_with_features(images)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {stage: metrics.snapshot() for stage, metrics in self.metrics.items()}
+        total = stages[STAGE_FAST]["images"] if self.enabled else stages[STAGE_FULL]["images"]
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "images": total,
+            "escalation_rate": round(stages[STAGE_FULL]["images"] / total, 4) if self.enabled and total else None,
+            "stages": stages,
+        }
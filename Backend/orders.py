@@ -0,0 +1,207 @@
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Order states
+ORDER_RESERVED = "reserved"
+ORDER_CONFIRMED = "confirmed"
+ORDER_CANCELLED = "cancelled"
+ORDER_EXPIRED = "expired"
+
+def init_order_tables(db_path: str):
+    """Create the orders table and switch the database to WAL for concurrent writers"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # WAL lets catalog reads proceed while a reservation transaction holds the write lock
+    cursor.execute("PRAGMA journal_mode=WAL")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            buyer_id INTEGER NOT NULL,
+            farmer_id INTEGER,
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            unit_price REAL NOT NULL,
+            total_price REAL NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (buyer_id) REFERENCES users (id)
+        )
+    ''')
+    # The seller is kept on the order so the sale still counts if the listing is deleted before confirmation
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(orders)")}
+    if "farmer_id" not in columns:
+        try:
+            cursor.execute("ALTER TABLE orders ADD COLUMN farmer_id INTEGER")
+            cursor.execute('''
+                UPDATE orders SET farmer_id = (SELECT farmer_id FROM products WHERE products.id = orders.product_id)
+            ''')
+        except sqlite3.OperationalError as e:
+            # Another worker starting at the same time may have added it first
+            if "duplicate column" not in str(e):
+                raise
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_buyer ON orders(buyer_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_expiry ON orders(status, expires_at)')
+
+    conn.commit()
+    conn.close()
+
+def _connect(db_path: str):
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def reserve_order(db_path: str, product_id: int, buyer_id: int, quantity: int,
+                  reservation_seconds: int = 900) -> Dict[str, Any]:
+    """Reserve stock for an order; the conditional UPDATE makes overselling impossible"""
+    if quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+
+    now = time.time()
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute('''
+            UPDATE products SET quantity = quantity - ?
+            WHERE id = ? AND quantity >= ?
+        ''', (quantity, product_id, quantity))
+
+        if cursor.rowcount == 0:
+            conn.execute("ROLLBACK")
+            exists = conn.execute("SELECT quantity FROM products WHERE id = ?", (product_id,)).fetchone()
+            if exists is None:
+                raise HTTPException(status_code=404, detail="Product not found")
+            raise HTTPException(status_code=409, detail=f"Insufficient stock (available: {exists['quantity']})")
+
+        # Price comes from the database, never from the client
+        product = conn.execute("SELECT price, farmer_id FROM products WHERE id = ?", (product_id,)).fetchone()
+        unit_price = product["price"]
+        total_price = round(unit_price * quantity, 2)
+        expires_at = now + reservation_seconds
+        cursor = conn.execute('''
+            INSERT INTO orders (product_id, buyer_id, farmer_id, quantity, unit_price, total_price, status,
+                                created_at, expires_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (product_id, buyer_id, product["farmer_id"], quantity, unit_price, total_price, ORDER_RESERVED,
+              now, expires_at, now))
+        order_id = cursor.lastrowid
+        conn.execute("COMMIT")
+    except HTTPException:
+        raise
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return {
+        "id": order_id,
+        "product_id": product_id,
+        "buyer_id": buyer_id,
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "total_price": total_price,
+        "status": ORDER_RESERVED,
+        "created_at": now,
+        "expires_at": expires_at,
+    }
+
+def confirm_order(db_path: str, order_id: int, buyer_id: int) -> Dict[str, Any]:
+    """Turn a live reservation into a confirmed order"""
+    now = time.time()
+    conn = _connect(db_path)
+    cursor = conn.execute('''
+        UPDATE orders SET status = ?, updated_at = ?
+        WHERE id = ? AND buyer_id = ? AND status = ? AND expires_at > ?
+    ''', (ORDER_CONFIRMED, now, order_id, buyer_id, ORDER_RESERVED, now))
+    updated = cursor.rowcount
+    conn.close()
+
+    if updated == 0:
+        order = get_order(db_path, order_id, buyer_id)
+        raise HTTPException(status_code=409, detail=f"Order cannot be confirmed (status: {order['status']})")
+    return get_order(db_path, order_id, buyer_id)
+
+def _release(conn, orders, new_status: str, now: float):
+    """Mark reserved orders with a final status and return their stock; caller owns the transaction"""
+    released = 0
+    for order in orders:
+        cursor = conn.execute('''
+            UPDATE orders SET status = ?, updated_at = ? WHERE id = ? AND status = ?
+        ''', (new_status, now, order["id"], ORDER_RESERVED))
+        if cursor.rowcount:
+            conn.execute("UPDATE products SET quantity = quantity + ? WHERE id = ?",
+                         (order["quantity"], order["product_id"]))
+            released += 1
+    return released
+
+def cancel_order(db_path: str, order_id: int, buyer_id: int) -> Dict[str, Any]:
+    """Cancel a reservation and put its stock back"""
+    now = time.time()
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        orders = conn.execute('''
+            SELECT id, product_id, quantity FROM orders WHERE id = ? AND buyer_id = ?
+        ''', (order_id, buyer_id)).fetchall()
+        released = _release(conn, orders, ORDER_CANCELLED, now)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    if not released:
+        order = get_order(db_path, order_id, buyer_id)
+        raise HTTPException(status_code=409, detail=f"Order cannot be cancelled (status: {order['status']})")
+    return get_order(db_path, order_id, buyer_id)
+
+def expire_reservations(db_path: str, limit: int = 500) -> int:
+    """Release stock held by reservations past their expiry; returns how many were expired"""
+    now = time.time()
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        orders = conn.execute('''
+            SELECT id, product_id, quantity FROM orders
+            WHERE status = ? AND expires_at <= ? LIMIT ?
+        ''', (ORDER_RESERVED, now, limit)).fetchall()
+        expired = _release(conn, orders, ORDER_EXPIRED, now)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return expired
+
+def get_order(db_path: str, order_id: int, buyer_id: int) -> Dict[str, Any]:
+    conn = _connect(db_path)
+    order = conn.execute("SELECT * FROM orders WHERE id = ? AND buyer_id = ?", (order_id, buyer_id)).fetchone()
+    conn.close()
+
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return dict(order)
+
+def list_orders(db_path: str, buyer_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+    conn = _connect(db_path)
+    orders = conn.execute('''
+        SELECT * FROM orders WHERE buyer_id = ? ORDER BY created_at DESC LIMIT ?
+    ''', (buyer_id, limit)).fetchall()
+    conn.close()
+    return [dict(order) for order in orders]
@@ -0,0 +1,346 @@
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 5) -> str:
+    """Encode a coordinate as a geohash (precision 5 is roughly a 5km cell)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        target, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (target[0] + target[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            target[0] = mid
+        else:
+            bits <<= 1
+            target[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+def geohash_bounds(geohash: str) -> Dict[str, float]:
+    """Bounding box of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return {
+        "min_lat": lat_range[0], "max_lat": lat_range[1],
+        "min_lon": lon_range[0], "max_lon": lon_range[1],
+    }
+
+def init_outbreak_tables(db_path: str):
+    """Create the per-bucket prediction counts every worker's outbreak detector reads"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbreak_counts (
+            bucket INTEGER NOT NULL,
+            predicted_class TEXT NOT NULL,
+            geohash TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (bucket, predicted_class, geohash)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.commit()
+    conn.close()
+
+class _CellWindow:
+    """Ring buffer of per-bucket counts plus an EWMA baseline of the per-bucket rate"""
+    __slots__ = ("buckets", "head", "total", "mean", "var", "history")
+
+    def __init__(self, num_buckets: int, head: int):
+        self.buckets = [0] * num_buckets
+        self.head = head
+        self.total = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.history = 0
+
+    def advance(self, bucket: int, alpha: float):
+        """Roll the window forward to ``bucket``, feeding buckets that leave it into the baseline.
+
+        Only buckets older than the window reach the baseline, so a spike in
+        progress is always compared against what came before it.
+        """
+        steps = bucket - self.head
+        if steps <= 0:
+            return
+        size = len(self.buckets)
+
+        for b in range(self.head + 1, self.head + 1 + min(steps, size)):
+            slot = b % size
+            self._observe(self.buckets[slot], alpha)
+            self.total -= self.buckets[slot]
+            self.buckets[slot] = 0
+
+        # Buckets that passed through the window while the cell was idle were all zero
+        idle = steps - min(steps, size)
+        exact = min(idle, 4 * size)
+        for _ in range(exact):
+            self._observe(0, alpha)
+        if idle > exact:
+            # Very long gap: decay in closed form instead of stepping every bucket
+            decay = (1 - alpha) ** (idle - exact)
+            self.mean *= decay
+            self.var *= decay
+            self.history += idle - exact
+
+        self.head = bucket
+
+    def _observe(self, sample: float, alpha: float):
+        delta = sample - self.mean
+        self.mean += alpha * delta
+        self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+        self.history += 1
+
+class OutbreakDetector:
+    """Sliding-window prediction counts per (class, geohash cell) with anomaly scoring.
+
+    Time is split into buckets of ``bucket_seconds``. ``record`` only bumps an
+    in-memory counter. Every ``flush_interval`` seconds a background thread
+    adds those counts to the shared ``outbreak_counts`` table and reads back
+    what all workers wrote, so every uvicorn worker scores the reports of all
+    workers: buckets at least ``settle_seconds`` old (every worker has
+    flushed them) go into a ring of ``window_buckets`` counts per key, and
+    the still-open ones into a snapshot. ``hotspots`` scores that in-memory
+    state without touching the database, so its answers lag by up to one
+    flush interval. The baseline is an exponentially weighted mean/variance
+    of the per-bucket counts that have aged out of the window, and a cell is
+    a hotspot when its current window count sits ``z_threshold`` standard
+    deviations above the baseline expectation.
+    """
+
+    def __init__(self, db_path: str, bucket_seconds: int = 300, window_buckets: int = 12, precision: int = 5,
+                 alpha: float = 0.02, z_threshold: float = 3.0, min_count: int = 5,
+                 warmup_buckets: int = 288, cold_start_count: int = 25, idle_expiry_seconds: int = 7 * 86400,
+                 flush_interval: float = 2.0, settle_seconds: float = 10.0):
+        self.db_path = db_path
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.precision = precision
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+        self.warmup_buckets = warmup_buckets
+        self.cold_start_count = cold_start_count
+        self.idle_expiry_buckets = idle_expiry_seconds // bucket_seconds
+        self.flush_interval = flush_interval
+        self.settle_seconds = max(settle_seconds, flush_interval * 2)
+        self._cells: Dict[Tuple[str, str], _CellWindow] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_prune = 0
+        self._ingested_through: Optional[int] = None
+        # Counts of the buckets not yet settled, as of the last refresh
+        self._open_counts: Dict[Tuple[str, str], int] = {}
+        self._pending: Counter = Counter()
+        self._pending_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _bucket(self, now: Optional[float]) -> int:
+        return int((time.time() if now is None else now) // self.bucket_seconds)
+
+    def record(self, predicted_class: str, latitude: float, longitude: float, now: Optional[float] = None):
+        """Count one prediction in its (class, cell) bucket; written to SQLite by the next flush"""
+        cell = geohash_encode(latitude, longitude, self.precision)
+        with self._pending_lock:
+            self._pending[(self._bucket(now), predicted_class, cell)] += 1
+
+    # Shared counts
+    def flush(self) -> int:
+        """Add the counts recorded since the last flush to ``outbreak_counts`` in one transaction"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO outbreak_counts (bucket, predicted_class, geohash, count) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (bucket, predicted_class, geohash) DO UPDATE SET count = count + excluded.count
+                ''', [key + (count,) for key, count in pending.items()])
+        except Exception as e:
+            logger.error(f"Outbreak count flush failed, keeping {len(pending)} keys for the next one: {e}")
+            with self._pending_lock:
+                self._pending.update(pending)
+            return 0
+        finally:
+            conn.close()
+        return len(pending)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="outbreak-counts", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+        self.flush()
+
+    def refresh(self, now: Optional[float] = None):
+        """Flush this worker's counts, then load what every worker has written since the last refresh"""
+        now = time.time() if now is None else now
+        bucket = self._bucket(now)
+        with self._refresh_lock:
+            self.flush()
+            # Read outside self._lock so queries never wait on SQLite
+            settled, rows, open_counts = self._read_shared(bucket, now)
+            with self._lock:
+                for row_bucket, predicted_class, cell, count in rows:
+                    self._ingest((predicted_class, cell), row_bucket, count)
+                self._ingested_through = settled
+                self._open_counts = open_counts
+                if bucket - self._last_prune > self.idle_expiry_buckets:
+                    self._prune(bucket)
+
+    def _flush_loop(self):
+        # The first pass rebuilds this worker's windows right away
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Outbreak count refresh error: {e}")
+            if self._stopping.wait(self.flush_interval):
+                return
+
+    def _ingest(self, key: Tuple[str, str], bucket: int, count: int):
+        window = self._cells.get(key)
+        if window is None:
+            window = self._cells[key] = _CellWindow(self.window_buckets, bucket)
+        elif bucket > window.head:
+            window.advance(bucket, self.alpha)
+        # Settled buckets arrive well inside the window (settle_seconds << the window length)
+        if bucket > window.head - self.window_buckets:
+            window.buckets[bucket % self.window_buckets] += count
+            window.total += count
+
+    def _read_shared(self, bucket: int, now: float):
+        """Rows of the buckets settled since the last refresh, and the summed counts of the still-open ones"""
+        settled = int((now - self.settle_seconds) // self.bucket_seconds) - 1
+        since = self._ingested_through
+        if since is None:
+            # A fresh worker rebuilds its baselines from the retained history
+            since = settled - self.idle_expiry_buckets
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            rows = conn.execute('''
+                SELECT bucket, predicted_class, geohash, count FROM outbreak_counts
+                WHERE bucket > ? AND bucket <= ? ORDER BY bucket
+            ''', (since, settled)).fetchall()
+            open_rows = conn.execute('''
+                SELECT predicted_class, geohash, SUM(count) FROM outbreak_counts
+                WHERE bucket > ? AND bucket <= ? GROUP BY predicted_class, geohash
+            ''', (settled, bucket)).fetchall()
+            if bucket - self._last_prune > self.idle_expiry_buckets:
+                with conn:
+                    conn.execute("DELETE FROM outbreak_counts WHERE bucket < ?", (bucket - self.idle_expiry_buckets,))
+        finally:
+            conn.close()
+
+        return (max(since, settled), rows,
+                {(predicted_class, cell): count for predicted_class, cell, count in open_rows})
+
+    def _prune(self, bucket: int):
+        """Forget cells that have been idle for longer than the expiry period"""
+        self._last_prune = bucket
+        stale = [key for key, window in self._cells.items() if bucket - window.head > self.idle_expiry_buckets]
+        for key in stale:
+            del self._cells[key]
+
+    def _score(self, window: _CellWindow, total: int) -> Tuple[float, float, bool]:
+        expected = window.mean * self.window_buckets
+        std = math.sqrt(max(window.var, 0.0) * self.window_buckets)
+        z = (total - expected) / max(std, 1.0)
+        if window.history < self.warmup_buckets:
+            # No trustworthy baseline yet; only flag unmistakable spikes
+            return expected, z, total >= self.cold_start_count
+        return expected, z, total >= self.min_count and z >= self.z_threshold
+
+    def hotspots(self, predicted_class: Optional[str] = None, include_healthy: bool = False,
+                 limit: int = 50, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Cells whose current window count (all workers, as of the last refresh) is anomalous, highest z first"""
+        bucket = self._bucket(now)
+        results = []
+
+        with self._lock:
+            open_counts = self._open_counts
+            for key in set(self._cells) | set(open_counts):
+                row_class, cell = key
+                if predicted_class and row_class != predicted_class:
+                    continue
+                if not include_healthy and row_class.endswith("healthy"):
+                    continue
+                window = self._cells.get(key)
+                if window is None:
+                    window = self._cells[key] = _CellWindow(self.window_buckets, bucket)
+                window.advance(bucket, self.alpha)
+                total = window.total + open_counts.get(key, 0)
+                if total == 0:
+                    continue
+                expected, z, is_hotspot = self._score(window, total)
+                if not is_hotspot:
+                    continue
+                results.append({
+                    "predicted_class": row_class,
+                    "geohash": cell,
+                    "bounds": geohash_bounds(cell),
+                    "window_count": total,
+                    "expected_count": round(expected, 2),
+                    "z_score": round(z, 2),
+                    "warming_up": window.history < self.warmup_buckets,
+                })
+
+        results.sort(key=lambda item: item["z_score"], reverse=True)
+        return results[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tracked = len(self._cells)
+        return {
+            "tracked_cells": tracked,
+            "window_seconds": self.bucket_seconds * self.window_buckets,
+            "bucket_seconds": self.bucket_seconds,
+            "geohash_precision": self.precision,
+        }
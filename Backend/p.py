@@ -1,11 +1,23 @@
-import tensorflow as tf
-import tensorflow_hub as hub
 import numpy as np
 import cv2
 import os
 
-# Load the model from TensorFlow Hub
-model = hub.load("https://www.kaggle.com/models/rishitdagli/plant-disease/TensorFlow2/plant-disease/1")
+MODEL_URL = "https://www.kaggle.com/models/rishitdagli/plant-disease/TensorFlow2/plant-disease/1"
+MODEL_INPUT_SIZE = (224, 224)
+
+# Loaded on first use so importing this module (e.g. from loader processes) stays cheap
+model = None
+
+def load_model(model_url=MODEL_URL):
+    """Load a plant disease model from TensorFlow Hub"""
+    import tensorflow_hub as hub
+    return hub.load(model_url)
+
+def get_model():
+    global model
+    if model is None:
+        model = load_model()
+    return model
 
 # Define class indices manually
 class_indices = {
@@ -24,21 +36,33 @@ class_indices = {
     "35": "Tomato___Tomato_Yellow_Leaf_Curl_Virus", "36": "Tomato___Tomato_mosaic_virus", "37": "Tomato___healthy"
 }
 
+# Function to turn a decoded BGR image into a normalized model input (without batch dimension)
+def preprocess_array(img):
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = cv2.resize(img, MODEL_INPUT_SIZE)
+    return img.astype(np.float32) / 255.0
+
 # Function to preprocess the image
 def preprocess_image(image_path):
     try:
         img = cv2.imread(image_path)
         if img is None:
             raise ValueError(f"Could not load image from {image_path}")
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = cv2.resize(img, (224, 224))
-        img = img.astype(np.float32) / 255.0
+        img = preprocess_array(img)
         img = np.expand_dims(img, axis=0)
         return img
     except Exception as e:
         print(f"Error preprocessing image: {e}")
         return None
 
+# Function to predict a stacked batch of preprocessed images
+def predict_batch(images, batch_model=None):
+    """Return (predicted_class, confidence) for each image in an (N, 224, 224, 3) batch"""
+    predictions = np.asarray((batch_model or get_model())(images))
+    indices = np.argmax(predictions, axis=1)
+    confidences = predictions[np.arange(len(indices)), indices]
+    return [(class_indices[str(i)], float(c)) for i, c in zip(indices, confidences)]
+
 # Function to predict plant disease
 def predict_disease(image_path):
     if not os.path.exists(image_path):
@@ -50,7 +74,7 @@ def predict_disease(image_path):
         return None, 0.0
     
     try:
-        predictions = model(image)
+        predictions = get_model()(image)
         predicted_index = np.argmax(predictions)
         predicted_class = class_indices[str(predicted_index)]
         confidence = np.max(predictions)
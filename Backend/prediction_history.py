@@ -0,0 +1,228 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_REGION = "unknown"
+
+def init_history_tables(db_path: str):
+    """Create the raw prediction log and its rollup tables"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Append-only raw log, one row per model prediction
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL NOT NULL,
+            day TEXT NOT NULL,
+            region TEXT NOT NULL,
+            predicted_class TEXT NOT NULL,
+            plant TEXT NOT NULL,
+            disease TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            user_id INTEGER,
+            upload_hash TEXT
+        )
+    ''')
+
+    # Counts per class per day and region, bumped in the same transaction as the log insert
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_daily_rollup (
+            day TEXT NOT NULL,
+            region TEXT NOT NULL,
+            predicted_class TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            confidence_sum REAL NOT NULL,
+            PRIMARY KEY (day, region, predicted_class)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.commit()
+    conn.close()
+
+def _day_of(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+def normalize_region(region: Optional[str]) -> str:
+    """Trim and lowercase a client supplied region name"""
+    if not region or not region.strip():
+        return UNKNOWN_REGION
+    return region.strip().lower()[:64]
+
+class PredictionLogWriter:
+    """Buffers prediction records in memory and flushes them in bulk transactions.
+
+    ``record`` only appends to a list under a lock, so the request path never
+    waits on SQLite. A background thread flushes every ``flush_interval``
+    seconds, or sooner once ``batch_size`` records are pending.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 500, flush_interval: float = 2.0,
+                 max_buffer: int = 50000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def record(self, predicted_class: str, plant: str, disease: str, confidence: float,
+               region: Optional[str] = None, user_id: Optional[int] = None,
+               upload_hash: Optional[str] = None):
+        """Queue one prediction for the next flush"""
+        now = time.time()
+        row = (now, _day_of(now), normalize_region(region), predicted_class, plant, disease,
+               float(confidence), user_id, upload_hash)
+
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                # SQLite is stuck; shed history rather than grow without bound
+                self.dropped += 1
+                return
+            self._buffer.append(row)
+            pending = len(self._buffer)
+
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write all buffered records and their rollup increments in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+
+            # Pre-aggregate so each rollup key is touched once per flush
+            counts = Counter()
+            confidence_sums = Counter()
+            for row in rows:
+                key = (row[1], row[2], row[3])
+                counts[key] += 1
+                confidence_sums[key] += row[6]
+
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                with conn:
+                    conn.executemany('''
+                        INSERT INTO prediction_log
+                            (created_at, day, region, predicted_class, plant, disease, confidence, user_id, upload_hash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                    conn.executemany('''
+                        INSERT INTO prediction_daily_rollup (day, region, predicted_class, count, confidence_sum)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (day, region, predicted_class) DO UPDATE SET
+                            count = count + excluded.count,
+                            confidence_sum = confidence_sum + excluded.confidence_sum
+                    ''', [key + (counts[key], confidence_sums[key]) for key in counts])
+            except Exception as e:
+                logger.error(f"Prediction log flush failed, re-buffering {len(rows)} rows: {e}")
+                with self._lock:
+                    self._buffer[:0] = rows[:max(self.max_buffer - len(self._buffer), 0)]
+                return 0
+            finally:
+                conn.close()
+
+            return len(rows)
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="prediction-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still buffered"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Prediction log writer error: {e}")
+
+def get_daily_counts(db_path: str, start_day: Optional[str] = None, end_day: Optional[str] = None,
+                     region: Optional[str] = None, predicted_class: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Counts per class per day (and region) read from the rollup table"""
+    query = "SELECT day, region, predicted_class, count, confidence_sum FROM prediction_daily_rollup WHERE 1 = 1"
+    params = []
+    if start_day:
+        query += " AND day >= ?"
+        params.append(start_day)
+    if end_day:
+        query += " AND day <= ?"
+        params.append(end_day)
+    if region:
+        query += " AND region = ?"
+        params.append(normalize_region(region))
+    if predicted_class:
+        query += " AND predicted_class = ?"
+        params.append(predicted_class)
+    query += " ORDER BY day, region, predicted_class"
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    return [
+        {
+            "day": day,
+            "region": row_region,
+            "predicted_class": row_class,
+            "count": count,
+            "avg_confidence": round(confidence_sum / count, 2) if count else 0.0,
+        }
+        for day, row_region, row_class, count, confidence_sum in rows
+    ]
+
+def get_region_totals(db_path: str, start_day: Optional[str] = None,
+                      end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Counts per class per region over a day range, summed from the rollup table"""
+    query = '''
+        SELECT region, predicted_class, SUM(count), SUM(confidence_sum)
+        FROM prediction_daily_rollup WHERE 1 = 1
+    '''
+    params = []
+    if start_day:
+        query += " AND day >= ?"
+        params.append(start_day)
+    if end_day:
+        query += " AND day <= ?"
+        params.append(end_day)
+    query += " GROUP BY region, predicted_class ORDER BY region, SUM(count) DESC"
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    return [
+        {
+            "region": row_region,
+            "predicted_class": row_class,
+            "count": count,
+            "avg_confidence": round(confidence_sum / count, 2) if count else 0.0,
+        }
+        for row_region, row_class, count, confidence_sum in rows
+    ]
@@ -0,0 +1,405 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.request
+import urllib.parse
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from advisories import localize, localized_headers, request_language
+
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+
+# Comma-separated hosts allowed as callback targets even on private addresses (e.g. an internal webhook relay)
+CALLBACK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+def check_callback_url(url: str) -> Optional[str]:
+    """Why the server must not POST to ``url``, or None if it may.
+
+    Callbacks come from users, so every address the host resolves to must be
+    public; loopback, private, link-local and other reserved ranges would let
+    a caller reach services inside the network.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return "callback_url must be an http(s) URL"
+    host = parsed.hostname.lower()
+    if host in CALLBACK_ALLOWED_HOSTS:
+        return None
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or 80, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        return "callback_url host does not resolve"
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if getattr(ip, "ipv4_mapped", None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global:
+            return "callback_url must point to a public address"
+    return None
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """A redirect would skip the address check, so 3xx answers count as failures"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+def init_job_tables(db_path: str):
+    """Create the prediction job table used by the async /predict/jobs API"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            upload_hash TEXT NOT NULL,
+            image BLOB,
+            content_type TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            user_id INTEGER
+        )
+    ''')
+    # Job tables created before submissions recorded the signed-in user
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(prediction_jobs)")}
+    if "user_id" not in columns:
+        try:
+            cursor.execute("ALTER TABLE prediction_jobs ADD COLUMN user_id INTEGER")
+        except sqlite3.OperationalError as e:
+            # Another worker starting at the same time may have added it first
+            if "duplicate column" not in str(e):
+                raise
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_prediction_jobs_status ON prediction_jobs(status, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_prediction_jobs_hash ON prediction_jobs(upload_hash, created_at)')
+
+    # Submissions deduplicated onto one job each keep their own callback
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_job_callbacks (
+            job_id TEXT NOT NULL,
+            callback_url TEXT NOT NULL,
+            PRIMARY KEY (job_id, callback_url)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.commit()
+    conn.close()
+
+class PredictionJobQueue:
+    """SQLite-backed queue of prediction jobs drained by a pool of worker threads.
+
+    Every uvicorn worker runs its own pool; jobs are claimed with a short
+    ``BEGIN IMMEDIATE`` transaction so exactly one worker runs each job, and
+    results are written back to the same table so any worker can serve them.
+    """
+
+    def __init__(self, db_path: str, predict_fn: Optional[Callable[..., Dict[str, Any]]],
+                 workers: int = 2, poll_interval: float = 1.0, lease_seconds: float = 300.0,
+                 dedupe_seconds: float = 600.0, max_attempts: int = 3, retention_seconds: float = 86400.0,
+                 permanent_errors: Tuple[Type[Exception], ...] = ()):
+        self.db_path = db_path
+        self.predict_fn = predict_fn
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.dedupe_seconds = dedupe_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        # Failures that would recur on retry (e.g. a rejected image) fail the job at once
+        self.permanent_errors = permanent_errors
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # Submission and lookup
+    def submit(self, image_bytes: bytes, content_type: Optional[str] = None,
+               callback_url: Optional[str] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Store an upload and return its job, reusing a recent job for the same image"""
+        upload_hash = hashlib.sha256(image_bytes).hexdigest()
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Retries from flaky connections re-upload the same bytes; hand back the existing job
+            existing = conn.execute('''
+                SELECT id, status FROM prediction_jobs
+                WHERE upload_hash = ? AND created_at >= ? AND status != ?
+                ORDER BY created_at DESC LIMIT 1
+            ''', (upload_hash, now - self.dedupe_seconds, JOB_FAILED)).fetchone()
+            if existing:
+                if callback_url:
+                    conn.execute("INSERT OR IGNORE INTO prediction_job_callbacks (job_id, callback_url) VALUES (?, ?)",
+                                 (existing["id"], callback_url))
+                conn.execute("COMMIT")
+                if callback_url and existing["status"] in FINISHED_STATES:
+                    # The job's own notification has already gone out
+                    threading.Thread(target=self._post_callback, args=(existing["id"], callback_url),
+                                     name="prediction-job-callback", daemon=True).start()
+                return {"job_id": existing["id"], "status": existing["status"], "deduplicated": True}
+
+            job_id = uuid.uuid4().hex
+            conn.execute('''
+                INSERT INTO prediction_jobs
+                    (id, status, upload_hash, image, content_type, created_at, updated_at, user_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, JOB_QUEUED, upload_hash, sqlite3.Binary(image_bytes), content_type, now, now, user_id))
+            if callback_url:
+                conn.execute("INSERT INTO prediction_job_callbacks (job_id, callback_url) VALUES (?, ?)",
+                             (job_id, callback_url))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        self._wakeup.set()
+        return {"job_id": job_id, "status": JOB_QUEUED, "deduplicated": False}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the public view of a job, or None if it does not exist"""
+        conn = self._connect()
+        row = conn.execute('''
+            SELECT id, status, result, error, attempts, created_at, updated_at
+            FROM prediction_jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        conn.close()
+
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    # Worker pool
+    def start(self):
+        """Start the worker threads for this process"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"prediction-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} prediction job workers")
+
+    def stop(self, timeout: float = 5.0):
+        """Signal worker threads to exit and wait for them"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically move the oldest runnable job to running and return it"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs whose lease expired belonged to a worker that died mid-inference
+            conn.execute('''
+                UPDATE prediction_jobs SET status = ?, updated_at = ?
+                WHERE status = ? AND updated_at < ?
+            ''', (JOB_QUEUED, now, JOB_RUNNING, now - self.lease_seconds))
+            row = conn.execute('''
+                SELECT id, image, attempts, user_id FROM prediction_jobs
+                WHERE status = ? ORDER BY created_at LIMIT 1
+            ''', (JOB_QUEUED,)).fetchone()
+            if row is not None:
+                conn.execute('''
+                    UPDATE prediction_jobs SET status = ?, attempts = attempts + 1, updated_at = ?
+                    WHERE id = ?
+                ''', (JOB_RUNNING, now, row["id"]))
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None):
+        conn = self._connect()
+        # Drop the upload once the job is final; only the result is kept
+        conn.execute('''
+            UPDATE prediction_jobs SET status = ?, result = ?, error = ?, image = NULL, updated_at = ?
+            WHERE id = ?
+        ''', (status, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+        conn.close()
+
+    def _requeue(self, job_id: str, error: str):
+        conn = self._connect()
+        conn.execute('''
+            UPDATE prediction_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?
+        ''', (JOB_QUEUED, error, time.time(), job_id))
+        conn.close()
+
+    def _run(self, row: sqlite3.Row):
+        job_id = row["id"]
+        try:
+            result = self.predict_fn(bytes(row["image"]), user_id=row["user_id"])
+        except Exception as e:
+            logger.error(f"Prediction job {job_id} failed: {e}")
+            if row["attempts"] + 1 < self.max_attempts and not isinstance(e, self.permanent_errors):
+                self._requeue(job_id, str(e))
+                return
+            self._finish(job_id, JOB_FAILED, error=str(e))
+            self._notify(job_id)
+            return
+
+        self._finish(job_id, JOB_DONE, result=result)
+        self._notify(job_id)
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                row = self._claim()
+                if row is not None:
+                    self._run(row)
+                    continue
+            except Exception as e:
+                logger.error(f"Prediction job worker error: {e}")
+
+            # Local submissions wake us immediately; other workers' jobs are found by polling
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def cleanup(self) -> int:
+        """Delete finished jobs older than the retention window; run by the maintenance scheduler"""
+        conn = self._connect()
+        deleted = conn.execute('''
+            DELETE FROM prediction_jobs WHERE status IN (?, ?) AND updated_at < ?
+        ''', (JOB_DONE, JOB_FAILED, time.time() - self.retention_seconds)).rowcount
+        conn.execute("DELETE FROM prediction_job_callbacks WHERE job_id NOT IN (SELECT id FROM prediction_jobs)")
+        conn.close()
+        return deleted
+
+    # Webhook callbacks
+    def _notify(self, job_id: str):
+        """POST the finished job to every callback registered for it"""
+        conn = self._connect()
+        urls = [row["callback_url"] for row in conn.execute(
+            "SELECT callback_url FROM prediction_job_callbacks WHERE job_id = ?", (job_id,)
+        )]
+        conn.close()
+        for url in urls:
+            self._post_callback(job_id, url)
+
+    def _post_callback(self, job_id: str, callback_url: str, retries: int = 3):
+        """POST the job to one callback URL, retrying with backoff"""
+        # Checked again at send time: the host may resolve differently than it did at submission
+        problem = check_callback_url(callback_url)
+        if problem:
+            logger.warning(f"Callback for job {job_id} skipped: {problem}")
+            return
+
+        payload = json.dumps(self.get(job_id)).encode("utf-8")
+        for attempt in range(retries):
+            try:
+                request = urllib.request.Request(
+                    callback_url, data=payload, method="POST",
+                    headers={"Content-Type": "application/json"}
+                )
+                with _callback_opener.open(request, timeout=10) as response:
+                    if response.status < 300:
+                        return
+            except Exception as e:
+                logger.warning(f"Callback for job {job_id} failed (attempt {attempt + 1}): {e}")
+            if attempt + 1 < retries:
+                time.sleep(2 ** attempt)
+
+def create_job_router(jobs: PredictionJobQueue, admission, optional_user: Callable,
+                      max_upload_bytes: int = 10 * 1024 * 1024) -> APIRouter:
+    """/predict/jobs endpoints; any role can queue and read jobs, workers run where the model is"""
+    router = APIRouter()
+
+    @router.post("/predict/jobs", status_code=202)
+    async def create_prediction_job(request: Request, file: UploadFile = File(...),
+                                    callback_url: Optional[str] = Form(None),
+                                    current_user: Optional[dict] = Depends(optional_user)):
+        """Queue a prediction and return a job id immediately"""
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+        if file.size and file.size > max_upload_bytes:
+            raise HTTPException(status_code=400, detail="File size too large (max 10MB)")
+
+        # Jobs share the per-client budget; their concurrency is bounded by the worker pool
+        admission.check_rate(*admission.classify_request(request, current_user))
+
+        if callback_url:
+            problem = await run_in_threadpool(check_callback_url, callback_url)
+            if problem:
+                raise HTTPException(status_code=400, detail=problem)
+
+        image_bytes = await file.read()
+        if len(image_bytes) == 0:
+            raise HTTPException(status_code=400, detail="Empty image file")
+
+        job = await run_in_threadpool(jobs.submit, image_bytes, file.content_type, callback_url,
+                                      current_user["id"] if current_user else None)
+        job["status_url"] = f"/predict/jobs/{job['job_id']}"
+        return job
+
+    @router.get("/predict/jobs/{job_id}")
+    async def get_prediction_job(job_id: str, request: Request, response: Response, wait: float = 0):
+        """Get a prediction job; with ?wait=N, long-poll up to N seconds (max 30) for it to finish.
+
+        Results are stored in English and returned in the caller's Accept-Language.
+        """
+        deadline = asyncio.get_running_loop().time() + min(max(wait, 0), 30)
+        language = request_language(request)
+        response.headers.update(localized_headers(language))
+
+        while True:
+            job = await run_in_threadpool(jobs.get, job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+            if job["status"] in FINISHED_STATES or asyncio.get_running_loop().time() >= deadline:
+                if job.get("result"):
+                    job["result"] = localize(job["result"], language)
+                return job
+            await asyncio.sleep(0.25)
+
+    return router
@@ -0,0 +1,248 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_PRICE_BUCKETS = (0, 50, 100, 500, 1000, 10000, 100000)
+
+class _Dictionary:
+    """Dictionary encoding for a low-cardinality string column"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values: Sequence[str]) -> np.ndarray:
+        """Codes for the requested values; unknown values simply match nothing"""
+        return np.array([self.codes[v] for v in values if v in self.codes], dtype=np.int32)
+
+def _parse_timestamp(value) -> float:
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return 0.0
+
+class FacetIndex:
+    """Columnar in-memory copy of ``products`` for filter + facet queries.
+
+    Each column is a NumPy array (strings dictionary-encoded to int32 codes) so
+    a query is a handful of vectorized comparisons combined into a boolean
+    mask, and facet counts are ``np.bincount`` over the codes under that mask.
+    Deletes leave a tombstone in ``live``; arrays are compacted once tombstones
+    pass a quarter of the rows. The index follows the ``product_changes`` log,
+    so writes from any worker are applied incrementally.
+    """
+
+    def __init__(self, db_path: str, price_buckets: Sequence[float] = DEFAULT_PRICE_BUCKETS,
+                 max_staleness: float = 0.5, initial_capacity: int = 1024):
+        self.db_path = db_path
+        self.price_edges = np.array(list(price_buckets) + [np.inf], dtype=np.float64)
+        self.max_staleness = max_staleness
+        self.types = _Dictionary()
+        self.categories = _Dictionary()
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._synced_at = 0.0
+        self._loaded = False
+        self._allocate(initial_capacity)
+
+    # Storage
+    def _allocate(self, capacity: int):
+        self.size = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.type_codes = np.zeros(capacity, dtype=np.int32)
+        self.category_codes = np.zeros(capacity, dtype=np.int32)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.quantities = np.zeros(capacity, dtype=np.int64)
+        self.farmer_ids = np.full(capacity, -1, dtype=np.int64)
+        self.created_at = np.zeros(capacity, dtype=np.float64)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.rows: Dict[int, int] = {}
+        self.products: Dict[int, Dict[str, Any]] = {}
+
+    def _arrays(self):
+        return [self.ids, self.type_codes, self.category_codes, self.prices, self.quantities,
+                self.farmer_ids, self.created_at, self.live]
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        (self.ids, self.type_codes, self.category_codes, self.prices, self.quantities,
+         self.farmer_ids, self.created_at, self.live) = [
+            np.concatenate([array, np.zeros(capacity - len(array), dtype=array.dtype)]) for array in self._arrays()
+        ]
+
+    def _compact(self):
+        keep = np.flatnonzero(self.live[:self.size])
+        capacity = max(1024, len(keep) * 2)
+        (self.ids, self.type_codes, self.category_codes, self.prices, self.quantities,
+         self.farmer_ids, self.created_at, self.live) = [
+            np.concatenate([array[keep], np.zeros(capacity - len(keep), dtype=array.dtype)])
+            for array in self._arrays()
+        ]
+        self.size = len(keep)
+        self.rows = {int(product_id): row for row, product_id in enumerate(self.ids[:self.size])}
+
+    def _upsert(self, product: Dict[str, Any]):
+        product_id = product["id"]
+        row = self.rows.get(product_id)
+        if row is None:
+            if self.size == len(self.ids):
+                self._grow()
+            row = self.rows[product_id] = self.size
+            self.size += 1
+
+        self.ids[row] = product_id
+        self.type_codes[row] = self.types.encode(product["type"])
+        self.category_codes[row] = self.categories.encode(product["category"])
+        self.prices[row] = product["price"]
+        self.quantities[row] = product["quantity"]
+        self.farmer_ids[row] = product["farmer_id"] if product["farmer_id"] is not None else -1
+        self.created_at[row] = _parse_timestamp(product["created_at"])
+        self.live[row] = True
+        self.products[product_id] = product
+
+    def _delete(self, product_id: int):
+        row = self.rows.pop(product_id, None)
+        if row is None:
+            return
+        self.live[row] = False
+        self.products.pop(product_id, None)
+        if self.size > 1024 and len(self.rows) < self.size * 0.75:
+            self._compact()
+
+    # Synchronisation with SQLite
+    def _load(self, conn):
+        self._allocate(len(self.ids))
+        self._last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM product_changes").fetchone()[0]
+        for row in conn.execute("SELECT * FROM products"):
+            self._upsert(dict(row))
+        self._loaded = True
+
+    def _apply_changes(self, conn):
+        rows = conn.execute('''
+            SELECT c.product_id, MAX(c.seq) AS seq, p.*
+            FROM product_changes c
+            LEFT JOIN products p ON p.id = c.product_id
+            WHERE c.seq > ?
+            GROUP BY c.product_id
+        ''', (self._last_seq,)).fetchall()
+        for row in rows:
+            self._last_seq = max(self._last_seq, row["seq"])
+            if row["id"] is None:
+                self._delete(row["product_id"])
+            else:
+                product = dict(row)
+                del product["product_id"], product["seq"]
+                self._upsert(product)
+
+    def invalidate(self):
+        """Apply pending changes on the next query instead of waiting for the staleness window"""
+        self._synced_at = 0.0
+
+    def sync(self):
+        if self._loaded and time.monotonic() - self._synced_at < self.max_staleness:
+            return
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN")
+            compacted_through = conn.execute(
+                "SELECT value FROM sync_state WHERE key = 'compacted_through'"
+            ).fetchone()[0]
+            if not self._loaded or self._last_seq < compacted_through:
+                self._load(conn)
+            else:
+                self._apply_changes(conn)
+        finally:
+            conn.close()
+        self._synced_at = time.monotonic()
+
+    def refresh(self):
+        """``sync()`` for callers outside ``search()``, e.g. background pre-warming"""
+        with self._lock:
+            self.sync()
+
+    # Queries
+    def _code_mask(self, codes: np.ndarray, dictionary: _Dictionary, values: Optional[Sequence[str]]):
+        if not values:
+            return None
+        return np.isin(codes[:self.size], dictionary.lookup(values))
+
+    def search(self, types: Optional[Sequence[str]] = None, categories: Optional[Sequence[str]] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None,
+               in_stock: bool = False, farmer_id: Optional[int] = None, sort: str = "-created_at",
+               limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """Filtered products plus type, category and price-bucket facet counts"""
+        with self._lock:
+            self.sync()
+            n = self.size
+
+            # Independent masks so each facet can ignore its own filter (multi-select facets)
+            base = self.live[:n].copy()
+            if in_stock:
+                base &= self.quantities[:n] > 0
+            if farmer_id is not None:
+                base &= self.farmer_ids[:n] == farmer_id
+            type_mask = self._code_mask(self.type_codes, self.types, types)
+            category_mask = self._code_mask(self.category_codes, self.categories, categories)
+            price_mask = None
+            if min_price is not None or max_price is not None:
+                prices = self.prices[:n]
+                price_mask = np.ones(n, dtype=bool)
+                if min_price is not None:
+                    price_mask &= prices >= min_price
+                if max_price is not None:
+                    price_mask &= prices <= max_price
+
+            def combine(*masks):
+                result = base
+                for mask in masks:
+                    if mask is not None:
+                        result = result & mask
+                return result
+
+            matches = combine(type_mask, category_mask, price_mask)
+
+            type_counts = np.bincount(self.type_codes[:n][combine(category_mask, price_mask)],
+                                      minlength=len(self.types.values))
+            category_counts = np.bincount(self.category_codes[:n][combine(type_mask, price_mask)],
+                                          minlength=len(self.categories.values))
+            bucketed = np.searchsorted(self.price_edges, self.prices[:n][combine(type_mask, category_mask)],
+                                       side="right") - 1
+            price_counts = np.bincount(bucketed[bucketed >= 0], minlength=len(self.price_edges) - 1)
+
+            rows = np.flatnonzero(matches)
+            sort_key = sort.lstrip("-")
+            column = {"price": self.prices, "created_at": self.created_at,
+                      "quantity": self.quantities}.get(sort_key, self.created_at)
+            order = np.argsort(column[rows], kind="stable")
+            if sort.startswith("-"):
+                order = order[::-1]
+            page = rows[order[offset:offset + limit]]
+            results = [self.products[int(product_id)] for product_id in self.ids[page]]
+
+            return {
+                "total": int(len(rows)),
+                "results": results,
+                "facets": {
+                    "type": {value: int(count) for value, count in zip(self.types.values, type_counts) if count},
+                    "category": {value: int(count) for value, count in zip(self.categories.values, category_counts)
+                                 if count},
+                    "price": [
+                        {"min": float(low), "max": None if np.isinf(high) else float(high), "count": int(count)}
+                        for low, high, count in zip(self.price_edges[:-1], self.price_edges[1:], price_counts)
+                    ],
+                },
+            }
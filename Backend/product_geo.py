@@ -0,0 +1,157 @@
+import logging
+import math
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+def init_geo(db_path: str) -> bool:
+    """Add listing coordinates and an R*Tree over them; returns False if SQLite lacks R*Tree"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(products)")}
+    for column in ("latitude", "longitude"):
+        if column not in columns:
+            try:
+                cursor.execute(f"ALTER TABLE products ADD COLUMN {column} REAL")
+            except sqlite3.OperationalError as e:
+                # Another worker starting at the same time may have added it first
+                if "duplicate column" not in str(e):
+                    raise
+
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_rtree USING rtree(
+                id, min_lat, max_lat, min_lon, max_lon
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"R*Tree module unavailable, nearby search will use a plain index: {e}")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_lat_lon ON products(latitude, longitude)')
+        conn.commit()
+        conn.close()
+        return False
+
+    # Points are stored as zero-area boxes; listings without coordinates stay out of the tree
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_rtree_insert
+        AFTER INSERT ON products
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO products_rtree (id, min_lat, max_lat, min_lon, max_lon)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_rtree_update
+        AFTER UPDATE OF latitude, longitude ON products
+        BEGIN
+            DELETE FROM products_rtree WHERE id = OLD.id;
+            INSERT INTO products_rtree (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_rtree_delete
+        AFTER DELETE ON products
+        BEGIN
+            DELETE FROM products_rtree WHERE id = OLD.id;
+        END
+    ''')
+
+    # Backfill listings that got coordinates before the tree existed
+    cursor.execute('''
+        INSERT INTO products_rtree (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT id, latitude, latitude, longitude, longitude FROM products
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+          AND id NOT IN (SELECT id FROM products_rtree)
+    ''')
+
+    conn.commit()
+    conn.close()
+    return True
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle distance from one point to arrays of points"""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes)
+    dlat = lat2 - lat1
+    dlon = np.radians(longitudes) - math.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def bounding_box(latitude: float, longitude: float, radius_km: float):
+    """Lat/lon box that fully contains the search circle"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    # Longitude degrees shrink towards the poles; use the widest latitude in the box
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 89.9:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(widest)))
+    if dlon >= 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, longitude - dlon, longitude + dlon
+
+def find_nearby(db_path: str, latitude: float, longitude: float, radius_km: float,
+                product_type: Optional[str] = None, limit: int = 50,
+                use_rtree: bool = True) -> List[Dict[str, Any]]:
+    """Listings within ``radius_km``, nearest first, each with a ``distance_km`` field"""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    # Boxes crossing the antimeridian are split into two longitude ranges
+    if min_lon < -180.0:
+        ranges = [(min_lon + 360.0, 180.0), (-180.0, max_lon)]
+    elif max_lon > 180.0:
+        ranges = [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+    else:
+        ranges = [(min_lon, max_lon)]
+
+    if use_rtree:
+        # Overlap test: the R*Tree stores coordinates as rounded 32-bit floats
+        query = '''
+            SELECT p.* FROM products_rtree r JOIN products p ON p.id = r.id
+            WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+        '''
+    else:
+        query = '''
+            SELECT p.* FROM products p
+            WHERE p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?
+        '''
+    if product_type:
+        query += " AND p.type = ?"
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    candidates = []
+    for range_min_lon, range_max_lon in ranges:
+        params = [min_lat, max_lat, range_min_lon, range_max_lon]
+        if product_type:
+            params.append(product_type)
+        candidates.extend(conn.execute(query, params).fetchall())
+    conn.close()
+
+    if not candidates:
+        return []
+
+    # Exact distances for the whole candidate set in one vectorized pass
+    latitudes = np.fromiter((row["latitude"] for row in candidates), dtype=np.float64, count=len(candidates))
+    longitudes = np.fromiter((row["longitude"] for row in candidates), dtype=np.float64, count=len(candidates))
+    distances = haversine_km(latitude, longitude, latitudes, longitudes)
+
+    inside = np.flatnonzero(distances <= radius_km)
+    nearest = inside[np.argsort(distances[inside], kind="stable")[:limit]]
+
+    results = []
+    for i in nearest:
+        product = dict(candidates[i])
+        product["distance_km"] = round(float(distances[i]), 3)
+        results.append(product)
+    return results
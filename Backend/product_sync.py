@@ -0,0 +1,135 @@
+import logging
+import sqlite3
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+def init_change_log(db_path: str):
+    """Create the append-only product change log and the triggers that feed it"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_changes_product ON product_changes(product_id, seq)')
+
+    # Versions at or below compacted_through are no longer fully described by the log
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO sync_state (key, value) VALUES ('compacted_through', 0)")
+
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_change_log_{event.lower()}
+            AFTER {event} ON products
+            BEGIN
+                INSERT INTO product_changes (product_id, op, changed_at)
+                VALUES ({row}.id, '{event.lower()}', (julianday('now') - 2440587.5) * 86400.0);
+            END
+        ''')
+
+    # Products that predate the log get a baseline entry so first syncs see them
+    cursor.execute('''
+        INSERT INTO product_changes (product_id, op, changed_at)
+        SELECT id, 'insert', (julianday('now') - 2440587.5) * 86400.0 FROM products
+        WHERE NOT EXISTS (SELECT 1 FROM product_changes)
+          AND (SELECT value FROM sync_state WHERE key = 'compacted_through') = 0
+        ORDER BY id
+    ''')
+
+    conn.commit()
+    conn.close()
+
+def get_changes(db_path: str, since: int = 0, limit: int = 500) -> Dict[str, Any]:
+    """Products changed after version ``since``, collapsed to their current state.
+
+    Each product appears once: as an upsert carrying its current row, or as a
+    delete if it no longer exists. Clients store the returned ``version`` and
+    pass it back as ``since``; ``full_resync`` means the log was compacted past
+    their version and the returned upserts are the whole catalog.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        # One read transaction so the log and the product rows agree
+        conn.execute("BEGIN")
+        compacted_through = conn.execute(
+            "SELECT value FROM sync_state WHERE key = 'compacted_through'"
+        ).fetchone()[0]
+        latest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM product_changes").fetchone()[0]
+        latest = max(latest, compacted_through)
+
+        if since < compacted_through:
+            products = conn.execute("SELECT * FROM products ORDER BY id").fetchall()
+            return {
+                "version": latest,
+                "full_resync": True,
+                "has_more": False,
+                "changes": [{"op": "upsert", "product": dict(product)} for product in products],
+            }
+
+        rows = conn.execute('''
+            SELECT c.product_id, MAX(c.seq) AS seq, p.*
+            FROM product_changes c
+            LEFT JOIN products p ON p.id = c.product_id
+            WHERE c.seq > ?
+            GROUP BY c.product_id
+            ORDER BY seq
+            LIMIT ?
+        ''', (since, limit + 1)).fetchall()
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = []
+    for row in rows:
+        if row["id"] is None:
+            changes.append({"op": "delete", "id": row["product_id"]})
+        else:
+            product = dict(row)
+            del product["product_id"], product["seq"]
+            changes.append({"op": "upsert", "product": product})
+
+    return {
+        "version": rows[-1]["seq"] if has_more else latest,
+        "full_resync": False,
+        "has_more": has_more,
+        "changes": changes,
+    }
+
+def compact_change_log(db_path: str, retention_seconds: float = 30 * 86400) -> int:
+    """Collapse the log to one entry per product and drop entries older than the retention window"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            collapsed = conn.execute('''
+                DELETE FROM product_changes
+                WHERE seq NOT IN (SELECT MAX(seq) FROM product_changes GROUP BY product_id)
+            ''').rowcount
+
+            cutoff = time.time() - retention_seconds
+            dropped_through = conn.execute(
+                "SELECT MAX(seq) FROM product_changes WHERE changed_at < ?", (cutoff,)
+            ).fetchone()[0]
+            dropped = 0
+            if dropped_through is not None:
+                dropped = conn.execute("DELETE FROM product_changes WHERE seq <= ?", (dropped_through,)).rowcount
+                conn.execute('''
+                    UPDATE sync_state SET value = MAX(value, ?) WHERE key = 'compacted_through'
+                ''', (dropped_through,))
+    finally:
+        conn.close()
+    return collapsed + dropped
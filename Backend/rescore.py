@@ -0,0 +1,227 @@
+"""Offline re-scoring of historical leaf images with a (possibly new) model.
+
+Examples:
+    python rescore.py --image-dir ./photos --output rescore.db
+    python rescore.py --image-store image_store --database agri_ai.db \\
+        --model-url https://.../plant-disease/2 --output rescore_v2.db
+    python rescore.py --image-dir ./photos --output rescore_parquet/ --format parquet
+
+Runs are resumable: images already present in the output are skipped.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from cpu_tuning import tuned_batch_size
+from p import MODEL_URL, load_model, predict_batch, preprocess_array
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+# Image sources
+def iter_image_dir(image_dir):
+    """Yield (key, path) for every image under a directory, keyed by relative path"""
+    for dirpath, _, filenames in os.walk(image_dir):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, image_dir).replace(os.sep, "/"), path
+
+def iter_image_store(store_root, database_path):
+    """Yield (hash, path) for every original in the content-addressed image store"""
+    from image_store import ImageStore
+
+    store = ImageStore(store_root, database_path)
+    conn = sqlite3.connect(database_path)
+    rows = conn.execute("SELECT hash FROM stored_images ORDER BY created_at").fetchall()
+    conn.close()
+    for (image_hash,) in rows:
+        yield image_hash, store.original_path(image_hash)
+
+# Loader (runs in worker processes)
+def load_and_preprocess(item):
+    """Decode and preprocess one image; returns (key, path, array or None, error)"""
+    key, path = item
+    try:
+        img = cv2.imdecode(np.fromfile(path, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return key, path, None, "could not decode image"
+        return key, path, preprocess_array(img), None
+    except Exception as e:
+        return key, path, None, str(e)
+
+# Result writers
+class SQLiteResultWriter:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS rescore_results (
+                image_key TEXT PRIMARY KEY,
+                source_path TEXT,
+                predicted_class TEXT,
+                confidence REAL,
+                error TEXT,
+                model_url TEXT NOT NULL,
+                scored_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def done_keys(self, model_url):
+        rows = self.conn.execute("SELECT image_key FROM rescore_results WHERE model_url = ?", (model_url,))
+        return {row[0] for row in rows}
+
+    def write(self, rows):
+        # One transaction per batch doubles as the checkpoint
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO rescore_results
+                    (image_key, source_path, predicted_class, confidence, error, model_url, scored_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+    def close(self):
+        self.conn.close()
+
+class ParquetResultWriter:
+    """Writes part files into a directory; _checkpoint.jsonl lists keys of committed parts"""
+    COLUMNS = ["image_key", "source_path", "predicted_class", "confidence", "error", "model_url", "scored_at"]
+
+    def __init__(self, directory, rows_per_part=10000):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            sys.exit("Parquet output requires pyarrow (pip install pyarrow)")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.rows_per_part = rows_per_part
+        self.checkpoint_path = os.path.join(directory, "_checkpoint.jsonl")
+        self.pending = []
+        self.part = len([f for f in os.listdir(directory) if f.endswith(".parquet")])
+
+    def done_keys(self, model_url):
+        keys = set()
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry["model_url"] == model_url:
+                        keys.update(entry["keys"])
+        return keys
+
+    def write(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(zip(*self.pending))
+        table = pa.table({name: list(values) for name, values in zip(self.COLUMNS, columns)})
+        path = os.path.join(self.directory, f"part-{self.part:05d}.parquet")
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        # Checkpoint only after the part file is safely in place
+        with open(self.checkpoint_path, "a") as f:
+            f.write(json.dumps({"part": self.part, "model_url": self.pending[0][5], "keys": list(columns[0])}) + "\n")
+        self.part += 1
+        self.pending = []
+
+    def close(self):
+        self._flush()
+
+# Pipeline
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def run(args):
+    if args.image_dir:
+        source = iter_image_dir(args.image_dir)
+    else:
+        source = iter_image_store(args.image_store, args.database)
+
+    if args.format == "parquet":
+        writer = ParquetResultWriter(args.output)
+    else:
+        writer = SQLiteResultWriter(args.output)
+
+    done = writer.done_keys(args.model_url)
+    pending = [item for item in source if item[0] not in done]
+    print(f"{len(done)} images already scored, {len(pending)} to go")
+    if not pending:
+        writer.close()
+        return
+
+    # Fork the decode workers before TensorFlow starts its thread pools; forking
+    # a process with live TF threads can deadlock the children
+    pool = multiprocessing.Pool(args.workers)
+    try:
+        print(f"Loading model {args.model_url}")
+        model = load_model(args.model_url)
+
+        scored = 0
+        start = time.perf_counter()
+        last_report = start
+        # imap keeps decode workers ahead of inference by up to `prefetch` images per worker
+        loaded = pool.imap(load_and_preprocess, pending, chunksize=args.prefetch)
+        for batch in batched(loaded, args.batch_size):
+            now = time.time()
+            rows = [(key, path, None, None, error, args.model_url, now)
+                    for key, path, array, error in batch if array is None]
+            good = [(key, path, array) for key, path, array, _ in batch if array is not None]
+
+            if good:
+                images = np.stack([array for _, _, array in good])
+                for (key, path, _), (predicted_class, confidence) in zip(good, predict_batch(images, model)):
+                    rows.append((key, path, predicted_class, confidence, None, args.model_url, now))
+
+            writer.write(rows)
+            scored += len(batch)
+
+            if time.perf_counter() - last_report >= args.report_every:
+                last_report = time.perf_counter()
+                rate = scored / (last_report - start)
+                print(f"{scored}/{len(pending)} images, {rate:.1f} images/sec")
+    finally:
+        pool.close()
+        pool.join()
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {scored} images in {elapsed:.1f}s ({scored / elapsed:.1f} images/sec)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored leaf images with a plant disease model")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--image-dir", help="Directory of images to score (walked recursively)")
+    source.add_argument("--image-store", help="Root of the content-addressed image store")
+    parser.add_argument("--database", default="agri_ai.db", help="Database holding the stored_images index")
+    parser.add_argument("--output", required=True, help="SQLite file, or directory for parquet output")
+    parser.add_argument("--format", choices=["sqlite", "parquet"], default="sqlite")
+    parser.add_argument("--model-url", default=MODEL_URL)
+    parser.add_argument("--batch-size", type=int, default=tuned_batch_size(32),
+                        help="Images per model call (default: the tune_cpu.py result, else 32)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Decode worker processes")
+    parser.add_argument("--prefetch", type=int, default=8, help="Images handed to each decode worker at a time")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress reports")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
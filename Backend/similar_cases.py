@@ -0,0 +1,406 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def init_embedding_tables(db_path: str):
+    """Create the table mapping embedding matrix rows to stored predictions"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_embeddings (
+            dim INTEGER NOT NULL,
+            row INTEGER NOT NULL,
+            upload_hash TEXT NOT NULL,
+            predicted_class TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (dim, row)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_prediction_embeddings_hash ON prediction_embeddings(dim, upload_hash)')
+
+    conn.commit()
+    conn.close()
+
+def with_feature_output(model):
+    """The model, returning its penultimate-layer features next to the class scores when it can.
+
+    A Keras classifier is rewrapped to output ``{"scores", FEATURE_OUTPUT}``
+    from one forward pass. Other models are returned as they are; they
+    provide features only if their outputs already include ``FEATURE_OUTPUT``
+    (see model_cascade.split_outputs).
+    """
+    layers = getattr(model, "layers", None)
+    if not layers or len(layers) < 2:
+        return model
+
+    import tensorflow as tf
+    from model_cascade import FEATURE_OUTPUT
+
+    return tf.keras.Model(model.inputs, {"scores": model.output, FEATURE_OUTPUT: layers[-2].output})
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class EmbeddingMatrix:
+    """Append-only float16 matrix in a memory-mapped file, one row per stored prediction.
+
+    Row numbers are handed out by SQLite under ``BEGIN IMMEDIATE`` and the file
+    is grown in the same transaction, so several uvicorn workers can append to
+    one file. The vector is written before its metadata row commits, so any
+    row visible in ``prediction_embeddings`` is complete.
+    """
+
+    def __init__(self, root: str, db_path: str, dim: int, chunk_rows: int = 16384):
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, f"embeddings_{dim}d.f16")
+        self.db_path = db_path
+        self.dim = dim
+        self.chunk_rows = chunk_rows
+        self.row_bytes = dim * np.dtype(np.float16).itemsize
+        if not os.path.exists(self.path):
+            open(self.path, "ab").close()
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _vectors(self, rows: int) -> np.ndarray:
+        """Memory map covering at least ``rows`` rows"""
+        with self._lock:
+            if self._map is None or len(self._map) < rows:
+                file_rows = os.path.getsize(self.path) // self.row_bytes
+                self._map = np.memmap(self.path, dtype=np.float16, mode="r+", shape=(file_rows, self.dim))
+            return self._map
+
+    def append(self, upload_hash: str, predicted_class: str, confidence: float, vector: np.ndarray) -> int:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT row FROM prediction_embeddings WHERE dim = ? AND upload_hash = ?", (self.dim, upload_hash)
+            ).fetchone()
+            if existing is not None:
+                conn.execute("ROLLBACK")
+                return existing[0]
+
+            row = conn.execute(
+                "SELECT COALESCE(MAX(row) + 1, 0) FROM prediction_embeddings WHERE dim = ?", (self.dim,)
+            ).fetchone()[0]
+            needed = (row // self.chunk_rows + 1) * self.chunk_rows * self.row_bytes
+            if os.path.getsize(self.path) < needed:
+                with open(self.path, "r+b") as f:
+                    f.truncate(needed)
+
+            self._vectors(row + 1)[row] = vector
+            conn.execute('''
+                INSERT INTO prediction_embeddings (dim, row, upload_hash, predicted_class, confidence, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (self.dim, row, upload_hash, predicted_class, confidence, time.time()))
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def count(self) -> int:
+        conn = sqlite3.connect(self.db_path)
+        count = conn.execute(
+            "SELECT COALESCE(MAX(row) + 1, 0) FROM prediction_embeddings WHERE dim = ?", (self.dim,)
+        ).fetchone()[0]
+        conn.close()
+        return count
+
+    def view(self, rows: int) -> np.ndarray:
+        return self._vectors(rows)[:rows]
+
+    def metadata(self, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        placeholders = ",".join("?" * len(rows))
+        result = {
+            r["row"]: dict(r) for r in conn.execute(
+                f"SELECT * FROM prediction_embeddings WHERE dim = ? AND row IN ({placeholders})",
+                [self.dim, *rows],
+            )
+        }
+        conn.close()
+        return result
+
+def exact_search(vectors: np.ndarray, queries: np.ndarray, k: int, start: int = 0,
+                 chunk_rows: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k rows by inner product for each query: (scores, rows), both shaped (Q, k)"""
+    queries = np.atleast_2d(queries).astype(np.float32)
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+    for offset in range(0, len(vectors), chunk_rows):
+        # float16 rows are widened one chunk at a time to bound memory
+        block = np.asarray(vectors[offset:offset + chunk_rows], dtype=np.float32)
+        scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(offset, offset + len(block)) + start,
+                                                          (len(queries), len(block)))], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            rows = np.take_along_axis(rows, keep, axis=1)
+        best_scores, best_rows = scores, rows
+
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+def kmeans(data: np.ndarray, clusters: int, iterations: int = 12, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; returns (clusters, d) float32 centroids"""
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(data))
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroid(data, centroids)
+        counts = np.bincount(assignments, minlength=clusters)
+        empty = counts == 0
+        # Per-cluster sums via one sort + reduceat (much faster than np.add.at)
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        centroids[~empty] = np.add.reduceat(data[order], starts, axis=0) / counts[~empty, None]
+        # Re-seed empty clusters from random points
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+def nearest_centroid(data: np.ndarray, centroids: np.ndarray, chunk_rows: int = 65536) -> np.ndarray:
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for offset in range(0, len(data), chunk_rows):
+        block = np.asarray(data[offset:offset + chunk_rows], dtype=np.float32)
+        # ||x - c||^2 up to the per-row constant ||x||^2
+        assignments[offset:offset + len(block)] = (centroid_norms - 2 * block @ centroids.T).argmin(axis=1)
+    return assignments
+
+class IVFPQIndex:
+    """Inverted file over coarse k-means cells with product-quantized residuals.
+
+    For inner-product search the quantized score of a vector in cell c is
+    ``q.c + sum_j q_j.codebook_j[code_j]``; the second term uses one lookup
+    table per query shared by every cell, so probing costs one gather per code.
+    """
+
+    def __init__(self, dim: int, nlist: int, subvectors: int):
+        self.dim = dim
+        self.nlist = nlist
+        self.subvectors = subvectors
+        self.sub_dim = dim // subvectors
+        self.coarse = None
+        self.codebooks = None
+        self.list_rows: List[np.ndarray] = []
+        self.list_codes: List[np.ndarray] = []
+        self.rows = 0
+
+    @staticmethod
+    def choose_subvectors(dim: int) -> int:
+        for subvectors in (64, 48, 32, 24, 16, 8, 4, 2):
+            if dim % subvectors == 0 and dim // subvectors >= 4:
+                return subvectors
+        return 1
+
+    def train(self, sample: np.ndarray):
+        self.coarse = kmeans(sample, self.nlist)
+        self.nlist = len(self.coarse)
+        # ~40 points per PQ centroid is plenty for the codebooks
+        sample = sample[:256 * 40]
+        residuals = sample - self.coarse[nearest_centroid(sample, self.coarse)]
+        self.codebooks = np.stack([
+            kmeans(residuals[:, j * self.sub_dim:(j + 1) * self.sub_dim], 256, iterations=8, seed=j)
+            for j in range(self.subvectors)
+        ])
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(residuals), self.subvectors), dtype=np.uint8)
+        for j in range(self.subvectors):
+            codes[:, j] = nearest_centroid(residuals[:, j * self.sub_dim:(j + 1) * self.sub_dim], self.codebooks[j])
+        return codes
+
+    def build(self, vectors: np.ndarray, chunk_rows: int = 65536):
+        """Encode every row of ``vectors`` into the inverted lists"""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for offset in range(0, len(vectors), chunk_rows):
+            block = np.asarray(vectors[offset:offset + chunk_rows], dtype=np.float32)
+            cells = nearest_centroid(block, self.coarse)
+            assignments[offset:offset + len(block)] = cells
+            codes[offset:offset + len(block)] = self._encode(block - self.coarse[cells])
+
+        order = np.argsort(assignments, kind="stable")
+        boundaries = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        self.list_rows = [order[boundaries[c]:boundaries[c + 1]] for c in range(self.nlist)]
+        self.list_codes = [codes[rows] for rows in self.list_rows]
+        self.rows = len(vectors)
+
+    def search(self, query: np.ndarray, candidates: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate (scores, rows) of up to ``candidates`` best rows"""
+        cell_scores = self.coarse @ query
+        probe = np.argpartition(-cell_scores, min(nprobe, self.nlist) - 1)[:nprobe]
+        tables = np.einsum("jd,jkd->jk", query.reshape(self.subvectors, self.sub_dim), self.codebooks)
+
+        scores, rows = [], []
+        for cell in probe:
+            codes = self.list_codes[cell]
+            if not len(codes):
+                continue
+            scores.append(cell_scores[cell] + tables[np.arange(self.subvectors), codes].sum(axis=1))
+            rows.append(self.list_rows[cell])
+        if not scores:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        scores, rows = np.concatenate(scores), np.concatenate(rows)
+        if len(scores) > candidates:
+            keep = np.argpartition(-scores, candidates)[:candidates]
+            scores, rows = scores[keep], rows[keep]
+        return scores, rows
+
+class SimilarCaseIndex:
+    """Stores embeddings of scored uploads and answers top-k cosine queries.
+
+    Below ``ivf_threshold`` rows search is exact. Above it an IVF-PQ index is
+    built in the background and rebuilt after the corpus grows by
+    ``rebuild_growth``; rows added since the last build are scanned exactly,
+    and IVF candidates are re-ranked against the float16 vectors.
+    """
+
+    def __init__(self, db_path: str, root: str, dim: int,
+                 ivf_threshold: int = 50000, nprobe: int = 16, rerank: int = 10,
+                 rebuild_growth: float = 0.2, queue_size: int = 256):
+        self.matrix = EmbeddingMatrix(root, db_path, dim)
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.rebuild_growth = rebuild_growth
+        self._index: Optional[IVFPQIndex] = None
+        self._building = False
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self.dropped = 0
+
+    # Indexing
+    def add_async(self, upload_hash: str, predicted_class: str, confidence: float, features: np.ndarray):
+        """Store a scored upload's features off the request path; drops work when the queue is full"""
+        try:
+            self._queue.put_nowait((upload_hash, predicted_class, confidence, features))
+        except queue.Full:
+            self.dropped += 1
+
+    def add(self, upload_hash: str, predicted_class: str, confidence: float, features: np.ndarray) -> int:
+        """Store the features the prediction's own model call returned"""
+        vector = normalize(features)
+        return self.matrix.append(upload_hash, predicted_class, confidence, vector)
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self.add(*item)
+            except Exception as e:
+                logger.error(f"Storing embedding failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker_loop, name="embedding-indexer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(10)
+            self._thread = None
+
+    def _maybe_rebuild(self, count: int):
+        if self._building or count < self.ivf_threshold:
+            return
+        if self._index is not None and count < self._index.rows * (1 + self.rebuild_growth):
+            return
+        self._building = True
+        threading.Thread(target=self._build, args=(count,), name="embedding-ivf-build", daemon=True).start()
+
+    def _build(self, count: int):
+        try:
+            start = time.perf_counter()
+            vectors = self.matrix.view(count)
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(count, min(count, 50000), replace=False))
+            sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+            dim = self.matrix.dim
+            index = IVFPQIndex(dim, nlist=int(np.sqrt(count)), subvectors=IVFPQIndex.choose_subvectors(dim))
+            index.train(sample)
+            index.build(vectors)
+            self._index = index
+            logger.info(f"Built IVF-PQ index over {count} embeddings in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"Building IVF-PQ index failed: {e}")
+        finally:
+            self._building = False
+
+    # Queries
+    def search(self, features: np.ndarray, k: int = 10, exclude_hash: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Stored predictions whose features are most similar to ``features`` (one image's vector)"""
+        query = normalize(features)
+        count = self.matrix.count()
+        if count == 0:
+            return []
+        self._maybe_rebuild(count)
+
+        vectors = self.matrix.view(count)
+        fetch = k + 1 if exclude_hash else k
+        index = self._index
+        if index is None:
+            scores, rows = exact_search(vectors, query, fetch)
+            scores, rows = scores[0], rows[0]
+        else:
+            _, candidates = index.search(query, fetch * self.rerank, self.nprobe)
+            # Rows appended since the index was built are not in it yet
+            tail_scores, tail_rows = exact_search(vectors[index.rows:], query, fetch, start=index.rows)
+            candidates = np.sort(candidates)
+            exact = np.asarray(vectors[candidates], dtype=np.float32) @ query
+            scores = np.concatenate([exact, tail_scores[0]])
+            rows = np.concatenate([candidates, tail_rows[0]])
+            order = np.argsort(-scores)[:fetch]
+            scores, rows = scores[order], rows[order]
+
+        metadata = self.matrix.metadata([int(row) for row in rows])
+        results = []
+        for score, row in zip(scores, rows):
+            case = metadata.get(int(row))
+            if case is None or case["upload_hash"] == exclude_hash:
+                continue
+            results.append({
+                "image_id": case["upload_hash"],
+                "predicted_class": case["predicted_class"],
+                "confidence": case["confidence"],
+                "similarity": round(float(score), 4),
+                "created_at": case["created_at"],
+                "thumbnail_url": f"/images/{case['upload_hash']}/thumbnail",
+            })
+        return results[:k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embeddings": self.matrix.count(),
+            "dim": self.matrix.dim,
+            "index": "ivf_pq" if self._index is not None else "exact",
+            "indexed_rows": self._index.rows if self._index is not None else 0,
+            "pending": self._queue.qsize(),
+            "dropped": self.dropped,
+        }
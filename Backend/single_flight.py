@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is running await the same task. Every waiter is shielded
+    from the task, so a client that disconnects or times out stops waiting
+    without cancelling the work for the others. Results are not cached: once
+    the task finishes the next call for the key runs the work again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.counters = {"executions": 0, "coalesced": 0, "timeouts": 0}
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so an abandoned task does not log "never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.counters["executions"] += 1
+        else:
+            self.counters["coalesced"] += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "in_flight": len(self._calls), **self.counters}
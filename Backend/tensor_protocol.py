@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+INPUT_HEIGHT = 224
+INPUT_WIDTH = 224
+INPUT_CHANNELS = 3
+INPUT_SCALE = np.float32(1.0 / 255.0)
+RAW_IMAGE_BYTES = INPUT_HEIGHT * INPUT_WIDTH * INPUT_CHANNELS
+MAX_BATCH = 16
+
+FORMAT_RAW = "raw"
+FORMAT_WEBP = "webp"
+
+CONTENT_TYPE_RAW = "application/octet-stream"
+CONTENT_TYPE_WEBP = "image/webp"
+CONTENT_TYPE_MSGPACK = "application/x-msgpack"
+
+class TensorPayloadError(ValueError):
+    """A /predict/tensor body that does not match the advertised spec"""
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def model_spec() -> Dict[str, Any]:
+    """What a client must send to /predict/tensor"""
+    return {
+        "version": 1,
+        "input": {
+            "height": INPUT_HEIGHT,
+            "width": INPUT_WIDTH,
+            "channels": INPUT_CHANNELS,
+            "dtype": "uint8",
+            "layout": "HWC",
+            "channel_order": "RGB",
+            "raw_bytes": RAW_IMAGE_BYTES,
+        },
+        # Applied on the server: model_input = pixel * scale + offset
+        "normalization": {"scale": float(INPUT_SCALE), "offset": 0.0},
+        "resize": {"method": "area", "note": "Resize the whole photo to 224x224 without cropping"},
+        "formats": {
+            FORMAT_RAW: CONTENT_TYPE_RAW,
+            FORMAT_WEBP: CONTENT_TYPE_WEBP,
+        },
+        "batch": {
+            "content_type": CONTENT_TYPE_MSGPACK if msgpack_available() else None,
+            "framing": {"format": "raw | webp", "images": ["<bin>", "..."]},
+            "max_images": MAX_BATCH,
+        },
+    }
+
+def decode_image(data: bytes, fmt: str) -> np.ndarray:
+    """One 224x224x3 RGB uint8 image; raw payloads are a zero-copy read-only view of ``data``"""
+    if fmt == FORMAT_RAW:
+        if len(data) != RAW_IMAGE_BYTES:
+            raise TensorPayloadError(f"Raw image must be exactly {RAW_IMAGE_BYTES} bytes, got {len(data)}")
+        return np.frombuffer(data, dtype=np.uint8).reshape(INPUT_HEIGHT, INPUT_WIDTH, INPUT_CHANNELS)
+
+    if fmt == FORMAT_WEBP:
+        bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise TensorPayloadError("Could not decode WebP image")
+        if bgr.shape[:2] != (INPUT_HEIGHT, INPUT_WIDTH):
+            raise TensorPayloadError(f"Image must be {INPUT_WIDTH}x{INPUT_HEIGHT}, got {bgr.shape[1]}x{bgr.shape[0]}")
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+    raise TensorPayloadError(f"Unknown image format: {fmt}")
+
+def stored_bytes(data: bytes, fmt: str, image: np.ndarray) -> Tuple[bytes, str]:
+    """(bytes, content type) the image store keeps for a payload; raw pixels become a lossless PNG.
+
+    The image id is the hash of these bytes, so it always matches the stored file.
+    """
+    if fmt == FORMAT_RAW:
+        return cv2.imencode(".png", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))[1].tobytes(), "image/png"
+    return data, CONTENT_TYPE_WEBP
+
+def decode_body(body: bytes, content_type: str) -> List[tuple]:
+    """(payload bytes, format) for each image in a request body"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type == CONTENT_TYPE_RAW:
+        return [(body, FORMAT_RAW)]
+    if content_type == CONTENT_TYPE_WEBP:
+        return [(body, FORMAT_WEBP)]
+    if content_type != CONTENT_TYPE_MSGPACK:
+        raise TensorPayloadError(f"Unsupported content type: {content_type or 'none'}")
+
+    try:
+        import msgpack
+    except ImportError:
+        raise TensorPayloadError("Batch uploads need msgpack on the server")
+
+    try:
+        # bin items come back as bytes (msgpack copies each one out of the body); there is no per-image decode
+        frame = msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise TensorPayloadError(f"Invalid msgpack body: {e}")
+    if not isinstance(frame, dict) or not isinstance(frame.get("images"), list):
+        raise TensorPayloadError("Batch body must be a map with an 'images' list")
+    fmt = frame.get("format", FORMAT_RAW)
+    images = frame["images"]
+    if not images or len(images) > MAX_BATCH:
+        raise TensorPayloadError(f"Batch must contain 1 to {MAX_BATCH} images")
+    if not all(isinstance(image, bytes) for image in images):
+        raise TensorPayloadError("Batch images must be msgpack bin values")
+    return [(image, fmt) for image in images]
+
+def decode_request(body: bytes, content_type: str) -> Tuple[List[np.ndarray], List[Tuple[bytes, str]]]:
+    """Decoded images of a request body, plus what the image store keeps for each (see stored_bytes)"""
+    items = decode_body(body, content_type)
+    images = [decode_image(data, fmt) for data, fmt in items]
+    return images, [stored_bytes(data, fmt, image) for (data, fmt), image in zip(items, images)]
+
+def to_model_input(images: List[np.ndarray]) -> np.ndarray:
+    """Normalize uint8 images straight into one float32 (N, 224, 224, 3) model input"""
+    batch = np.empty((len(images), INPUT_HEIGHT, INPUT_WIDTH, INPUT_CHANNELS), dtype=np.float32)
+    for i, image in enumerate(images):
+        # Single fused cast-and-scale pass, no intermediate float copy of the image
+        np.multiply(image, INPUT_SCALE, out=batch[i])
+    return batch
@@ -0,0 +1,135 @@
+"""Pick the fast-model confidence threshold for the prediction cascade.
+
+Scores a labeled image set with both the fast and the full model, then sweeps
+thresholds and reports accuracy, escalation rate and expected per-image cost
+for each. Images are labeled by their parent directory, named after the
+classes in p.class_indices (the PlantVillage layout, e.g. Tomato___Early_blight/).
+
+Example:
+    python tune_cascade.py --image-dir ./labeled --fast-model-url ./mobilenet_distilled \\
+        --max-accuracy-drop 0.005
+
+The recommended value goes in the CASCADE_THRESHOLD environment variable.
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from model_cascade import to_probabilities
+from p import MODEL_URL, class_indices, load_model
+from rescore import batched, iter_image_dir, load_and_preprocess
+
+def _normalize_label(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+CLASS_BY_LABEL = {_normalize_label(name): int(index) for index, name in class_indices.items()}
+
+def iter_labeled_images(image_dir):
+    """Yield ((key, path), class index) for images whose parent directory names a known class"""
+    skipped = 0
+    for key, path in iter_image_dir(image_dir):
+        label = CLASS_BY_LABEL.get(_normalize_label(os.path.basename(os.path.dirname(path))))
+        if label is None:
+            skipped += 1
+            continue
+        yield (key, path), label
+    if skipped:
+        print(f"Skipped {skipped} images outside a known class directory")
+
+def score(models, items, batch_size, pool):
+    """Run every model over the images, decoded by ``pool``; returns labels, per-model probabilities and seconds per image"""
+    labels = []
+    probabilities = {name: [] for name in models}
+    seconds = {name: 0.0 for name in models}
+
+    loaded = pool.imap(load_and_preprocess, [item for item, _ in items], chunksize=8)
+    label_iter = iter(label for _, label in items)
+    for batch in batched(loaded, batch_size):
+        batch_labels = [next(label_iter) for _ in batch]
+        good = [i for i, (_, _, array, _) in enumerate(batch) if array is not None]
+        if not good:
+            continue
+        images = np.stack([batch[i][2] for i in good])
+        labels.extend(batch_labels[i] for i in good)
+        for name, model in models.items():
+            start = time.perf_counter()
+            probabilities[name].append(to_probabilities(model(images)))
+            seconds[name] += time.perf_counter() - start
+
+    n = max(len(labels), 1)
+    return (np.array(labels), {name: np.concatenate(chunks) for name, chunks in probabilities.items()},
+            {name: total / n for name, total in seconds.items()})
+
+def sweep(labels, fast, full, fast_seconds, full_seconds, thresholds):
+    """Cascade accuracy, escalation rate and expected cost at each threshold"""
+    fast_pred, fast_conf = fast.argmax(axis=1), fast.max(axis=1)
+    full_correct = full.argmax(axis=1) == labels
+    fast_correct = fast_pred == labels
+
+    rows = []
+    for threshold in thresholds:
+        answered = fast_conf >= threshold
+        correct = np.where(answered, fast_correct, full_correct)
+        escalation = 1.0 - answered.mean()
+        rows.append({
+            "threshold": float(threshold),
+            "accuracy": float(correct.mean()),
+            "fast_precision": float(fast_correct[answered].mean()) if answered.any() else None,
+            "escalation_rate": float(escalation),
+            "expected_ms": (fast_seconds + escalation * full_seconds) * 1000,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Choose the fast-model threshold for the prediction cascade")
+    parser.add_argument("--image-dir", required=True, help="Labeled images, one directory per class")
+    parser.add_argument("--fast-model-url", required=True, help="TF Hub handle or SavedModel path of the small model")
+    parser.add_argument("--model-url", default=MODEL_URL, help="Full model")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005,
+                        help="Largest accuracy loss versus the full model that is acceptable")
+    parser.add_argument("--min-threshold", type=float, default=0.5)
+    parser.add_argument("--step", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    args = parser.parse_args()
+
+    items = list(iter_labeled_images(args.image_dir))
+    if not items:
+        sys.exit("No labeled images found")
+
+    print(f"Scoring {len(items)} images with both models")
+    # Fork the decode workers before TensorFlow starts its thread pools
+    with multiprocessing.Pool(args.workers) as pool:
+        models = {"fast": load_model(args.fast_model_url), "full": load_model(args.model_url)}
+        labels, probabilities, seconds = score(models, items, args.batch_size, pool)
+
+    full_accuracy = float((probabilities["full"].argmax(axis=1) == labels).mean())
+    print(f"Full model: accuracy {full_accuracy:.4f}, {seconds['full'] * 1000:.2f} ms/image")
+    print(f"Fast model: accuracy {float((probabilities['fast'].argmax(axis=1) == labels).mean()):.4f}, "
+          f"{seconds['fast'] * 1000:.2f} ms/image")
+
+    thresholds = np.arange(args.min_threshold, 1.0 + 1e-9, args.step)
+    rows = sweep(labels, probabilities["fast"], probabilities["full"], seconds["fast"], seconds["full"], thresholds)
+
+    print(f"\n{'threshold':>9} {'accuracy':>9} {'fast prec':>9} {'escalated':>9} {'ms/image':>9}")
+    for row in rows:
+        precision = f"{row['fast_precision']:.4f}" if row["fast_precision"] is not None else "-"
+        print(f"{row['threshold']:>9.2f} {row['accuracy']:>9.4f} {precision:>9} "
+              f"{row['escalation_rate']:>9.2%} {row['expected_ms']:>9.2f}")
+
+    acceptable = [row for row in rows if row["accuracy"] >= full_accuracy - args.max_accuracy_drop]
+    if not acceptable:
+        print("\nNo threshold keeps accuracy within the allowed drop; leave the cascade disabled")
+        return
+    best = min(acceptable, key=lambda row: row["expected_ms"])
+    print(f"\nRecommended: CASCADE_THRESHOLD={best['threshold']:.2f} "
+          f"(accuracy {best['accuracy']:.4f}, {best['escalation_rate']:.1%} escalated, "
+          f"{best['expected_ms']:.2f} ms/image vs {seconds['full'] * 1000:.2f} ms full model)")
+
+if __name__ == "__main__":
+    main()
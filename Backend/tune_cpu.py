@@ -0,0 +1,237 @@
+"""Pick the model worker count, TensorFlow thread counts and batch size for this machine.
+
+Runs the model in N processes at once, as `uvicorn --workers N` would, for
+every combination of worker count, intra-op and inter-op threads (0 is
+TensorFlow's default of one thread per core), and times model calls at each
+batch size. The combination with the highest throughput at batch size 1 (the
+/predict/ shape) that meets --max-p95-ms is written to cpu_tuning.json
+(CPU_TUNING_FILE), which model workers read at startup to bound their thread
+pools and, with --affinity, pin themselves to their own cores.
+
+Example:
+    python tune_cpu.py --seconds 5 --max-p95-ms 250 --affinity
+
+--synthetic replaces the model with a NumPy stand-in of similar per-image
+cost, to check the harness on a machine without TensorFlow.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from cpu_tuning import available_cpus, split_cpus, thread_environment, tuning_path
+from p import MODEL_URL
+
+def powers_of_two(limit):
+    values, value = [], 1
+    while value <= limit:
+        values.append(value)
+        value *= 2
+    return values
+
+def parse_list(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+@contextlib.contextmanager
+def thread_limits(intra_op_threads, inter_op_threads):
+    """Thread pool variables for worker processes started inside the block (they read them at import)"""
+    names = thread_environment(1, 1).keys()
+    saved = {name: os.environ.get(name) for name in names}
+    for name in names:
+        os.environ.pop(name, None)
+    os.environ.update(thread_environment(intra_op_threads, inter_op_threads))
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def make_model(model_url, synthetic, intra_op_threads, inter_op_threads):
+    if synthetic:
+        rng = np.random.default_rng(0)
+        hidden = rng.standard_normal((56 * 56 * 3, 2048), dtype=np.float32)
+        head = rng.standard_normal((2048, 38), dtype=np.float32)
+        return lambda images: np.maximum(images[:, ::4, ::4].reshape(len(images), -1) @ hidden, 0) @ head
+
+    import tensorflow as tf
+    from cpu_tuning import apply_tensorflow_threads
+    apply_tensorflow_threads(tf, {"intra_op_threads": intra_op_threads, "inter_op_threads": inter_op_threads})
+    from p import load_model
+    return load_model(model_url)
+
+def measure_worker(index, settings, cpus, barrier, results):
+    """One simulated app worker: time `streams` concurrent callers at each batch size"""
+    try:
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        model = make_model(settings["model_url"], settings["synthetic"],
+                           settings["intra_op_threads"], settings["inter_op_threads"])
+        rng = np.random.default_rng(index)
+        for batch_size in settings["batch_sizes"]:
+            images = rng.random((batch_size, 224, 224, 3), dtype=np.float32)
+            model(images)  # first call at a shape is slow under TensorFlow; keep it out of the timings
+            barrier.wait(timeout=600)
+
+            latencies = []
+            deadline = time.perf_counter() + settings["seconds"]
+
+            def stream():
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    model(images)
+                    latencies.append(time.perf_counter() - start)
+
+            threads = [threading.Thread(target=stream) for _ in range(settings["streams"])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results.put((index, batch_size, latencies, None))
+    except Exception as e:
+        results.put((index, None, None, f"{type(e).__name__}: {e}"))
+
+def measure(workers, intra_op_threads, inter_op_threads, cpu_sets, args):
+    """Rows of throughput and call latency for one worker/thread combination, one per batch size"""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    settings = {
+        "model_url": args.model_url, "synthetic": args.synthetic, "batch_sizes": args.batch_sizes,
+        "intra_op_threads": intra_op_threads, "inter_op_threads": inter_op_threads,
+        "streams": args.streams, "seconds": args.seconds,
+    }
+    with thread_limits(intra_op_threads, inter_op_threads):
+        processes = [context.Process(target=measure_worker,
+                                     args=(i, settings, cpu_sets[i] if cpu_sets else None, barrier, results))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+
+    latencies = {batch_size: [] for batch_size in args.batch_sizes}
+    try:
+        for _ in range(workers * len(args.batch_sizes)):
+            _, batch_size, worker_latencies, error = results.get(timeout=900)
+            if error:
+                raise RuntimeError(error)
+            latencies[batch_size].extend(worker_latencies)
+    except queue.Empty:
+        raise RuntimeError("Timed out waiting for worker results")
+    finally:
+        for process in processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        calls = np.array(latencies[batch_size]) * 1000
+        rows.append({
+            "workers": workers, "intra_op_threads": intra_op_threads, "inter_op_threads": inter_op_threads,
+            "batch_size": batch_size,
+            "images_per_second": len(calls) * batch_size / args.seconds,
+            "p50_ms": float(np.percentile(calls, 50)) if len(calls) else None,
+            "p95_ms": float(np.percentile(calls, 95)) if len(calls) else None,
+        })
+    return rows
+
+def choose(rows, max_p95_ms, batch_gain):
+    """Best combination at batch size 1, then the smallest batch size near that combination's peak throughput"""
+    def within_budget(row):
+        return row["p95_ms"] is not None and (max_p95_ms is None or row["p95_ms"] <= max_p95_ms)
+
+    single = [row for row in rows if row["batch_size"] == min(r["batch_size"] for r in rows) and within_budget(row)]
+    if not single:
+        return None
+    best = max(single, key=lambda row: row["images_per_second"])
+
+    combination = ("workers", "intra_op_threads", "inter_op_threads")
+    batches = sorted((row for row in rows if within_budget(row)
+                      and all(row[key] == best[key] for key in combination)), key=lambda row: row["batch_size"])
+    peak = max(row["images_per_second"] for row in batches)
+    batch = next(row for row in batches if row["images_per_second"] >= peak * (1 - batch_gain))
+    return best, batch
+
+def main():
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description="Tune model worker count, thread counts and batch size")
+    parser.add_argument("--model-url", default=MODEL_URL)
+    parser.add_argument("--synthetic", action="store_true", help="NumPy stand-in model instead of TensorFlow")
+    parser.add_argument("--workers", type=parse_list, default=powers_of_two(len(cpus)),
+                        help="Comma separated worker counts to try")
+    parser.add_argument("--intra-op", type=parse_list, default=None,
+                        help="Intra-op thread counts to try (default: 0 and powers of two up to cores per worker)")
+    parser.add_argument("--inter-op", type=parse_list, default=[1, 2])
+    parser.add_argument("--batch-sizes", type=parse_list, default=[1, 4, 8, 16])
+    parser.add_argument("--streams", type=int, default=int(os.getenv("PREDICT_MAX_CONCURRENCY", "2")),
+                        help="Concurrent model calls per worker (the app's PREDICT_MAX_CONCURRENCY)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Measurement time per batch size")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Latency budget for a model call")
+    parser.add_argument("--batch-gain", type=float, default=0.05,
+                        help="Use the smallest batch size within this fraction of the best throughput")
+    parser.add_argument("--affinity", action="store_true", help="Pin each worker to its own cores")
+    parser.add_argument("--output", default=tuning_path())
+    args = parser.parse_args()
+
+    print(f"{len(cpus)} CPUs available; {args.streams} concurrent calls per worker, {args.seconds:g}s per measurement")
+    rows = []
+    for workers in args.workers:
+        if workers > len(cpus):
+            continue
+        intra_options = args.intra_op or [0] + powers_of_two(len(cpus) // workers)
+        for intra in intra_options:
+            cpu_sets = split_cpus(cpus, workers) if args.affinity and intra > 0 else None
+            for inter in args.inter_op:
+                try:
+                    measured = measure(workers, intra, inter, cpu_sets, args)
+                except RuntimeError as e:
+                    sys.exit(f"Measurement failed for {workers} workers, {intra}/{inter} threads: {e}")
+                for row in measured:
+                    print(f"workers {workers:>2}  intra {intra or 'all':>3}  inter {inter:>2}  "
+                          f"batch {row['batch_size']:>3}  {row['images_per_second']:>8.1f} img/s  "
+                          f"p50 {row['p50_ms']:>8.1f}ms  p95 {row['p95_ms']:>8.1f}ms")
+                rows.extend(measured)
+
+    chosen = choose(rows, args.max_p95_ms, args.batch_gain)
+    if chosen is None:
+        sys.exit("No combination met the latency budget; raise --max-p95-ms or add hardware")
+    best, batch = chosen
+    baseline = [row for row in rows if row["workers"] == best["workers"] and row["intra_op_threads"] == 0
+                and row["inter_op_threads"] == best["inter_op_threads"] and row["batch_size"] == best["batch_size"]]
+
+    affinity = args.affinity and best["intra_op_threads"] > 0
+    tuning = {
+        "cpu_count": os.cpu_count(),
+        "workers": best["workers"],
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": best["inter_op_threads"],
+        "batch_size": batch["batch_size"],
+        "affinity": affinity,
+        "cpu_sets": split_cpus(cpus, best["workers"]) if affinity else None,
+        "images_per_second": round(best["images_per_second"], 1),
+        "p95_ms": round(best["p95_ms"], 2),
+        "model_url": "synthetic" if args.synthetic else args.model_url,
+        "tuned_at": time.time(),
+    }
+    with open(args.output, "w") as f:
+        json.dump(tuning, f, indent=2)
+
+    print(f"\nBest: {best['workers']} workers x {best['intra_op_threads'] or 'all'} intra-op / "
+          f"{best['inter_op_threads']} inter-op threads, {best['images_per_second']:.1f} img/s, "
+          f"p95 {best['p95_ms']:.1f}ms; batch size {batch['batch_size']}")
+    if baseline:
+        print(f"TensorFlow defaults with {best['workers']} workers: {baseline[0]['images_per_second']:.1f} img/s, "
+              f"p95 {baseline[0]['p95_ms']:.1f}ms")
+    print(f"Wrote {args.output}; start the app with: uvicorn main_auth:app --workers {best['workers']}")
+
+if __name__ == "__main__":
+    main()